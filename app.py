@@ -1,13 +1,37 @@
-import requests
-from bs4 import BeautifulSoup
-from flask import Flask, render_template, request, jsonify
-import re
 import time
-import random
-import unicodedata
+
+_import_started = time.perf_counter()
+
+from flask import Flask, Response, render_template, request, jsonify, send_file, stream_with_context  # noqa: E402
+import json  # noqa: E402
+import re  # noqa: E402
+import tempfile  # noqa: E402
+
+import climbfinder_export as cfe  # noqa: E402
+import export_writer  # noqa: E402
+import jobs  # noqa: E402
+import metrics  # noqa: E402
+import ranking_loader  # noqa: E402
+import ranking_parser  # noqa: E402
+import ratelimit  # noqa: E402
+import region_search  # noqa: E402
+import store  # noqa: E402
+
+# pyarrow and numpy load on the first request that needs them
+columnar = metrics.lazy_module("columnar")
+geo_index = metrics.lazy_module("geo_index")
 
 app = Flask(__name__)
 
+# Scrape jobs from all clients share one bounded worker pool, one HTTP session and
+# the process-wide adaptive climbfinder.com limiter (its rate follows the server's
+# answers and carries over between runs; cached pages skip it)
+job_manager = jobs.JobManager(max_workers=jobs.DEFAULT_WORKERS)
+http_session = cfe.http_session()
+host_limiter = ratelimit.configure_host(cfe.BASE, burst=1, max_in_flight=2)
+# Everything above, Flask included; later lazy imports add their own entries
+metrics.record_import("app", time.perf_counter() - _import_started)
+
 # --- CONFIGURATION ---
 BASE_URL = "https://climbfinder.com/en/ranking"
 SEARCH_URL = "https://climbfinder.com/en/search"
@@ -16,27 +40,10 @@ HEADERS = {
     "Accept-Language": "en-US,en;q=0.9",
 }
 
-# --- HELPER FUNCTIONS ---
-
-def clean_text(text):
-    """Normalize text to remove extra whitespace and handle unicode."""
-    if not text:
-        return ""
-    return unicodedata.normalize("NFKD", text).strip()
+# Weakest fuzzy match /api/search_region accepts (see region_search for the scale)
+REGION_MIN_SCORE = 10
 
-def parse_number(value_str):
-    """
-    Extracts numeric values from strings like '12.5 km' or '7.1%'.
-    Returns a float or int.
-    """
-    if not value_str:
-        return 0
-    # Remove non-numeric characters except dots and minus signs
-    clean = re.sub(r'[^\d.-]', '', value_str)
-    try:
-        return float(clean)
-    except ValueError:
-        return 0
+# --- HELPER FUNCTIONS ---
 
 def get_region_id_from_url(url):
     """
@@ -57,150 +64,312 @@ def home():
 @app.route('/api/search_region', methods=['POST'])
 def search_region():
     """
-    Mock search or URL parser. 
-    Since Climbfinder doesn't have a public public API for IDs, 
-    we allow users to paste a URL or use a preset map.
+    Resolve a region from a pasted ranking URL, a region ID or a (partial, misspelled) name.
+    Names are looked up in the shared region index (region_search.py, built from regions.py).
     """
     query = request.json.get('query', '').strip()
-    
-    # Preset Popular Regions (Hardcoded for convenience)
-    popular_regions = {
-        "haute savoie": "288",
-        "savoie": "957",
-        "hautes alpes": "192",
-        "isere": "362",
-        "dolomites": "123",
-        "vosges": "544",
-        "pyrenees": "688",
-        "alpe d'huez domain": "744"
-    }
-    
+
     # 1. Check if it's a direct URL
     extracted_id = get_region_id_from_url(query)
     if extracted_id:
         return jsonify({"success": True, "id": extracted_id, "name": "Detected from URL"})
 
-    # 2. Check presets
-    normalized_query = clean_text(query).lower()
-    if normalized_query in popular_regions:
-        return jsonify({"success": True, "id": popular_regions[normalized_query], "name": query.title()})
+    # 2. Best match in the region table
+    match = region_search.best_match(query, min_score=REGION_MIN_SCORE)
+    if match:
+        return jsonify({"success": True, "id": str(match["id"]), "name": match["label"]})
 
     return jsonify({"success": False, "message": "Region ID not found. Please paste a Ranking URL containing '?l=...' or use the manual ID."})
 
+@app.route('/api/regions/search', methods=['GET'])
+def region_typeahead():
+    """Ranked region matches for search-as-you-type. Query params: q, limit (default 8)."""
+    limit = min(request.args.get('limit', 8, type=int), 50)
+    return jsonify({"data": region_search.search(request.args.get('q', ''), limit)})
+
+def scrape_pages(region_id, start_page, end_page, refresh=False):
+    """
+    Yield a ranking_loader.PageResult (page, rows, strategy, error, last_page) for each
+    ranking page in order, as soon as it is parsed; rows have the
+    ranking_parser.RANKING_FIELDS keys and strategy names the parser that matched.
+    ``end_page`` None runs to the ranking's last page, found from the first page.
+    Pages after the first are fetched concurrently through the shared session and host
+    limiter: concurrent scrapes queue behind the same rate limit, and pages in the
+    on-disk HTTP cache skip the network entirely.
+    With ``refresh``, fetched pages are saved to the default store and fetching stops
+    after two pages in a row that match it; the rest of the range comes from the store
+    (strategy "store").
+    """
+    load = ranking_loader.fetcher(region_id, session=http_session, limiter=host_limiter)
+    if not refresh:
+        pages = ranking_loader.iter_pages(load, start_page, end_page, max_workers=host_limiter.max_in_flight)
+    else:
+        db = store.default_store()
+        pages = ranking_loader.iter_refresh(
+            load, db, region_id, start_page, end_page,
+            to_summary=ranking_parser.summary_from_row,
+            from_stored=lambda r: ranking_parser.row_from_summary(r, r["rank"], r["page"]),
+            max_workers=host_limiter.max_in_flight,
+        )
+    for result in pages:
+        if result.error:
+            print(f"Error scraping {result.error}")
+        elif refresh and result.rows and result.strategy != "store":
+            db.save_ranking_page(region_id, result.page, [ranking_parser.summary_from_row(r) for r in result.rows])
+        yield result
+
+def page_total(start_page, end_page, last_page):
+    """Pages a scrape will cover, as far as is known (the ranking may end before end_page)."""
+    if last_page is not None:
+        return last_page - start_page + 1
+    return end_page - start_page + 1 if end_page is not None else None
+
+def run_scrape_job(job, region_id, start_page, end_page, refresh=False):
+    """Worker body of a /api/scrape job: one ranking page per step, cancellable between pages."""
+    pages = scrape_pages(region_id, start_page, end_page, refresh)
+    for result in pages:
+        job.set_total(page_total(start_page, end_page, result.last_page) or job.total)
+        if result.error:
+            job.add_error(result.error)
+        job.add_results(result.rows)
+        job.step()
+        if job.cancelled:
+            pages.close()
+            break
+
+def scrape_params(params):
+    """(region_id, start_page, end_page) from a request, or None when they are invalid.
+    end_page "last" (or blank) means up to the ranking's last page (end_page None).
+    """
+    region_id = params.get('region_id')
+    try:
+        start_page = int(params.get('start_page', 1))
+        end_page = params.get('end_page', 1)
+        end_page = None if str(end_page).strip().lower() in ('', 'last', 'none') else int(end_page)
+    except (TypeError, ValueError):
+        return None
+    if not region_id or start_page < 1 or (end_page is not None and end_page < start_page):
+        return None
+    return region_id, start_page, end_page
+
+def refresh_param(params):
+    """refresh=true|1|yes: save pages to the store and stop at pages it already has (see scrape_pages)."""
+    return str(params.get('refresh', '')).strip().lower() in ('1', 'true', 'yes')
+
 @app.route('/api/scrape', methods=['POST'])
 def scrape_data():
-    region_id = request.json.get('region_id')
-    start_page = int(request.json.get('start_page', 1))
-    end_page = int(request.json.get('end_page', 1))
-    
-    all_climbs = []
-    
-    for page in range(start_page, end_page + 1):
-        params = {'l': region_id, 'p': page}
-        
+    """Queue a scrape and return its job ID at once; poll /api/jobs/<job_id> for rows."""
+    parsed = scrape_params(request.json or {})
+    if parsed is None:
+        return jsonify({"error": "region_id and a valid page range are required"}), 400
+    region_id, start_page, end_page = parsed
+    refresh = refresh_param(request.json or {})
+
+    job = job_manager.submit(
+        lambda job: run_scrape_job(job, region_id, start_page, end_page, refresh),
+        total=page_total(start_page, end_page, None) or 1,
+        params={"region_id": region_id, "start_page": start_page, "end_page": end_page, "refresh": refresh},
+    )
+    return jsonify({"job_id": job.id, "status": job.status}), 202
+
+@app.route('/api/scrape/stream', methods=['GET', 'POST'])
+def scrape_stream():
+    """
+    Streaming scrape: one message per ranking page, sent as soon as that page is parsed.
+    Parameters come from the JSON body (POST) or the query string (GET, for EventSource).
+    format=ndjson (default) writes one JSON object per line; format=sse (or an
+    "Accept: text/event-stream" header) writes Server-Sent Events. Messages:
+        {"type": "rows", "page": 3, "strategy": "cards", "data": [...], "progress": {"done": 1, "total": 4}}
+        {"type": "error", "page": 3, "message": "..."}
+        {"type": "done", "count": 75}
+    Progress "total" shrinks to the ranking's real length once the first page shows it,
+    and is null while unknown (end_page "last" on a page without pagination).
+    Closing the connection stops the scrape and cancels pages not yet fetched.
+    refresh=true stops fetching at pages already in the store (see scrape_pages).
+    """
+    params = request.get_json(silent=True) or request.args
+    parsed = scrape_params(params)
+    if parsed is None:
+        return jsonify({"error": "region_id and a valid page range are required"}), 400
+    region_id, start_page, end_page = parsed
+    refresh = refresh_param(params)
+    sse = params.get('format') == 'sse' or (
+        params.get('format') is None and request.accept_mimetypes.best == 'text/event-stream'
+    )
+
+    def encode(message):
+        line = json.dumps(message, ensure_ascii=False)
+        return f"event: {message['type']}\ndata: {line}\n\n" if sse else line + "\n"
+
+    def generate():
+        count = 0
+        pages = scrape_pages(region_id, start_page, end_page, refresh)
+        try:
+            for done, result in enumerate(pages, 1):
+                if result.error:
+                    yield encode({"type": "error", "page": result.page, "message": result.error})
+                count += len(result.rows)
+                yield encode({
+                    "type": "rows", "page": result.page, "strategy": result.strategy, "data": result.rows,
+                    "progress": {"done": done, "total": page_total(start_page, end_page, result.last_page)},
+                })
+            yield encode({"type": "done", "count": count})
+        finally:
+            pages.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream' if sse else 'application/x-ndjson',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    Progress of a scrape job plus the rows found so far.
+    Query param since=N returns only rows from index N on (pass the previous "count").
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job.snapshot(since=request.args.get('since', 0, type=int)))
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    job.cancel()
+    return jsonify({"job_id": job.id, "status": job.status})
+
+def store_filters(args):
+    """ClimbStore query filters from request args."""
+    return {
+        "region_id": args.get('region_id') or None,
+        "country": args.get('country') or None,
+        "min_points": args.get('min_points', type=int),
+        "max_points": args.get('max_points', type=int),
+        "min_grade": args.get('min_grade', type=float),
+        "max_grade": args.get('max_grade', type=float),
+        "order_by": args.get('order_by', 'difficulty_points'),
+        "descending": args.get('asc') not in ('1', 'true'),
+        "limit": args.get('limit', type=int),
+    }
+
+@app.route('/api/climbs', methods=['GET'])
+def stored_climbs():
+    """
+    Indexed query over the local climb store (filled by the crawler and the Streamlit app).
+    Query params: region_id, country, min_points, max_points, min_grade, max_grade,
+    order_by, asc, limit, format=export (build_export_object records, detail pages only).
+    """
+    args = request.args
+    filters = store_filters(args)
+    db = store.default_store()
+    try:
+        if args.get('format') == 'export':
+            rows = db.export_records(**filters)
+        else:
+            rows = db.query_climbs(**filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"data": rows, "count": len(rows)})
+
+@app.route('/api/climbs/near', methods=['GET'])
+def climbs_near():
+    """
+    Stored climbs (with detail pages) by location, closest first, as build_export_object
+    records plus distanceKm and nearPoint ("start" or "summit").
+    Query params: lat & lon with radius_km (default 10) or k (k nearest), or
+    bbox=min_lat,min_lon,max_lat,max_lon; limit.
+    """
+    args = request.args
+    index = store.default_store().spatial_index()
+    limit = args.get('limit', type=int)
+    lat, lon = args.get('lat', type=float), args.get('lon', type=float)
+    if args.get('bbox'):
         try:
-            # Random delay to be polite and avoid blocks
-            time.sleep(random.uniform(0.5, 1.5))
-            
-            response = requests.get(BASE_URL, params=params, headers=HEADERS)
-            if response.status_code != 200:
-                print(f"Failed to fetch page {page}: Status {response.status_code}")
-                continue
-
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Select the climb cards or table rows. 
-            # Strategy: Look for the specific grid items or table rows typically found on ranking pages.
-            # Climbfinder often uses a grid of cards or a table depending on the view. 
-            # We target the card container often identified by specific classes.
-            
-            # Selector strategy: Look for elements that contain climb stats
-            # This selector targets the card-like items in the list
-            climb_items = soup.select('.col-md-4.col-sm-6.mb-4, .card-climb') 
-            
-            # Fallback if the layout is a table (<table>)
-            table_rows = soup.select('table tbody tr')
-
-            if table_rows and not climb_items:
-                # Table Parsing Logic
-                for row in table_rows:
-                    cols = row.find_all('td')
-                    if len(cols) > 3:
-                        name = clean_text(cols[1].get_text())
-                        length = parse_number(cols[2].get_text())
-                        gradient = parse_number(cols[3].get_text())
-                        difficulty = parse_number(cols[4].get_text())
-                        
-                        all_climbs.append({
-                            "rank": parse_number(cols[0].get_text()),
-                            "name": name,
-                            "length_km": length,
-                            "gradient_avg": gradient,
-                            "difficulty_points": difficulty,
-                            "page": page
-                        })
-            else:
-                # Card/Grid Parsing Logic (More common on modern Climbfinder)
-                # Note: The classes below are approximations based on standard bootstrap/custom structures 
-                # observed. We look for 'card-body' or specific header tags.
-                
-                # A more generic approach for the ranking list specifically:
-                # The "Browse" output showed items like "1. Semnoz ...". 
-                # We will look for the container `results-infinite` or similar.
-                
-                items = soup.find_all(class_='climb-card') # Hypothetical class, usually it's a link block
-                if not items:
-                     # Broader search for the ranking elements
-                     items = soup.select('a.text-body') # Often the cards are wrapped in anchors
-                
-                # If standard scraping fails, let's try a very generic parse of the text blocks 
-                # visible in the ranking list.
-                
-                # *Robust Fallback*: The ranking page is often a list of cards. 
-                # We will iterate through all cards that have "km" and "%" text.
-                cards = soup.find_all('div', class_=re.compile('card'))
-                
-                for card in cards:
-                    text_content = card.get_text(" | ", strip=True)
-                    
-                    # Heuristic: Valid climb card usually has "km", "%" and a name.
-                    if "km" in text_content and "%" in text_content:
-                        # Extract Name: Usually the first bold text or h5
-                        name_tag = card.find(['h2', 'h3', 'h4', 'h5', 'strong'])
-                        name = clean_text(name_tag.get_text()) if name_tag else "Unknown"
-                        
-                        # Extract stats using regex from the text block
-                        # Pattern: 12.5 km ... 7.5% ... 800
-                        length_match = re.search(r'([\d\.]+)\s*km', text_content)
-                        grad_match = re.search(r'([\d\.]+)\s*%', text_content)
-                        diff_match = re.search(r'([\d\.]+)\s*pts|points', text_content)
-                        # Sometimes difficulty is just a standalone number at the end
-                        
-                        # Rank extraction (often in a badge)
-                        rank_tag = card.find(class_=re.compile('badge|rank'))
-                        rank = parse_number(rank_tag.get_text()) if rank_tag else 0
-
-                        length = float(length_match.group(1)) if length_match else 0.0
-                        gradient = float(grad_match.group(1)) if grad_match else 0.0
-                        
-                        # Difficulty is often the last number or explicitly labeled. 
-                        # Let's try to find the 'difficulty score' element specifically if possible
-                        # If not, we leave it 0 or try to parse the last integer.
-                        difficulty = 0
-                        
-                        all_climbs.append({
-                            "name": name,
-                            "length_km": length,
-                            "gradient_avg": gradient,
-                            "difficulty_points": difficulty, # Specific scraping of this might need exact class
-                            "page": page
-                        })
-
-        except Exception as e:
-            print(f"Error scraping page {page}: {e}")
-            continue
-
-    return jsonify({"data": all_climbs, "count": len(all_climbs)})
+            min_lat, min_lon, max_lat, max_lon = (float(v) for v in args['bbox'].split(','))
+        except ValueError:
+            return jsonify({"error": "bbox must be min_lat,min_lon,max_lat,max_lon"}), 400
+        hits = index.bbox(min_lat, min_lon, max_lat, max_lon)[:limit]
+    elif lat is None or lon is None:
+        return jsonify({"error": "give lat and lon, or bbox"}), 400
+    elif args.get('k'):
+        hits = index.nearest(lat, lon, args.get('k', type=int) or 10)
+    else:
+        hits = index.radius(lat, lon, args.get('radius_km', 10.0, type=float), limit=limit)
+    rows = store.default_store().export_hits(hits)
+    return jsonify({"data": rows, "count": len(rows)})
+
+@app.route('/api/climbs/corridor', methods=['POST'])
+def climbs_corridor():
+    """
+    Stored climbs within km (default 5) of a route, closest first. The body is a GPX
+    file, or JSON {"track": [[lat, lon], ...], "km": 5}; km and limit also work as query params.
+    """
+    km = request.args.get('km', type=float)
+    limit = request.args.get('limit', type=int)
+    data = request.get_json(silent=True)
+    try:
+        if isinstance(data, dict):
+            track = [(float(p[0]), float(p[1])) for p in data.get('track') or []]
+            km = km if km is not None else float(data.get('km', 5.0))
+        else:
+            track = geo_index.parse_gpx(request.get_data())
+    except (ValueError, TypeError, IndexError) as e:
+        return jsonify({"error": f"cannot read track: {e}"}), 400
+    if not track:
+        return jsonify({"error": "no track points"}), 400
+    hits = store.default_store().spatial_index().corridor(track, km if km is not None else 5.0, limit=limit)
+    rows = store.default_store().export_hits(hits)
+    return jsonify({"data": rows, "count": len(rows)})
+
+@app.route('/api/climbs/export', methods=['GET'])
+def export_climbs():
+    """
+    Stored climbs with detail pages as build_export_object records, streamed as they are read.
+    Same filters as /api/climbs, plus fmt=json|ndjson|parquet|arrow|xlsx and gzip=1 (json/ndjson).
+    fmt=xlsx is the ranking sheet of every matching climb, detail page or not.
+    """
+    args = request.args
+    fmt = args.get('fmt', 'json')
+    compress = args.get('gzip') in ('1', 'true')
+    formats = export_writer.FORMATS + columnar.FORMATS + ('xlsx',)
+    if fmt not in formats:
+        return jsonify({"error": f"fmt must be one of {', '.join(formats)}"}), 400
+    filters = store_filters(args)
+    if filters["order_by"] not in store.ORDER_COLUMNS or (filters["order_by"] == 'rank' and not filters["region_id"]):
+        return jsonify({"error": f"cannot order by {filters['order_by']!r}"}), 400
+    if fmt == 'xlsx':
+        # A zip needs a seekable target: rows go from the store cursor to a temp file, then out
+        climbs = store.default_store().iter_climbs(**filters)
+        fh = tempfile.TemporaryFile()
+        export_writer.write_xlsx(
+            (ranking_parser.row_from_summary(c, c.get("rank"), c.get("page")) for c in climbs), fh
+        )
+        fh.seek(0)
+        return send_file(fh, mimetype=export_writer.XLSX_MIME, as_attachment=True,
+                         download_name="climbfinder_climbs.xlsx")
+    if fmt in columnar.FORMATS:
+        fh = tempfile.TemporaryFile()
+        columnar.write_records(store.default_store().iter_export_records(**filters), fh, fmt)
+        fh.seek(0)
+        return send_file(fh, mimetype=columnar.mime_type(fmt), as_attachment=True,
+                         download_name=columnar.file_name("climbfinder_climbs", fmt))
+    records = store.default_store().iter_export_records(**filters)
+    name = export_writer.file_name("climbfinder_climbs", fmt, compress)
+    return Response(
+        stream_with_context(export_writer.iter_chunks(records, fmt, compress)),
+        mimetype=export_writer.mime_type(fmt, compress),
+        headers={"Content-Disposition": f'attachment; filename="{name}"'},
+    )
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Fetch/parse/cache counters and stage timers in Prometheus text format (see metrics.py)."""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,85 @@
+"""
+Golden-file equivalence check and timing for the HTML parser backends.
+
+Every fixture in benchmarks/fixtures is parsed with each installed backend;
+the output dicts must equal the recorded ``*.golden.json`` exactly.
+
+Usage:
+    python benchmarks/bench_parsers.py            # check goldens + time backends
+    python benchmarks/bench_parsers.py --update   # re-record goldens (html.parser)
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import climbfinder_export as cfe  # noqa: E402
+import ranking_parser  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+DETAIL_URL = "https://climbfinder.com/en/climbs/col-de-la-colombiere-le-reposoir"
+
+# fixture file -> parse function taking the HTML
+CASES = {
+    "ranking_page.html": lambda html: cfe.parse_ranking_items(html),
+    "climb_detail.html": lambda html: cfe.parse_climb_detail(html, DETAIL_URL),
+    # Fallback layouts, through the shared ranking engine
+    "ranking_table.html": lambda html: ranking_parser.parse_ranking_page(html, 1)._asdict(),
+    "ranking_next_data.html": lambda html: ranking_parser.parse_ranking_page(html, 1)._asdict(),
+    "ranking_links.html": lambda html: ranking_parser.parse_ranking_page(html, 1)._asdict(),
+    "ranking_card_text.html": lambda html: ranking_parser.parse_ranking_page(html, 1)._asdict(),
+}
+
+
+def _golden_path(name: str) -> Path:
+    return FIXTURES / name.replace(".html", ".golden.json")
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--update", action="store_true", help="re-record golden files with html.parser")
+    ap.add_argument("--number", type=int, default=20, help="parses per timing run")
+    args = ap.parse_args(argv)
+
+    cfe.set_parse_cache(None)
+    backends = cfe.available_parser_backends()
+    failures = 0
+
+    for name, parse in CASES.items():
+        html = (FIXTURES / name).read_text(encoding="utf-8")
+        golden = _golden_path(name)
+        if args.update:
+            cfe.set_parser_backend("html.parser")
+            golden.write_text(json.dumps(parse(html), ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+            print(f"recorded {golden.name}")
+            continue
+
+        expected = json.loads(golden.read_text(encoding="utf-8"))
+        timings = {}
+        for backend in backends:
+            cfe.set_parser_backend(backend)
+            got = parse(html)
+            if json.dumps(got, sort_keys=True) != json.dumps(expected, sort_keys=True):
+                failures += 1
+                print(f"MISMATCH {name} [{backend}]")
+            best = min(timeit.repeat(lambda: parse(html), number=args.number, repeat=3))
+            timings[backend] = best / args.number * 1000
+        base = timings.get("html.parser")
+        line = ", ".join(
+            f"{b} {ms:.2f} ms" + (f" ({base / ms:.1f}x)" if base and b != "html.parser" else "")
+            for b, ms in timings.items()
+        )
+        print(f"{name}: {line}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,354 @@
+"""
+Benchmark suite for the fetch, parse and export hot paths.
+
+Every benchmark runs at 1, 25, 500 and 10k climbs, built from the recorded
+fixtures in benchmarks/fixtures. Fetch benchmarks go through a local stand-in
+HTTP server that serves those fixtures, so nothing leaves the machine. HTTP
+and parse caches are disabled so every round does the full work.
+
+Timings (best of up to --rounds runs) are compared with a saved baseline; the
+run exits 1 when a benchmark is more than --threshold slower than its baseline.
+Baselines are machine-specific, so they are not committed.
+
+Usage:
+    python benchmarks/bench_suite.py --save            # record benchmarks/baseline.json
+    python benchmarks/bench_suite.py                   # compare with it
+    python benchmarks/bench_suite.py --sizes 1,25,500 -k parse --threshold 0.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import math
+import platform
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pandas as pd  # noqa: E402
+
+import climbfinder_export as cfe  # noqa: E402
+import columnar  # noqa: E402
+import export_writer  # noqa: E402
+import ranking_parser  # noqa: E402
+import ratelimit  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+SIZES = (1, 25, 500, 10_000)
+DETAIL_PATH = "en/climbs/col-de-la-colombiere-le-reposoir"
+# Differences below this are timer noise, whatever the ratio
+MIN_REGRESSION_S = 0.002
+
+_CARD_START = '      <div class="ranking-item-item" data-rank='
+_LIST_END = '    </div>\n    <ul class="pagination"'
+
+
+def _fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+class Inputs:
+    """Fixture-derived inputs, loaded once per run."""
+
+    def __init__(self) -> None:
+        page = _fixture("ranking_page.html")
+        head, _, rest = page.partition(_CARD_START)
+        cards, _, tail = rest.partition(_LIST_END)
+        self._head, self._tail = head, _LIST_END + tail
+        self._cards = [_CARD_START + c for c in cards.split(_CARD_START)]
+        self.table_page = _fixture("ranking_table.html")
+        self.next_data_page = _fixture("ranking_next_data.html")
+        self.links_page = _fixture("ranking_links.html")
+        self.card_text_page = _fixture("ranking_card_text.html")
+        self.detail_html = _fixture("climb_detail.html")
+        self.detail_url = cfe.BASE + DETAIL_PATH
+        self.detail = cfe.parse_climb_detail(self.detail_html, self.detail_url)
+        self.summaries = cfe.parse_ranking_items(page)
+        self.rows = ranking_parser.parse_ranking_page(page, 1).rows
+
+    def ranking_pages(self, n: int) -> list[str]:
+        """Ranking pages holding ``n`` climbs in total (full pages, then a partial one)."""
+        per = len(self._cards)
+        sizes = [per] * (n // per) + ([n % per] if n % per else [])
+        return [self._head + "".join(self._cards[:k]) + self._tail for k in sizes]
+
+    def pages_for(self, html: str, n: int) -> list[str]:
+        return [html] * math.ceil(n / ranking_parser.PAGE_SIZE)
+
+    def ranking_rows(self, n: int) -> list[dict[str, Any]]:
+        return [dict(self.rows[i % len(self.rows)], rank=i + 1) for i in range(n)]
+
+    def summary_rows(self, n: int) -> list[dict[str, Any]]:
+        return [self.summaries[i % len(self.summaries)] for i in range(n)]
+
+
+# -- stand-in server -------------------------------------------------------------
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real site
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+    pages: dict[str, bytes] = {}
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:  # noqa: N802
+        body = self.pages["ranking" if self.path.startswith("/en/ranking") else "detail"]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server() -> tuple[ThreadingHTTPServer, str]:
+    """Serve the ranking and detail fixtures on localhost; returns (server, base URL)."""
+    _FixtureHandler.pages = {
+        "ranking": _fixture("ranking_page.html").encode("utf-8"),
+        "detail": _fixture("climb_detail.html").encode("utf-8"),
+    }
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FixtureHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/"
+
+
+# -- benchmarks ------------------------------------------------------------------
+
+# name -> setup(inputs, n) returning the callable to time
+BENCHMARKS: dict[str, Callable[[Inputs, int], Callable[[], Any]]] = {}
+
+
+def bench(name: str) -> Callable:
+    def register(setup: Callable[[Inputs, int], Callable[[], Any]]) -> Callable:
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+@bench("parse_ranking_items")
+def _bench_parse_ranking_items(inp: Inputs, n: int) -> Callable[[], Any]:
+    pages = inp.ranking_pages(n)
+    return lambda: [cfe.parse_ranking_items(p) for p in pages]
+
+
+@bench("parse_climb_detail")
+def _bench_parse_climb_detail(inp: Inputs, n: int) -> Callable[[], Any]:
+    return lambda: [cfe.parse_climb_detail(inp.detail_html, inp.detail_url) for _ in range(n)]
+
+
+@bench("linestring_coords")
+def _bench_linestring_coords(inp: Inputs, n: int) -> Callable[[], Any]:
+    return lambda: [cfe._linestring_coords(inp.detail_html) for _ in range(n)]
+
+
+@bench("build_export_object")
+def _bench_build_export_object(inp: Inputs, n: int) -> Callable[[], Any]:
+    summaries = inp.summary_rows(n)
+    return lambda: [cfe.build_export_object(inp.detail, s, "Haute-Savoie, France") for s in summaries]
+
+
+# The Streamlit/Flask ranking strategies (ranking_parser), one layout each
+@bench("parse_ranking_page[cards]")
+def _bench_strategy_cards(inp: Inputs, n: int) -> Callable[[], Any]:
+    pages = inp.ranking_pages(n)
+    return lambda: [ranking_parser.parse_ranking_page(p, i + 1) for i, p in enumerate(pages)]
+
+
+@bench("parse_ranking_page[table]")
+def _bench_strategy_table(inp: Inputs, n: int) -> Callable[[], Any]:
+    pages = inp.pages_for(inp.table_page, n)
+    return lambda: [ranking_parser.parse_ranking_page(p, i + 1) for i, p in enumerate(pages)]
+
+
+@bench("parse_ranking_page[next_data]")
+def _bench_strategy_next_data(inp: Inputs, n: int) -> Callable[[], Any]:
+    pages = inp.pages_for(inp.next_data_page, n)
+    return lambda: [ranking_parser.parse_ranking_page(p, i + 1) for i, p in enumerate(pages)]
+
+
+@bench("parse_ranking_page[links]")
+def _bench_strategy_links(inp: Inputs, n: int) -> Callable[[], Any]:
+    pages = inp.pages_for(inp.links_page, n)
+    return lambda: [ranking_parser.parse_ranking_page(p, i + 1) for i, p in enumerate(pages)]
+
+
+@bench("parse_ranking_page[card_text]")
+def _bench_strategy_card_text(inp: Inputs, n: int) -> Callable[[], Any]:
+    pages = inp.pages_for(inp.card_text_page, n)
+    return lambda: [ranking_parser.parse_ranking_page(p, i + 1) for i, p in enumerate(pages)]
+
+
+def _ranking_export_frame(rows: list[dict[str, Any]]) -> pd.DataFrame:
+    # Same columns as the Streamlit ranking download
+    columns = export_writer.RANKING_COLUMNS
+    return pd.DataFrame([[r.get(k) for k, _ in columns] for r in rows], columns=[h for _, h in columns])
+
+
+@bench("export_excel")
+def _bench_export_excel(inp: Inputs, n: int) -> Callable[[], Any]:
+    rows = inp.ranking_rows(n)
+
+    def run() -> bytes:
+        buf = io.BytesIO()
+        export_writer.write_xlsx(rows, buf)
+        return buf.getvalue()
+    return run
+
+
+@bench("export_csv")
+def _bench_export_csv(inp: Inputs, n: int) -> Callable[[], Any]:
+    rows = inp.ranking_rows(n)
+    return lambda: _ranking_export_frame(rows).to_csv(index=False)
+
+
+def _streamed_export(inp: Inputs, n: int, fmt: str, compress: bool = False) -> Callable[[], Any]:
+    batch = [cfe.build_export_object(inp.detail, s, "Haute-Savoie, France") for s in inp.summary_rows(n)]
+
+    def run() -> bytes:
+        buf = io.BytesIO()
+        export_writer.write_export(batch, buf, fmt, compress=compress)
+        return buf.getvalue()
+    return run
+
+
+@bench("export_json")
+def _bench_export_json(inp: Inputs, n: int) -> Callable[[], Any]:
+    return _streamed_export(inp, n, "json")
+
+
+@bench("export_ndjson")
+def _bench_export_ndjson(inp: Inputs, n: int) -> Callable[[], Any]:
+    return _streamed_export(inp, n, "ndjson")
+
+
+@bench("export_json_gzip")
+def _bench_export_json_gzip(inp: Inputs, n: int) -> Callable[[], Any]:
+    return _streamed_export(inp, n, "json", compress=True)
+
+
+@bench("export_parquet")
+def _bench_export_parquet(inp: Inputs, n: int) -> Callable[[], Any]:
+    batch = [cfe.build_export_object(inp.detail, s, "Haute-Savoie, France") for s in inp.summary_rows(n)]
+
+    def run() -> bytes:
+        buf = io.BytesIO()
+        columnar.write_records(batch, buf, "parquet")
+        return buf.getvalue()
+    return run
+
+
+@bench("fetch_ranking_html")
+def _bench_fetch_ranking(inp: Inputs, n: int) -> Callable[[], Any]:
+    pages = math.ceil(n / ranking_parser.PAGE_SIZE)
+    limiter = ratelimit.RateLimiter(rate=0, max_in_flight=1)
+    return lambda: [cfe.fetch_ranking_html(288, p, limiter=limiter) for p in range(1, pages + 1)]
+
+
+@bench("fetch_details")
+def _bench_fetch_details(inp: Inputs, n: int) -> Callable[[], Any]:
+    rows = [dict(s, url=cfe.BASE + DETAIL_PATH) for s in inp.summary_rows(n)]
+    limiter = ratelimit.RateLimiter(rate=0, max_in_flight=ratelimit.DEFAULT_MAX_IN_FLIGHT)
+    return lambda: cfe.fetch_details(rows, max_workers=ratelimit.DEFAULT_MAX_IN_FLIGHT, limiter=limiter)
+
+
+# -- runner ----------------------------------------------------------------------
+
+def measure(fn: Callable[[], Any], rounds: int, min_time_s: float = 0.5) -> float:
+    """Best wall time of ``fn`` over up to ``rounds`` runs; slow benchmarks (> min_time_s) run once."""
+    best = math.inf
+    spent = 0.0
+    for _ in range(max(1, rounds)):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        spent += elapsed
+        if spent > min_time_s:
+            break
+    return best
+
+
+def load_baseline(path: Path) -> dict[str, Any]:
+    if not path.exists():
+        return {"meta": {}, "results": {}}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default=",".join(map(str, SIZES)), help="climb counts, comma-separated")
+    ap.add_argument("-k", dest="keyword", default="", help="only benchmarks whose name contains this")
+    ap.add_argument("--rounds", type=int, default=5, help="max runs per benchmark (best is kept)")
+    ap.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    ap.add_argument("--save", action="store_true", help="write these timings into the baseline")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    args = ap.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    names = [name for name in BENCHMARKS if args.keyword in name]
+
+    cfe.set_http_cache(None)
+    cfe.set_parse_cache(None)
+    server, base = start_server()
+    # Every URL the fetchers build points at the stand-in server for this run
+    cfe.BASE = base
+    inputs = Inputs()
+
+    baseline = load_baseline(args.baseline)
+    previous = baseline.get("results", {})
+    if baseline.get("meta", {}).get("parser") not in (None, cfe.parser_backend()):
+        print(f"note: baseline used parser {baseline['meta']['parser']}, this run uses {cfe.parser_backend()}")
+
+    results: dict[str, dict[str, float]] = {}
+    regressions = []
+    print(f"{'benchmark':32} {'climbs':>7} {'time':>10} {'per climb':>11} {'baseline':>10}")
+    for name in names:
+        for n in sizes:
+            elapsed = measure(BENCHMARKS[name](inputs, n), args.rounds)
+            results.setdefault(name, {})[str(n)] = elapsed
+            old = previous.get(name, {}).get(str(n))
+            verdict = ""
+            if old:
+                ratio = elapsed / old
+                verdict = f"{ratio:9.2f}x"
+                if ratio > 1 + args.threshold and elapsed - old > MIN_REGRESSION_S:
+                    regressions.append((name, n, old, elapsed))
+                    verdict += "  REGRESSION"
+            print(f"{name:32} {n:>7} {elapsed * 1000:>8.1f}ms {elapsed / n * 1e6:>9.1f}us {verdict}")
+    server.shutdown()
+
+    if args.save:
+        merged = {k: dict(v) for k, v in previous.items()}
+        for name, by_size in results.items():
+            merged.setdefault(name, {}).update(by_size)
+        args.baseline.write_text(json.dumps({
+            "meta": {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "parser": cfe.parser_backend(),
+                "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "results": merged,
+        }, indent=2) + "\n", encoding="utf-8")
+        print(f"saved {args.baseline}")
+        return 0
+
+    if not previous:
+        print(f"no baseline at {args.baseline}; run with --save to record one")
+    for name, n, old, new in regressions:
+        print(f"REGRESSION {name} @ {n}: {old * 1000:.1f} ms -> {new * 1000:.1f} ms")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
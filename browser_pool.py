@@ -0,0 +1,240 @@
+"""
+Long-lived headless Chromium shared by every Playwright scrape in the process.
+
+One browser and one context are launched on first use and kept until exit.
+Playwright runs on its own thread with an asyncio loop, so callers on any
+thread (Streamlit reruns, worker pools) can call ``fetch`` concurrently; a
+small pool of reusable pages bounds how many load at once. Images, fonts,
+media and analytics requests are aborted before they leave the browser.
+
+A tab that errors is closed, and a new one is opened for the next fetch. When
+the context or browser is gone, both are relaunched; if that fails too, the pool
+is marked ``failed`` and ``available()`` turns False so callers use requests.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import threading
+from concurrent.futures import Future
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+import climbfinder_export as cfe
+
+DEFAULT_PAGES = 2
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font", "stylesheet"})
+BLOCKED_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "facebook.net", "facebook.com", "hotjar.com", "cloudflareinsights.com", "adservice.google.com",
+)
+RANKING_READY_SELECTOR = "table tr td, a[href*='/climbs/'], a[href*='/cols/'], [class*='ranking']"
+
+
+class Rendered(NamedTuple):
+    html: str
+    status: int | None  # of the main document; None when goto gave no response
+    headers: dict[str, str]  # its response headers, names lower-cased
+
+
+class BrowserPool:
+    """A Chromium instance plus ``pages`` reusable tabs, driven from a private event-loop thread."""
+
+    def __init__(self, pages: int = DEFAULT_PAGES, user_agent: str = cfe.USER_AGENT) -> None:
+        self.n_pages = max(1, pages)
+        self.user_agent = user_agent
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._pw = None
+        self._browser = None
+        self._context = None
+        self._idle: list = []  # open pages not in use
+        self._slots: asyncio.Semaphore | None = None  # one per page, held while it loads
+        self._relaunch_lock: asyncio.Lock | None = None
+        self._lock = threading.Lock()
+        self.failed = False  # relaunching after a crash failed
+
+    # -- lifecycle ------------------------------------------------------------
+
+    def start(self, timeout: float = 60) -> None:
+        """Launch the loop thread and the browser; raises if Playwright/Chromium is unavailable."""
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="browser-pool", daemon=True)
+            thread.start()
+            try:
+                asyncio.run_coroutine_threadsafe(self._launch(), loop).result(timeout)
+            except BaseException:
+                asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout)
+                loop.call_soon_threadsafe(loop.stop)
+                thread.join(timeout)
+                raise
+            self._loop, self._thread = loop, thread
+
+    async def _launch(self) -> None:
+        from playwright.async_api import async_playwright
+
+        if self._pw is None:
+            self._pw = await async_playwright().start()
+        if self._browser is None or not self._browser.is_connected():
+            self._browser = await self._pw.chromium.launch(headless=True)
+        self._context = await self._browser.new_context(
+            user_agent=self.user_agent, viewport={"width": 1280, "height": 900}, locale="en-US",
+        )
+        await self._context.route("**/*", self._route)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.n_pages)
+            self._relaunch_lock = asyncio.Lock()
+        self._idle = [await self._context.new_page() for _ in range(self.n_pages)]
+
+    async def _relaunch(self) -> None:
+        """Replace a dead context, and the browser too when it has disconnected."""
+        self._idle = []
+        dead = [self._context]
+        if self._browser is not None and not self._browser.is_connected():
+            dead.append(self._browser)
+            self._browser = None
+        for obj in dead:
+            try:
+                await obj.close()
+            except Exception:  # noqa: BLE001
+                pass
+        try:
+            await self._launch()
+        except Exception:
+            self.failed = True
+            raise
+        self.failed = False
+
+    async def _route(self, route) -> None:
+        req = route.request
+        host = (urlparse(req.url).hostname or "").lower()
+        if req.resource_type in BLOCKED_RESOURCE_TYPES or any(
+            host == h or host.endswith("." + h) for h in BLOCKED_HOSTS
+        ):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _shutdown(self) -> None:
+        for obj in (self._context, self._browser):
+            if obj is not None:
+                try:
+                    await obj.close()
+                except Exception:  # noqa: BLE001
+                    pass
+        if self._pw is not None:
+            try:
+                await self._pw.stop()
+            except Exception:  # noqa: BLE001
+                pass
+        self._pw = self._browser = self._context = None
+        self._idle = []
+
+    def close(self, timeout: float = 30) -> None:
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            if thread is not None:
+                thread.join(timeout)
+
+    # -- fetching -------------------------------------------------------------
+
+    async def _new_page(self):
+        from playwright.async_api import Error as PlaywrightError
+
+        context = self._context
+        try:
+            return await context.new_page()
+        except PlaywrightError:
+            async with self._relaunch_lock:
+                if self._context is context:  # not already relaunched by another fetch
+                    await self._relaunch()
+            return await self._context.new_page()
+
+    async def _fetch(self, url: str, wait_selector: str | None, timeout_ms: int) -> Rendered:
+        from playwright.async_api import Error as PlaywrightError
+
+        async with self._slots:
+            page = self._idle.pop() if self._idle else None
+            if page is None or page.is_closed():
+                page = await self._new_page()
+            try:
+                response = await page.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
+                if wait_selector:
+                    try:
+                        await page.wait_for_selector(wait_selector, timeout=10000)
+                        await page.wait_for_timeout(500)
+                    except PlaywrightError:
+                        pass
+                return Rendered(
+                    await page.content(),
+                    response.status if response is not None else None,
+                    response.headers if response is not None else {},
+                )
+            except PlaywrightError:
+                # A crashed or wedged tab is closed rather than returned to the pool
+                try:
+                    await page.close()
+                except PlaywrightError:
+                    pass
+                raise
+            finally:
+                if not page.is_closed() and len(self._idle) < self.n_pages:
+                    self._idle.append(page)
+
+    def submit(self, url: str, wait_selector: str | None = RANKING_READY_SELECTOR, timeout_ms: int = 20000) -> Future:
+        """Schedule a page load; the future resolves to a Rendered (HTML, status, headers)."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self._fetch(url, wait_selector, timeout_ms), self._loop)
+
+    def fetch(self, url: str, wait_selector: str | None = RANKING_READY_SELECTOR, timeout_ms: int = 20000) -> Rendered:
+        """Rendered HTML of ``url``, with the document's status and headers (blocks the calling thread)."""
+        return self.submit(url, wait_selector, timeout_ms).result()
+
+
+_pool: BrowserPool | None = None
+_pool_lock = threading.Lock()
+_available: bool | None = None
+
+
+def get_pool() -> BrowserPool:
+    """The process-wide pool (browser launched lazily on the first fetch)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+        return _pool
+
+
+def available() -> bool:
+    """True when Chromium can be launched and the pool has not failed since; the launched
+    browser is kept for later fetches."""
+    global _available
+    if _available is None:
+        try:
+            get_pool().start()
+            _available = True
+        except Exception:  # noqa: BLE001
+            _available = False
+    return _available and not get_pool().failed
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+atexit.register(shutdown)
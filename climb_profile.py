@@ -0,0 +1,87 @@
+"""
+Climb profile analytics computed from the full LineString geometry.
+
+Everything is vectorized over the coordinate array (no per-point Python
+loops): cumulative haversine distance, total ascent/descent when the points
+carry elevation, and the steepest gradient over sliding 100 m / 500 m / 1 km
+windows.
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import Any
+
+import numpy as np
+
+EARTH_RADIUS_M = 6_371_008.8
+GRADE_WINDOWS_M = (100, 500, 1000)
+
+
+def cumulative_distance_m(lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """Haversine distance from the first point, in metres (same length as the input)."""
+    lon_r = np.radians(lon)
+    lat_r = np.radians(lat)
+    dlat = np.diff(lat_r)
+    dlon = np.diff(lon_r)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat_r[:-1]) * np.cos(lat_r[1:]) * np.sin(dlon / 2) ** 2
+    seg = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    out = np.empty(len(lon))
+    out[0] = 0.0
+    np.cumsum(seg, out=out[1:])
+    return out
+
+
+def steepest_window(dist: np.ndarray, ele: np.ndarray, window_m: float) -> dict[str, float] | None:
+    """Steepest section at least ``window_m`` long: each start point is paired with the
+    first point ``window_m`` further along. None when the climb is shorter than the window."""
+    end = np.searchsorted(dist, dist + window_m)
+    valid = end < len(dist)
+    if not valid.any():
+        return None
+    start = np.nonzero(valid)[0]
+    end = end[valid]
+    grades = (ele[end] - ele[start]) / (dist[end] - dist[start]) * 100.0
+    i = int(np.argmax(grades))
+    return {
+        "window_m": window_m,
+        "start_km": round(float(dist[start[i]]) / 1000, 3),
+        "end_km": round(float(dist[end[i]]) / 1000, 3),
+        "grade": round(float(grades[i]), 2),
+    }
+
+
+def compute_profile(coords: array | np.ndarray, dims: int) -> dict[str, Any]:
+    """Profile stats for a flat lon, lat[, ele] coordinate array with ``dims`` values per point.
+
+    Grade and ascent figures are 0 / empty when the geometry has no elevation.
+    """
+    empty: dict[str, Any] = {
+        "profile_length_km": 0.0,
+        "total_ascent_m": 0,
+        "total_descent_m": 0,
+        **{f"max_grade_{w}m": 0.0 for w in GRADE_WINDOWS_M},
+        "steepest_sections": [],
+    }
+    if dims < 2 or len(coords) < 2 * dims:
+        return empty
+    flat = np.frombuffer(coords, dtype=np.float64) if isinstance(coords, array) else np.asarray(coords, dtype=np.float64)
+    pts = flat.reshape(-1, dims)
+    dist = cumulative_distance_m(pts[:, 0], pts[:, 1])
+    out = dict(empty, profile_length_km=round(float(dist[-1]) / 1000, 3))
+    if dims < 3:
+        return out
+
+    ele = pts[:, 2]
+    dz = np.diff(ele)
+    out["total_ascent_m"] = int(round(float(dz[dz > 0].sum())))
+    out["total_descent_m"] = int(round(float(-dz[dz < 0].sum())))
+    sections = []
+    for w in GRADE_WINDOWS_M:
+        sec = steepest_window(dist, ele, w)
+        if sec is None:
+            continue
+        out[f"max_grade_{w}m"] = sec["grade"]
+        sections.append(sec)
+    out["steepest_sections"] = sections
+    return out
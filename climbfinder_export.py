@@ -6,16 +6,34 @@ Used by streamlit_app for personal aggregation workflows.
 
 from __future__ import annotations
 
-import json
+import os
 import re
+import threading
 import time
-from typing import Any
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable
 from urllib.parse import urljoin, urlparse
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, FeatureNotFound, SoupStrainer, Tag
+
+import http_cache
+import metrics
+import parse_cache
+import ratelimit
+
+# numpy comes with it; only detail pages with a LineString need it
+climb_profile = metrics.lazy_module("climb_profile")
+# Only the proximity helpers (climbs_near, climbs_in_corridor) need it
+geo_index = metrics.lazy_module("geo_index")
 
 BASE = "https://climbfinder.com/"
+# Bump whenever parse_ranking_items / parse_climb_detail output changes (invalidates parse_cache).
+PARSER_VERSION = "2"
 USER_AGENT = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
     "(KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
@@ -44,25 +62,206 @@ FLAG_ICON_TO_ISO2 = {
 }
 
 
-def new_http_session() -> requests.Session:
+# Connection pool per host: enough for the detail worker pool plus concurrent app requests
+HTTP_POOL_SIZE = 16
+HTTP_RETRIES = 3
+HTTP_BACKOFF_S = 0.5
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def _accept_encoding() -> str:
+    # urllib3 only decodes brotli when a brotli package is installed
+    for mod in ("brotli", "brotlicffi"):
+        try:
+            __import__(mod)
+            return "gzip, deflate, br"
+        except ImportError:
+            continue
+    return "gzip, deflate"
+
+
+class _Retry(Retry):
+    """urllib3 Retry that gives up at once on a Retry-After longer than ratelimit.RETRY_AFTER_MAX_S,
+    and counts retries and backoff time in metrics.
+
+    Giving up raises MaxRetryError from ``increment``; with ``raise_on_status=False`` urllib3
+    then returns the 429/503 response as is, so the caller (and the adaptive limiter) sees it
+    straight away instead of after a round of short backoff retries.
+    """
+
+    def increment(self, method: str | None = None, url: str | None = None, response: Any = None,
+                  error: Exception | None = None, _pool: Any = None, _stacktrace: Any = None) -> Retry:
+        if response is not None and self.respect_retry_after_header:
+            retry_after = self.get_retry_after(response)
+            if retry_after is not None and retry_after > ratelimit.RETRY_AFTER_MAX_S:
+                raise MaxRetryError(_pool, url, ResponseError(f"Retry-After {retry_after:.0f}s is too long"))
+        reason = type(error).__name__ if error is not None else str(getattr(response, "status", "unknown"))
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)  # raises once exhausted
+        metrics.inc("http_retries_total", reason=reason)
+        return retry
+
+    def sleep(self, response: Any = None) -> None:
+        start = time.monotonic()
+        super().sleep(response)
+        metrics.inc("sleep_seconds_total", time.monotonic() - start, reason="retry_backoff")
+
+
+def new_http_session(
+    pool_size: int = HTTP_POOL_SIZE,
+    retries: int = HTTP_RETRIES,
+    backoff_s: float = HTTP_BACKOFF_S,
+) -> requests.Session:
+    """Session with browser headers, keep-alive connection pools and retries.
+
+    GET/HEAD requests that fail to connect or return 429/5xx are retried up to ``retries``
+    times with exponential backoff (``backoff_s`` * 2^n, plus jitter), honouring Retry-After.
+    Prefer http_session() so connections are reused across calls.
+    """
     s = requests.Session()
     s.headers.update({
         "User-Agent": USER_AGENT,
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
         "Accept-Language": "en-US,en;q=0.9",
+        "Accept-Encoding": _accept_encoding(),
+        "Connection": "keep-alive",
         "Referer": "https://climbfinder.com/en/ranking",
     })
+    retry = _Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_s,
+        backoff_jitter=backoff_s / 2,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
     return s
 
 
-def fetch_ranking_html(region_id: int | str, page: int, session: requests.Session | None = None) -> str:
-    own = session is None
-    if own:
-        session = new_http_session()
-    url = f"{BASE}en/ranking?l={region_id}&p={page}"
-    r = session.get(url, timeout=25)
-    r.raise_for_status()
-    return r.text
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def http_session() -> requests.Session:
+    """Process-wide pooled session used by every fetch that is not given its own."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = new_http_session()
+        return _session
+
+
+# HttpCache instance, None (disabled), or a callable returning either (resolved per fetch).
+_http_cache: Any = http_cache.default_cache
+
+
+def set_http_cache(cache: http_cache.HttpCache | None) -> None:
+    """Use ``cache`` for fetch_ranking_html / fetch_climb_html; None disables caching."""
+    global _http_cache
+    _http_cache = cache
+
+
+def _get_html(
+    url: str,
+    session: requests.Session,
+    limiter: ratelimit.RateLimiter | None = None,
+    revalidate: bool = False,
+    kind: str = "page",
+) -> str:
+    cache = _http_cache() if callable(_http_cache) else _http_cache
+    if limiter is None:
+        limiter = ratelimit.limiter_for(url)
+    try:
+        with metrics.timer("fetch_seconds", kind=kind):
+            if cache is not None:
+                return cache.get(session, url, timeout=25, limiter=limiter, revalidate=revalidate)
+            r = ratelimit.send(limiter, lambda: session.get(url, timeout=25))
+            metrics.record_response(r)
+            r.raise_for_status()
+            return r.text
+    except Exception as exc:
+        metrics.record_error("fetch", exc)
+        raise
+
+
+def ranking_url(region_id: int | str, page: int) -> str:
+    return f"{BASE}en/ranking?l={region_id}&p={page}"
+
+
+def fetch_ranking_html(
+    region_id: int | str,
+    page: int,
+    session: requests.Session | None = None,
+    limiter: ratelimit.RateLimiter | None = None,
+    revalidate: bool = False,
+) -> str:
+    """Ranking page HTML; ``revalidate`` asks the server even if the cached copy is fresh.
+
+    Requests go through ``limiter`` (default: the shared adaptive limiter for the host).
+    """
+    return _get_html(ranking_url(region_id, page), session or http_session(), limiter, revalidate, kind="ranking")
+
+
+def available_parser_backends() -> list[str]:
+    """BeautifulSoup tree builders usable here, fastest first ("html.parser" is always last)."""
+    found = []
+    for name in _FAST_PARSER_BACKENDS:
+        try:
+            BeautifulSoup("", name)
+        except FeatureNotFound:
+            continue
+        found.append(name)
+    return found + ["html.parser"]
+
+
+# C-backed builders tried in order; both must yield the same dicts as html.parser (see benchmarks/).
+_FAST_PARSER_BACKENDS = ("lxml",)
+_parser_backend: str | None = os.environ.get("CLIMBFINDER_PARSER") or None
+
+
+def set_parser_backend(name: str | None) -> None:
+    """Force a BeautifulSoup backend ("lxml", "html.parser"); None picks the fastest installed."""
+    global _parser_backend
+    _parser_backend = name
+
+
+def parser_backend() -> str:
+    global _parser_backend
+    if _parser_backend is None:
+        _parser_backend = available_parser_backends()[0]
+    return _parser_backend
+
+
+def make_soup(html: str, parse_only: SoupStrainer | None = None) -> BeautifulSoup:
+    """Parse ``html`` with the selected backend (lxml when installed, else html.parser)."""
+    return BeautifulSoup(html, parser_backend(), parse_only=parse_only)
+
+
+# ParseCache instance, None (disabled), or a callable returning either (resolved per parse).
+_parse_cache: Any = parse_cache.default_cache
+
+
+def set_parse_cache(cache: parse_cache.ParseCache | None) -> None:
+    """Use ``cache`` for parse_ranking_items / parse_climb_detail; None disables memoization."""
+    global _parse_cache
+    _parse_cache = cache
+
+
+def _memoize_parse(kind: str, html: str, parse: Callable[[], Any], extra: str = "") -> Any:
+    def timed() -> Any:
+        with metrics.timer("parse_seconds", kind=kind):
+            return parse()
+
+    cache = _parse_cache() if callable(_parse_cache) else _parse_cache
+    if cache is None:
+        return timed()
+    return cache.memoize(kind, html, PARSER_VERSION, timed, extra=extra)
 
 
 def short_name_from_url(page_url: str) -> str:
@@ -70,21 +269,20 @@ def short_name_from_url(page_url: str) -> str:
     return path.replace("-", " ").title() if path else ""
 
 
-def fetch_climb_html(path_or_url: str, session: requests.Session | None = None) -> str:
-    own = session is None
-    if own:
-        session = new_http_session()
+def fetch_climb_html(
+    path_or_url: str,
+    session: requests.Session | None = None,
+    limiter: ratelimit.RateLimiter | None = None,
+    revalidate: bool = False,
+) -> str:
     if path_or_url.startswith("http"):
         url = path_or_url
     else:
         url = urljoin(BASE, path_or_url.lstrip("/"))
-    r = session.get(url, timeout=25)
-    r.raise_for_status()
-    return r.text
+    return _get_html(url, session or http_session(), limiter, revalidate, kind="detail")
 
 
-def _flag_iso_from_item(item: BeautifulSoup) -> str:
-    span = item.select_one(".ranking-item-flag span[class*='flag-icon-']")
+def _flag_iso(span: Tag | None) -> str:
     if not span:
         return ""
     classes = span.get("class") or []
@@ -96,41 +294,63 @@ def _flag_iso_from_item(item: BeautifulSoup) -> str:
 
 
 def parse_ranking_items(html: str) -> list[dict[str, Any]]:
-    """Extract climb rows from a ranking page HTML."""
-    soup = BeautifulSoup(html, "html.parser")
+    """Extract climb rows from a ranking page HTML (memoized on the HTML hash)."""
+    return _memoize_parse("ranking", html, lambda: _parse_ranking_items(html))
+
+
+# Stat cells of a ranking card, by CSS class (first match in document order wins)
+_RANKING_STAT_CLASSES = (
+    "ranking-item-length",
+    "ranking-item-gradient",
+    "ranking-item-cotacol",
+    "ranking-item-ascent",
+    "ranking-item-finish",
+    "ranking-item-category",
+)
+
+
+def _parse_ranking_items(html: str) -> list[dict[str, Any]]:
+    # Only build the card subtrees; the rest of the page is never looked at
+    soup = make_soup(html, parse_only=SoupStrainer("div", class_="ranking-item-item"))
     out: list[dict[str, Any]] = []
-    for block in soup.select("div.ranking-item-item"):
-        link = block.select_one('a.ranking-item-link[href*="climbs/"]')
+    for block in soup.find_all("div", class_="ranking-item-item"):
+        # One walk over the card instead of a select_one() per field
+        link = name_el = flag_span = None
+        climb_id = None
+        cells: dict[str, Tag] = {}
+        for el in block.find_all(True):
+            classes = el.get("class") or ()
+            if el.name == "a":
+                if link is None and "ranking-item-link" in classes and "climbs/" in (el.get("href") or ""):
+                    link = el
+                if name_el is None and "ranking-card-title" in classes:
+                    name_el = el
+            elif el.name == "button" and climb_id is None:
+                did = el.get("data-id")
+                if did and did.isdigit():
+                    climb_id = int(did)
+            if flag_span is None and "ranking-item-flag" in classes:
+                flag_span = el.select_one("span[class*='flag-icon-']")
+            for c in classes:
+                if c in _RANKING_STAT_CLASSES and c not in cells:
+                    cells[c] = el
+
         if not link or not link.get("href"):
             continue
         href = link["href"].strip()
         if "climbs/" not in href or href.rstrip("/").endswith("climbs"):
             continue
         title = (link.get("title") or "").strip()
-        name_el = block.select_one("a.ranking-card-title")
         short_name = name_el.get_text(strip=True) if name_el else ""
         display_name = title or short_name
         path = href.split("?", 1)[0]
         full_url = urljoin(BASE, path)
 
-        climb_id = None
-        for btn in block.select("button[data-id]"):
-            did = btn.get("data-id")
-            if did and did.isdigit():
-                climb_id = int(did)
-                break
-
-        def stat(sel: str) -> str:
-            el = block.select_one(sel)
+        def stat(cls: str) -> str:
+            el = cells.get(cls)
             return el.get_text(" ", strip=True) if el else ""
 
-        length_t = stat(".ranking-item-length")
-        grad_t = stat(".ranking-item-gradient")
-        pts_t = stat(".ranking-item-cotacol")
-        ascent_t = stat(".ranking-item-ascent")
-        finish_t = stat(".ranking-item-finish")
-
-        cat_el = block.select_one(".ranking-item-category")
+        cat_el = cells.get("ranking-item-category")
         category = cat_el.get_text(strip=True) if cat_el else ""
 
         out.append({
@@ -139,12 +359,12 @@ def parse_ranking_items(html: str) -> list[dict[str, Any]]:
             "short_name": short_name,
             "path": path,
             "url": full_url,
-            "country_iso2": _flag_iso_from_item(block),
-            "length_km": _parse_float_stat(length_t),
-            "avg_grade": _parse_float_stat(grad_t),
-            "difficulty_points": _parse_int_stat(pts_t),
-            "ascent_m": _parse_int_stat(ascent_t),
-            "summit_m": _parse_int_stat(finish_t),
+            "country_iso2": _flag_iso(flag_span),
+            "length_km": _parse_float_stat(stat("ranking-item-length")),
+            "avg_grade": _parse_float_stat(stat("ranking-item-gradient")),
+            "difficulty_points": _parse_int_stat(stat("ranking-item-cotacol")),
+            "ascent_m": _parse_int_stat(stat("ranking-item-ascent")),
+            "summit_m": _parse_int_stat(stat("ranking-item-finish")),
             "category": category,
         })
     return out
@@ -166,30 +386,43 @@ def _parse_int_stat(s: str) -> int:
     return int(m.group(1)) if m else 0
 
 
-def _linestring_coords(html: str) -> list[list[float]]:
+_STRIP_BRACKETS = str.maketrans("", "", "[]")
+_ARRAY_OPEN = re.compile(r"\[\s*\[")
+_ARRAY_CLOSE = re.compile(r"\]\s*\]")
+
+
+def _linestring_coords(html: str) -> tuple[array, int]:
+    """Decode the first GeoJSON LineString in the page.
+
+    Returns ``(coords, dims)``: a flat ``array('d')`` of lon, lat[, ele] values and
+    the number of values per point (2 or 3); an empty array and 0 when none is found.
+    The array bounds are located on the page itself (no window copy, no length cap),
+    whitespace between brackets allowed, and only the coordinate text is decoded.
+    """
+    empty = array("d"), 0
     idx = html.find('"type": "LineString"')
     if idx < 0:
-        return []
-    sub = html[idx : idx + 500000]
-    co = sub.find('"coordinates":')
+        return empty
+    co = html.find('"coordinates":', idx)
     if co < 0:
-        return []
-    b = sub.find("[[", co)
-    if b < 0:
-        return []
-    depth = 0
-    for k in range(b, len(sub)):
-        if sub[k] == "[":
-            depth += 1
-        elif sub[k] == "]":
-            depth -= 1
-            if depth == 0:
-                try:
-                    arr = json.loads(sub[b : k + 1])
-                    return arr if isinstance(arr, list) else []
-                except json.JSONDecodeError:
-                    return []
-    return []
+        return empty
+    start = _ARRAY_OPEN.search(html, co)
+    if start is None:
+        return empty
+    b = start.start()
+    # Points are flat [x, y(, z)] lists, so the first "]]" (or "]\n]") closes the whole array
+    end = _ARRAY_CLOSE.search(html, b)
+    if end is None:
+        return empty
+    e = end.start()
+    dims = html.count(",", b, html.find("]", b)) + 1
+    try:
+        coords = array("d", map(float, html[b:e].translate(_STRIP_BRACKETS).split(",")))
+    except ValueError:
+        return empty
+    if dims < 2 or len(coords) % dims:
+        return empty
+    return coords, dims
 
 
 def _point_coords(html: str) -> tuple[float, float] | None:
@@ -240,21 +473,28 @@ def _summit_m_from_blurb(html: str) -> int:
 
 
 def parse_climb_detail(html: str, page_url: str) -> dict[str, Any]:
-    soup = BeautifulSoup(html, "html.parser")
+    """Extract the detail record from a climb page HTML (memoized on the HTML hash)."""
+    return _memoize_parse("detail", html, lambda: _parse_climb_detail(html, page_url), extra=page_url)
+
+
+def _parse_climb_detail(html: str, page_url: str) -> dict[str, Any]:
+    soup = make_soup(html)
     m = re.search(r"const\s+climbId\s*=\s*(\d+)\s*;", html)
     climb_id = int(m.group(1)) if m else 0
 
-    line = _linestring_coords(html)
-    start_lon, start_lat = (line[0][0], line[0][1]) if len(line) >= 1 else (0.0, 0.0)
+    coords, dims = _linestring_coords(html)
+    n_points = len(coords) // dims if dims else 0
+    start_lon, start_lat = (coords[0], coords[1]) if n_points >= 1 else (0.0, 0.0)
     finish = _point_coords(html)
     if finish:
         lon_top, lat_top = finish
-    elif len(line) >= 2:
-        lon_top, lat_top = line[-1][0], line[-1][1]
+    elif n_points >= 2:
+        lon_top, lat_top = coords[-dims], coords[-dims + 1]
     else:
         lon_top, lat_top = 0.0, 0.0
 
     tbl = _parse_stats_table(soup)
+    profile = climb_profile.compute_profile(coords, dims)
     alt_top = _summit_m_from_blurb(html)
     ascent = int(tbl.get("ascent_m") or 0)
     if alt_top and ascent:
@@ -286,10 +526,12 @@ def parse_climb_detail(html: str, page_url: str) -> dict[str, Any]:
         "alt_start": alt_start,
         "length_km": float(tbl.get("length_km") or 0),
         "avg_grade": float(tbl.get("avg_grade") or 0),
-        "max_grade": float(tbl.get("max_grade") or 0),
+        # Scraped "steepest" row when present, else derived from the geometry
+        "max_grade": float(tbl.get("max_grade") or profile["max_grade_100m"] or 0),
         "ascent_m": ascent,
         "difficulty_points": int(tbl.get("difficulty_points") or 0),
         "category": cat,
+        **profile,
     }
 
 
@@ -344,30 +586,96 @@ def build_export_object(
         "url": url,
         "bigId": cid,
         "source": "Climbfinder.com",
+        # Derived from the climb geometry (0 / empty when the page has no elevation profile)
+        "profileLengthKm": float(detail.get("profile_length_km") or 0.0),
+        "totalAscent": int(detail.get("total_ascent_m") or 0),
+        "totalDescent": int(detail.get("total_descent_m") or 0),
+        "maxGrade100m": float(detail.get("max_grade_100m") or 0.0),
+        "maxGrade500m": float(detail.get("max_grade_500m") or 0.0),
+        "maxGrade1km": float(detail.get("max_grade_1000m") or 0.0),
+        "steepestSections": list(detail.get("steepest_sections") or []),
     }
 
 
-def fetch_details_with_delay(
+def climbs_near(
+    records: list[dict[str, Any]],
+    lat: float,
+    lon: float,
+    km: float = 10.0,
+    limit: int | None = None,
+) -> list[dict[str, Any]]:
+    """build_export_object records within ``km`` of (lat, lon), closest first, plus
+    "distanceKm" and "nearPoint" (the climb's "start" or "summit")."""
+    return _with_hits(records, geo_index.SpatialIndex.from_records(records).radius(lat, lon, km, limit))
+
+
+def climbs_in_corridor(
+    records: list[dict[str, Any]],
+    track: list[tuple[float, float]],
+    km: float = 2.0,
+    limit: int | None = None,
+) -> list[dict[str, Any]]:
+    """build_export_object records within ``km`` of the route ``track`` [(lat, lon), ...],
+    closest first, with the same extra keys as climbs_near."""
+    return _with_hits(records, geo_index.SpatialIndex.from_records(records).corridor(track, km, limit))
+
+
+def _with_hits(records: list[dict[str, Any]], hits: list[Any]) -> list[dict[str, Any]]:
+    by_id = {int(r["bigId"]): r for r in records if r.get("bigId")}
+    return [{**by_id[h.climb_id], "distanceKm": h.distance_km, "nearPoint": h.point} for h in hits]
+
+
+def fetch_details(
     rows: list[dict[str, Any]],
-    delay_s: float = 0.75,
+    max_workers: int = 4,
+    limiter: ratelimit.RateLimiter | None = None,
     session: requests.Session | None = None,
+    on_progress: Callable[[int, int], None] | None = None,
+    revalidate: bool = False,
 ) -> list[tuple[dict[str, Any], str | None]]:
-    """Fetch detail pages for ranking rows. Returns (detail_dict, error)."""
-    own = session is None
-    if own:
-        session = new_http_session()
-    results: list[tuple[dict[str, Any], str | None]] = []
-    for i, row in enumerate(rows):
+    """Fetch detail pages for ranking rows concurrently. Returns (detail_dict, error) in input order.
+
+    Network requests go through ``limiter`` (default: the shared per-host limiter), which
+    caps requests/second and requests in flight; pages served from the HTTP cache skip it. ``on_progress(done, total)`` is called from
+    the calling thread as each row finishes. ``revalidate`` re-checks cached pages with the server.
+    """
+    if session is None:
+        session = http_session()
+    if limiter is None:
+        limiter = ratelimit.limiter_for(BASE)
+    results: list[tuple[dict[str, Any], str | None]] = [({}, None)] * len(rows)
+
+    def work(row: dict[str, Any]) -> tuple[dict[str, Any], str | None]:
         url = row.get("url") or ""
         if not url:
-            results.append(({}, "missing url"))
-            continue
+            return {}, "missing url"
         try:
-            html = fetch_climb_html(url, session=session)
-            d = parse_climb_detail(html, url)
-            results.append((d, None))
+            html = fetch_climb_html(url, session=session, limiter=limiter, revalidate=revalidate)
         except Exception as exc:  # noqa: BLE001
-            results.append(({}, str(exc)))
-        if i < len(rows) - 1 and delay_s > 0:
-            time.sleep(delay_s)
+            return {}, str(exc)  # counted by _get_html
+        try:
+            return parse_climb_detail(html, url), None
+        except Exception as exc:  # noqa: BLE001
+            metrics.record_error("parse", exc)
+            return {}, str(exc)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {pool.submit(work, row): i for i, row in enumerate(rows)}
+        for done, fut in enumerate(as_completed(futures), start=1):
+            results[futures[fut]] = fut.result()
+            if on_progress:
+                on_progress(done, len(rows))
     return results
+
+
+def fetch_details_with_delay(
+    rows: list[dict[str, Any]],
+    delay_s: float | None = None,
+    session: requests.Session | None = None,
+) -> list[tuple[dict[str, Any], str | None]]:
+    """Sequential fetch (kept for older callers; see fetch_details).
+
+    Pacing comes from the shared adaptive host limiter; ``delay_s`` is accepted
+    for compatibility and ignored.
+    """
+    return fetch_details(rows, max_workers=1, limiter=ratelimit.limiter_for(BASE), session=session)
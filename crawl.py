@@ -0,0 +1,239 @@
+"""
+Headless batch crawler for Climbfinder rankings (and optionally climb details).
+
+Crawls every ranking page of each region until an empty page, with a global
+concurrency limit and a per-host rate limit shared across regions. Results
+go to the SQLite store (store.py); progress is checkpointed there after every
+page and detail batch, so an interrupted run picks up where it stopped.
+
+Usage:
+    python crawl.py 288 957 192 --details
+    python crawl.py --country France --country Italy --details --rate 2 --concurrency 6
+    python crawl.py --all
+    python crawl.py 288 --restart        # re-crawl a finished region from page 1
+    python crawl.py --all --refresh --details   # daily incremental refresh
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any
+
+import requests
+
+import climbfinder_export as cfe
+import ratelimit
+import store
+from regions import REGIONS_BY_COUNTRY, region_label
+
+log = logging.getLogger("crawl")
+
+RANKING_PAGE_SIZE = 25
+DETAIL_BATCH = 25
+
+
+def crawl_ranking(
+    region_id: str,
+    db: store.ClimbStore,
+    limiter: ratelimit.RateLimiter,
+    session: requests.Session,
+    max_pages: int | None = None,
+) -> None:
+    """Fetch ranking pages from the checkpointed position until an empty page (or max_pages)."""
+    state = db.crawl_state(region_id)
+    label = region_label(region_id)
+    page = state["last_page"] + 1
+    while not state["ranking_done"]:
+        if max_pages and page > max_pages:
+            break
+        html = cfe.fetch_ranking_html(region_id, page, session=session, limiter=limiter)
+        rows = cfe.parse_ranking_items(html)
+        if not rows:
+            state["ranking_done"] = True
+            db.truncate_ranking(region_id, page - 1)
+            db.save_crawl_state(region_id, page - 1, True)
+            break
+        db.save_ranking_page(region_id, page, rows, region_label=label, page_size=RANKING_PAGE_SIZE)
+        db.save_crawl_state(region_id, page, False)
+        log.info("region %s: page %d, %d climbs", region_id, page, len(rows))
+        page += 1
+
+
+def refresh_ranking(
+    region_id: str,
+    db: store.ClimbStore,
+    limiter: ratelimit.RateLimiter,
+    session: requests.Session,
+    unchanged_pages: int = 2,
+    max_pages: int | None = None,
+) -> list[dict[str, Any]]:
+    """Re-check a stored ranking from page 1, stopping after ``unchanged_pages`` consecutive
+    pages whose climb_id sequence and summary stats match the stored copy.
+
+    Returns the rows whose detail page should be (re)fetched: climbs that are new to the
+    store, have no detail yet, or whose summary stats changed.
+    """
+    label = region_label(region_id)
+    stale: dict[int, dict[str, Any]] = {}
+    streak = 0
+    page = 1
+    last_page = db.crawl_state(region_id)["last_page"]
+    while streak < unchanged_pages and not (max_pages and page > max_pages):
+        html = cfe.fetch_ranking_html(region_id, page, session=session, limiter=limiter, revalidate=True)
+        rows = cfe.parse_ranking_items(html)
+        if not rows:
+            # The ranking ends here now: drop positions stored for pages past its end
+            db.truncate_ranking(region_id, page - 1)
+            last_page = page - 1
+            break
+        if db.page_unchanged(region_id, page, rows):
+            streak += 1
+            log.info("region %s: page %d unchanged (%d/%d)", region_id, page, streak, unchanged_pages)
+        else:
+            streak = 0
+            known = db.get_climbs(r.get("climb_id") for r in rows)
+            for row in rows:
+                old = known.get(row.get("climb_id"))
+                if old is None or "detail" not in old or store.summary_changed(old, row):
+                    stale[row["climb_id"]] = row
+            # Replaces the page's stored positions, so climbs that left it do not linger
+            db.save_ranking_page(region_id, page, rows, region_label=label, page_size=RANKING_PAGE_SIZE)
+            log.info("region %s: page %d changed", region_id, page)
+        last_page = max(last_page, page)
+        page += 1
+    db.save_crawl_state(region_id, last_page, True)
+    return [r for r in stale.values() if r.get("climb_id")]
+
+
+def crawl_details(
+    region_id: str,
+    db: store.ClimbStore,
+    limiter: ratelimit.RateLimiter,
+    session: requests.Session,
+    max_workers: int,
+    rows: list[dict[str, Any]] | None = None,
+    revalidate: bool = False,
+) -> int:
+    """Fetch detail pages for ``rows`` (default: the region's stored climbs that have none yet).
+    Returns the number of failures."""
+    if rows is None:
+        rows = [r for r in db.ranking_rows(region_id) if "detail" not in r]
+    todo = [r for r in rows if r.get("url")]
+    failures = 0
+    for start in range(0, len(todo), DETAIL_BATCH):
+        batch = todo[start : start + DETAIL_BATCH]
+        results = cfe.fetch_details(
+            batch, max_workers=max_workers, limiter=limiter, session=session, revalidate=revalidate,
+        )
+        details = []
+        for summary, (detail, err) in zip(batch, results):
+            if err:
+                failures += 1
+                log.warning("region %s: %s: %s", region_id, summary.get("url"), err)
+                continue
+            # Attach the detail to the ranking row it was fetched for
+            detail["climb_id"] = summary["climb_id"]
+            details.append(detail)
+        db.upsert_details(details)
+        log.info("region %s: details %d/%d", region_id, min(start + DETAIL_BATCH, len(todo)), len(todo))
+    return failures
+
+
+def crawl(
+    region_ids: list[str],
+    db: store.ClimbStore,
+    details: bool = False,
+    concurrency: int = 4,
+    rate: float | None = None,
+    max_pages: int | None = None,
+    refresh: bool = False,
+    unchanged_pages: int = 2,
+) -> dict[str, str | None]:
+    """Crawl regions in parallel. Returns {region_id: error or None}.
+
+    With ``refresh``, regions that were crawled to the end before are re-checked
+    incrementally (see refresh_ranking); others are crawled normally. ``rate`` caps the
+    requests/second the adaptive host limiter may reach (default: ratelimit.default_max_rate()).
+    """
+    # One limiter for the host: adapts requests/second to the server and caps in-flight requests across all regions
+    limiter = ratelimit.configure_host(cfe.BASE, max_rate=rate, max_in_flight=concurrency)
+    session = cfe.http_session()
+
+    def run(region_id: str) -> None:
+        if refresh and db.crawl_state(region_id)["ranking_done"]:
+            stale = refresh_ranking(region_id, db, limiter, session, unchanged_pages=unchanged_pages, max_pages=max_pages)
+            if details:
+                crawl_details(region_id, db, limiter, session, max_workers=concurrency, rows=stale, revalidate=True)
+            return
+        crawl_ranking(region_id, db, limiter, session, max_pages=max_pages)
+        if details:
+            crawl_details(region_id, db, limiter, session, max_workers=concurrency)
+
+    errors: dict[str, str | None] = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(region_ids)))) as pool:
+        futures = {pool.submit(run, rid): rid for rid in region_ids}
+        for fut in as_completed(futures):
+            rid = futures[fut]
+            try:
+                fut.result()
+                errors[rid] = None
+            except Exception as exc:  # noqa: BLE001
+                errors[rid] = str(exc)
+                log.error("region %s failed: %s", rid, exc)
+    return errors
+
+
+def _region_ids(args: argparse.Namespace) -> list[str]:
+    ids = [str(r) for r in args.region_ids]
+    countries = list(REGIONS_BY_COUNTRY) if args.all else args.country
+    for country in countries:
+        if country not in REGIONS_BY_COUNTRY:
+            raise SystemExit(f"unknown country: {country}")
+        ids.extend(str(r["id"]) for r in REGIONS_BY_COUNTRY[country])
+    return list(dict.fromkeys(ids))
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("region_ids", nargs="*", help="Climbfinder region IDs")
+    ap.add_argument("--country", action="append", default=[], help="add every region of a country (repeatable)")
+    ap.add_argument("--all", action="store_true", help="every region in REGIONS_BY_COUNTRY")
+    ap.add_argument("--details", action="store_true", help="also fetch climb detail pages")
+    ap.add_argument("--db", type=Path, default=None, help="SQLite store (default: store.default_db_path())")
+    ap.add_argument("--restart", action="store_true", help="ignore checkpoints and crawl rankings from page 1")
+    ap.add_argument("--refresh", action="store_true",
+                    help="re-check finished rankings, stopping at unchanged pages; details only for new/changed climbs")
+    ap.add_argument("--unchanged-pages", type=int, default=2, help="--refresh stops after this many unchanged pages")
+    ap.add_argument("--concurrency", type=int, default=4, help="max requests in flight (all regions)")
+    ap.add_argument("--rate", type=float, default=None,
+                    help="ceiling for the adaptive request rate, per second (default: $CLIMBFINDER_MAX_RATE or 4)")
+    ap.add_argument("--max-pages", type=int, default=None, help="stop each ranking after this page")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(asctime)s %(message)s")
+    region_ids = _region_ids(args)
+    if not region_ids:
+        ap.error("give region IDs, --country or --all")
+
+    db = store.ClimbStore(args.db)
+    if args.restart:
+        for rid in region_ids:
+            db.reset_crawl_state(rid)
+    errors = crawl(
+        region_ids, db, details=args.details, concurrency=args.concurrency,
+        rate=args.rate, max_pages=args.max_pages, refresh=args.refresh, unchanged_pages=args.unchanged_pages,
+    )
+    failed = {rid: err for rid, err in errors.items() if err}
+    for rid, err in failed.items():
+        print(f"region {rid}: {err}", file=sys.stderr)
+    print(f"{len(errors) - len(failed)}/{len(errors)} regions crawled into {db.path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
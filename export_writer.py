@@ -0,0 +1,168 @@
+"""
+Streaming writers for build_export_object records.
+
+Records are serialized one at a time and written out in ~64 KB chunks, so
+exporting a whole region never holds more than one chunk (plus the record
+being encoded) in memory. Output formats:
+
+    json     one compact JSON array
+    ndjson   one record per line
+    gzip     either of the above, gzip-compressed (``compress=True`` or a ".gz" path)
+
+``write_xlsx`` writes ranking rows to a single-sheet workbook with xlsxwriter's
+``constant_memory`` mode: each row is flushed to a temp file as soon as it is
+written, so the sheet size does not bound memory either.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import zlib
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator, Sequence
+
+import metrics
+
+xlsxwriter = metrics.lazy_module("xlsxwriter")
+
+FORMATS = ("json", "ndjson")
+CHUNK_BYTES = 64 * 1024
+
+_MIME = {"json": "application/json", "ndjson": "application/x-ndjson"}
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# (ranking row key, header) pairs of the Excel / CSV ranking download
+RANKING_COLUMNS: tuple[tuple[str, str], ...] = (
+    ("length_km", "Length (km)"),
+    ("name", "Climb Name"),
+    ("avg_gradient_pct", "Avg Gradient (%)"),
+    ("difficulty_points", "Difficulty Points"),
+    ("elevation_gain_m", "Elev. Gain (m)"),
+)
+
+
+def iter_chunks(records: Iterable[dict[str, Any]], fmt: str = "json", compress: bool = False) -> Iterator[bytes]:
+    """Encoded export as byte chunks (for a file, an HTTP response or a download generator)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r} (expected one of {FORMATS})")
+    chunks = _iter_encoded(records, fmt)
+    return _gzip(chunks) if compress else chunks
+
+
+def _iter_encoded(records: Iterable[dict[str, Any]], fmt: str) -> Iterator[bytes]:
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    parts: list[str] = []
+    size = 0
+    first = True
+    if fmt == "json":
+        parts.append("[")
+    for record in records:
+        if fmt == "json":
+            text = ("\n" if first else ",\n") + dumps(record)
+        else:
+            text = dumps(record) + "\n"
+        first = False
+        parts.append(text)
+        size += len(text)
+        if size >= CHUNK_BYTES:
+            yield "".join(parts).encode("utf-8")
+            parts, size = [], 0
+    if fmt == "json":
+        parts.append("\n]\n" if not first else "]\n")
+    if parts:
+        yield "".join(parts).encode("utf-8")
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def write_export(
+    records: Iterable[dict[str, Any]],
+    dest: str | os.PathLike[str] | IO[bytes],
+    fmt: str = "json",
+    compress: bool | None = None,
+) -> int:
+    """Stream ``records`` to a path or binary file object; returns bytes written.
+
+    ``compress=None`` gzips when ``dest`` (or an open file's name) ends in ".gz".
+    """
+    if compress is None:
+        name = getattr(dest, "name", "") if hasattr(dest, "write") else dest
+        compress = str(name).endswith(".gz")
+    written = 0
+    with metrics.timer("export_seconds", format=fmt + (".gz" if compress else "")):
+        if hasattr(dest, "write"):
+            for chunk in iter_chunks(records, fmt, compress):
+                dest.write(chunk)
+                written += len(chunk)
+        else:
+            path = Path(dest)
+            tmp = path.with_name(path.name + ".part")
+            with open(tmp, "wb") as fh:
+                for chunk in iter_chunks(records, fmt, compress):
+                    fh.write(chunk)
+                    written += len(chunk)
+            os.replace(tmp, path)
+    return written
+
+
+def file_name(stem: str, fmt: str = "json", compress: bool = False) -> str:
+    return f"{stem}.{fmt}" + (".gz" if compress else "")
+
+
+def mime_type(fmt: str = "json", compress: bool = False) -> str:
+    return "application/gzip" if compress else _MIME[fmt]
+
+
+def rows_digest(rows: Iterable[dict[str, Any]], columns: Sequence[tuple[str, str]] = RANKING_COLUMNS) -> str:
+    """Hash of the exported cells of ``rows``; equal digests give identical sheets."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([c for c, _ in columns]).encode("utf-8"))
+    for row in rows:
+        h.update(json.dumps([row.get(c) for c, _ in columns], ensure_ascii=False, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+def write_xlsx(
+    rows: Iterable[dict[str, Any]],
+    dest: str | os.PathLike[str] | IO[bytes],
+    columns: Sequence[tuple[str, str]] = RANKING_COLUMNS,
+    sheet_name: str = "Rankings",
+) -> int:
+    """Stream ``rows`` into a one-sheet workbook at a path or binary file object; returns rows written.
+
+    Rows are written top to bottom as they arrive (``constant_memory`` needs that order),
+    so ``rows`` may be a store iterator that is never materialised.
+    """
+    n = 0
+    with metrics.timer("export_seconds", format="excel"):
+        target: Any = dest
+        if not hasattr(dest, "write"):
+            path = Path(dest)
+            target = str(path.with_name(path.name + ".part"))
+        wb = xlsxwriter.Workbook(target, {"constant_memory": True, "strings_to_urls": False})
+        try:
+            ws = wb.add_worksheet(sheet_name)
+            bold = wb.add_format({"bold": True})
+            for col, (_, header) in enumerate(columns):
+                ws.write_string(0, col, header, bold)
+            for n, row in enumerate(rows, start=1):
+                for col, (key, _) in enumerate(columns):
+                    value = row.get(key)
+                    if value is not None:
+                        ws.write(n, col, value)
+            ws.freeze_panes(1, 0)
+        finally:
+            wb.close()
+        if target is not dest:
+            os.replace(target, dest)
+    return n
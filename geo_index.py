@@ -0,0 +1,258 @@
+"""
+Spatial index over climb start and summit coordinates.
+
+Points are bucketed in a fixed lat/lon grid (CELL_DEG cells, a geohash-like
+key per cell) and kept sorted by cell, so a query only looks at the points of
+the cells it overlaps; exact distances are then computed with one vectorized
+haversine over those candidates. Every climb contributes up to two points
+(start and summit) and each query reports a climb once, by its closer point.
+
+Queries:
+    radius     climbs within ``km`` of a point
+    bbox       climbs inside a lat/lon box
+    nearest    the ``k`` closest climbs
+    corridor   climbs within ``km`` of a track (a GPX route or a list of points)
+"""
+
+from __future__ import annotations
+
+import math
+import xml.etree.ElementTree as ET
+from typing import Any, Iterable, NamedTuple, Sequence
+
+import numpy as np
+
+from climb_profile import EARTH_RADIUS_M
+
+# ~28 km north-south; small enough that a 10 km radius touches a handful of cells
+CELL_DEG = 0.25
+# Track segments are cut to at most this length before the corridor scan
+_SEGMENT_KM = 5.0
+_KM_PER_DEG_LAT = math.pi * EARTH_RADIUS_M / 180 / 1000
+_COLS = 2 * int(180 / CELL_DEG) + 2  # cells per grid row, with margin
+_POINTS = ("start", "summit")
+
+
+class Hit(NamedTuple):
+    climb_id: int
+    distance_km: float
+    point: str  # "start" or "summit", whichever is closer
+
+
+class SpatialIndex:
+    """Immutable grid index; build it with from_details and rebuild when the data changes."""
+
+    def __init__(self, climb_ids: Sequence[int], lat: Sequence[float], lon: Sequence[float], kinds: Sequence[int]) -> None:
+        lat_a = np.asarray(lat, dtype=np.float64)
+        lon_a = np.asarray(lon, dtype=np.float64)
+        keys = _cell_key(lat_a, lon_a)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.lat = lat_a[order]
+        self.lon = lon_a[order]
+        self.climb_ids = np.asarray(climb_ids, dtype=np.int64)[order]
+        self.kinds = np.asarray(kinds, dtype=np.int8)[order]
+
+    @classmethod
+    def from_details(cls, details: Iterable[dict[str, Any]]) -> "SpatialIndex":
+        """Index parse_climb_detail records (``climb_id``, ``start_lat/lon``, summit ``lat/lon``).
+
+        Missing or 0/0 coordinates are skipped.
+        """
+        ids: list[int] = []
+        lat: list[float] = []
+        lon: list[float] = []
+        kinds: list[int] = []
+        for d in details:
+            cid = d.get("climb_id")
+            if not cid:
+                continue
+            for kind, (la, lo) in enumerate(((d.get("start_lat"), d.get("start_lon")), (d.get("lat"), d.get("lon")))):
+                if la and lo:
+                    ids.append(int(cid))
+                    lat.append(float(la))
+                    lon.append(float(lo))
+                    kinds.append(kind)
+        return cls(ids, lat, lon, kinds)
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict[str, Any]]) -> "SpatialIndex":
+        """Index build_export_object records (``bigId``, ``startLat/Lon``, ``lat/lon``), e.g. a loaded JSON export."""
+        return cls.from_details(
+            {"climb_id": r.get("bigId"), "start_lat": r.get("startLat"), "start_lon": r.get("startLon"),
+             "lat": r.get("lat"), "lon": r.get("lon")}
+            for r in records
+        )
+
+    def __len__(self) -> int:
+        return len(self.climb_ids)
+
+    # -- queries -------------------------------------------------------------
+
+    def radius(self, lat: float, lon: float, km: float, limit: int | None = None) -> list[Hit]:
+        """Climbs within ``km`` of (lat, lon), closest first."""
+        idx = self._candidates(*_box_around(lat, lon, km))
+        dist = haversine_km(lat, lon, self.lat[idx], self.lon[idx])
+        keep = dist <= km
+        return self._hits(idx[keep], dist[keep], limit)
+
+    def bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> list[Hit]:
+        """Climbs with a point inside the box, by distance from its centre."""
+        idx = self._candidates(min_lat, min_lon, max_lat, max_lon)
+        inside = (
+            (self.lat[idx] >= min_lat) & (self.lat[idx] <= max_lat)
+            & (self.lon[idx] >= min_lon) & (self.lon[idx] <= max_lon)
+        )
+        idx = idx[inside]
+        dist = haversine_km((min_lat + max_lat) / 2, (min_lon + max_lon) / 2, self.lat[idx], self.lon[idx])
+        return self._hits(idx, dist, None)
+
+    def nearest(self, lat: float, lon: float, k: int = 10) -> list[Hit]:
+        """The ``k`` climbs closest to (lat, lon).
+
+        The search radius starts at one cell and doubles until it holds ``k``
+        climbs; every climb inside the radius is a candidate, so the result is exact.
+        """
+        if k <= 0 or not len(self):
+            return []
+        km = CELL_DEG * _KM_PER_DEG_LAT
+        while True:
+            hits = self.radius(lat, lon, km)
+            if len(hits) >= k or km > math.pi * EARTH_RADIUS_M / 1000:
+                return hits[:k]
+            km *= 2
+
+    def corridor(self, track: Sequence[tuple[float, float]], km: float, limit: int | None = None) -> list[Hit]:
+        """Climbs within ``km`` of the polyline ``track`` [(lat, lon), ...], closest first.
+
+        Candidates come from the cells around each (densified) track vertex; the
+        distance to every segment is then computed in a local equirectangular
+        projection, which is accurate to well under 1% at corridor widths.
+        """
+        pts = _densify(np.asarray(track, dtype=np.float64).reshape(-1, 2), _SEGMENT_KM)
+        if not len(pts) or not len(self):
+            return []
+        # Within km of a segment at most _SEGMENT_KM long means within reach of one of its ends
+        reach = km + _SEGMENT_KM / 2
+        found = [self._candidates(*_box_around(la, lo, reach)) for la, lo in pts]
+        idx = np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+        if not len(idx):
+            return []
+        dist = _polyline_distance_km(pts, self.lat[idx], self.lon[idx])
+        keep = dist <= km
+        return self._hits(idx[keep], dist[keep], limit)
+
+    # -- internals -----------------------------------------------------------
+
+    def _candidates(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """Positions of the points in every cell overlapping the box."""
+        r0, r1 = _cell(min_lat), _cell(max_lat)
+        c0, c1 = _cell(min_lon), _cell(max_lon)
+        if (r1 - r0 + 1) * (c1 - c0 + 1) > len(self.keys):
+            # Box spans more cells than there are points: scanning them all is cheaper
+            return np.arange(len(self.keys))
+        rows = np.arange(r0, r1 + 1, dtype=np.int64)
+        lo_keys = rows * _COLS + c0
+        starts = np.searchsorted(self.keys, lo_keys, side="left")
+        ends = np.searchsorted(self.keys, lo_keys + (c1 - c0), side="right")
+        parts = [np.arange(s, e) for s, e in zip(starts, ends) if e > s]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def _hits(self, idx: np.ndarray, dist: np.ndarray, limit: int | None) -> list[Hit]:
+        order = np.argsort(dist, kind="stable")
+        hits: list[Hit] = []
+        seen: set[int] = set()
+        for i in order:
+            cid = int(self.climb_ids[idx[i]])
+            if cid in seen:
+                continue
+            seen.add(cid)
+            hits.append(Hit(cid, round(float(dist[i]), 3), _POINTS[self.kinds[idx[i]]]))
+            if limit and len(hits) >= limit:
+                break
+        return hits
+
+
+def haversine_km(lat: Any, lon: Any, lats: Any, lons: Any) -> np.ndarray:
+    """Great-circle distance between (lat, lon) and (lats, lons), elementwise with broadcasting, in km."""
+    lat_r, lats_r = np.radians(lat), np.radians(lats)
+    a = (
+        np.sin((lats_r - lat_r) / 2) ** 2
+        + np.cos(lat_r) * np.cos(lats_r) * np.sin(np.radians(np.subtract(lons, lon)) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M / 1000 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def parse_gpx(text: str | bytes) -> list[tuple[float, float]]:
+    """(lat, lon) of a GPX file's track points, or its route points when it has no track.
+
+    Raises ValueError for malformed XML.
+    """
+    try:
+        root = ET.fromstring(text)
+    except ET.ParseError as exc:
+        raise ValueError(f"not a GPX file: {exc}") from exc
+    for tag in ("trkpt", "rtept"):
+        pts = [
+            (float(el.get("lat")), float(el.get("lon")))
+            for el in root.iter()
+            if el.tag.rsplit("}", 1)[-1] == tag and el.get("lat") and el.get("lon")
+        ]
+        if pts:
+            return pts
+    return []
+
+
+def _cell(deg: float) -> int:
+    return int(math.floor(deg / CELL_DEG))
+
+
+def _cell_key(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    rows = np.floor(lat / CELL_DEG).astype(np.int64)
+    cols = np.floor(lon / CELL_DEG).astype(np.int64)
+    return rows * _COLS + cols
+
+
+def _box_around(lat: float, lon: float, km: float) -> tuple[float, float, float, float]:
+    dlat = km / _KM_PER_DEG_LAT
+    dlon = km / (_KM_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, max(lon - dlon, -180.0), lat + dlat, min(lon + dlon, 180.0)
+
+
+def _densify(pts: np.ndarray, max_km: float) -> np.ndarray:
+    """Insert points so no segment is longer than ``max_km``."""
+    if len(pts) < 2:
+        return pts
+    seg_km = haversine_km(pts[:-1, 0], pts[:-1, 1], pts[1:, 0], pts[1:, 1])
+    steps = np.maximum(np.ceil(seg_km / max_km).astype(np.int64), 1)
+    if (steps == 1).all():
+        return pts
+    out = [pts[:1]]
+    for a, b, n in zip(pts[:-1], pts[1:], steps):
+        t = (np.arange(1, n + 1) / n)[:, None]
+        out.append(a + (b - a) * t)
+    return np.concatenate(out)
+
+
+def _polyline_distance_km(track: np.ndarray, lat: np.ndarray, lon: np.ndarray, chunk: int = 512) -> np.ndarray:
+    """Distance from each point to the nearest segment of ``track`` (lat, lon rows), in km."""
+    kx = _KM_PER_DEG_LAT * np.cos(np.radians(lat))[:, None]
+    best = np.full(len(lat), np.inf)
+    if len(track) == 1:
+        return haversine_km(track[0, 0], track[0, 1], lat, lon)
+    for s in range(0, len(track) - 1, chunk):
+        a = track[s : s + chunk]
+        b = track[s + 1 : s + chunk + 1]
+        a = a[: len(b)]
+        # Segment ends and points in km, relative to each point (x east, y north)
+        ax = (a[None, :, 1] - lon[:, None]) * kx
+        ay = (a[None, :, 0] - lat[:, None]) * _KM_PER_DEG_LAT
+        bx = (b[None, :, 1] - lon[:, None]) * kx
+        by = (b[None, :, 0] - lat[:, None]) * _KM_PER_DEG_LAT
+        dx, dy = bx - ax, by - ay
+        len2 = dx * dx + dy * dy
+        t = np.where(len2 > 0, -(ax * dx + ay * dy) / np.where(len2 > 0, len2, 1), 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        px, py = ax + t * dx, ay + t * dy
+        best = np.minimum(best, np.sqrt(px * px + py * py).min(axis=1))
+    return best
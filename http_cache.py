@@ -0,0 +1,228 @@
+"""
+Persistent on-disk cache for Climbfinder HTML responses.
+
+Bodies are stored content-addressed (``objects/<sha256>``) and looked up by
+normalized URL through a small SQLite index. Fresh entries (younger than the
+TTL) are served without touching the network; stale ones are revalidated with
+``If-None-Match`` / ``If-Modified-Since`` when the server sent an ETag or
+Last-Modified. The total body size is capped and evicted least-recently-used.
+
+Configuration via environment:
+    CLIMBFINDER_CACHE_DIR   base directory (default ~/.cache/climbfinder)
+    CLIMBFINDER_HTTP_CACHE  set to 0 to disable the cache
+    CLIMBFINDER_CACHE_TTL   freshness in seconds (default 6 hours)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import ContextManager
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+
+import metrics
+import ratelimit
+
+DEFAULT_TTL_S = 6 * 3600
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def default_cache_dir() -> Path:
+    base = os.environ.get("CLIMBFINDER_CACHE_DIR")
+    return Path(base) if base else Path.home() / ".cache" / "climbfinder"
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form used as cache key: lowercase scheme/host, sorted query, no fragment."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+class HttpCache:
+    """Disk cache with TTL, conditional revalidation and an LRU size cap."""
+
+    def __init__(
+        self,
+        directory: str | os.PathLike[str],
+        ttl_s: float = DEFAULT_TTL_S,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.directory = Path(directory)
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._objects = self.directory / "objects"
+        self._objects.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.directory / "index.sqlite", check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                encoding TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed_at)")
+        self._db.commit()
+
+    def _object_path(self, digest: str) -> Path:
+        return self._objects / digest[:2] / digest
+
+    def _lookup(self, key: str) -> tuple | None:
+        with self._lock:
+            return self._db.execute(
+                "SELECT digest, encoding, etag, last_modified, fetched_at FROM entries WHERE url = ?",
+                (key,),
+            ).fetchone()
+
+    def _read_body(self, digest: str, encoding: str | None) -> str | None:
+        try:
+            data = self._object_path(digest).read_bytes()
+        except OSError:
+            return None
+        return data.decode(encoding or "utf-8", errors="replace")
+
+    def _touch(self, key: str, refreshed: bool = False) -> None:
+        now = time.time()
+        with self._lock:
+            if refreshed:
+                self._db.execute("UPDATE entries SET accessed_at = ?, fetched_at = ? WHERE url = ?", (now, now, key))
+            else:
+                self._db.execute("UPDATE entries SET accessed_at = ? WHERE url = ?", (now, key))
+            self._db.commit()
+
+    def _store(self, key: str, resp: requests.Response) -> None:
+        body = resp.content
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._object_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".tmp{os.getpid()}.{threading.get_ident()}")
+            tmp.write_bytes(body)
+            os.replace(tmp, path)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                """INSERT OR REPLACE INTO entries
+                   (url, digest, size, encoding, etag, last_modified, fetched_at, accessed_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    key, digest, len(body), resp.encoding or resp.apparent_encoding,
+                    resp.headers.get("ETag"), resp.headers.get("Last-Modified"), now, now,
+                ),
+            )
+            self._db.commit()
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for url, digest, size in self._db.execute(
+                "SELECT url, digest, size FROM entries ORDER BY accessed_at"
+            ):
+                if total <= self.max_bytes:
+                    break
+                victims.append((url, digest))
+                total -= size
+            self._db.executemany("DELETE FROM entries WHERE url = ?", [(u,) for u, _ in victims])
+            self._db.commit()
+            for _, digest in victims:
+                still_used = self._db.execute(
+                    "SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)
+                ).fetchone()
+                if not still_used:
+                    try:
+                        self._object_path(digest).unlink()
+                    except OSError:
+                        pass
+
+    def get(
+        self,
+        session: requests.Session,
+        url: str,
+        timeout: float = 25,
+        limiter: ContextManager | None = None,
+        revalidate: bool = False,
+    ) -> str:
+        """Return the body for ``url``, from disk when fresh or revalidated, else from the network.
+
+        ``limiter`` (e.g. a ratelimit.RateLimiter) is only entered around network requests,
+        so cache hits are not throttled, and hears how each request went (ratelimit.send). ``revalidate`` treats a fresh entry as stale, so the
+        server is asked (conditionally) even within the TTL.
+        """
+        key = normalize_url(url)
+        entry = self._lookup(key)
+        headers: dict[str, str] = {}
+        if entry:
+            digest, encoding, etag, last_modified, fetched_at = entry
+            if not revalidate and time.time() - fetched_at < self.ttl_s:
+                body = self._read_body(digest, encoding)
+                if body is not None:
+                    self._touch(key)
+                    metrics.inc("cache_hits_total", layer="http")
+                    return body
+            elif self._object_path(digest).exists():
+                if etag:
+                    headers["If-None-Match"] = etag
+                if last_modified:
+                    headers["If-Modified-Since"] = last_modified
+
+        metrics.inc("cache_misses_total", layer="http")
+        r = ratelimit.send(limiter, lambda: session.get(url, headers=headers, timeout=timeout))
+        metrics.record_response(r)
+        if r.status_code == 304 and entry:
+            body = self._read_body(entry[0], entry[1])
+            if body is not None:
+                self._touch(key, refreshed=True)
+                metrics.inc("cache_hits_total", layer="http_revalidated")
+                return body
+            r = ratelimit.send(limiter, lambda: session.get(url, timeout=timeout))
+            metrics.record_response(r)
+        r.raise_for_status()
+        self._store(key, r)
+        return r.text
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+        for path in self._objects.glob("*/*"):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+_default: HttpCache | None = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> HttpCache | None:
+    """Process-wide cache built from the environment, or None when disabled."""
+    global _default
+    if os.environ.get("CLIMBFINDER_HTTP_CACHE", "1").strip().lower() in ("0", "false", "no", "off"):
+        return None
+    with _default_lock:
+        if _default is None:
+            ttl = float(os.environ.get("CLIMBFINDER_CACHE_TTL", DEFAULT_TTL_S))
+            _default = HttpCache(default_cache_dir() / "http", ttl_s=ttl)
+        return _default
@@ -0,0 +1,125 @@
+"""
+Background scrape jobs for the Flask app.
+
+Jobs run on one bounded worker pool shared by all users. Each job exposes its
+progress and the results produced so far, so clients can poll for partial
+output, and can be cancelled between pages. Finished jobs are forgotten
+after ``JOB_TTL_S``.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+DEFAULT_WORKERS = 4
+JOB_TTL_S = 3600
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class Job:
+    """State of one scrape: status, progress counters, results and errors appended as they arrive."""
+
+    def __init__(self, total: int, params: dict[str, Any] | None = None) -> None:
+        self.id = uuid.uuid4().hex
+        self.params = params or {}
+        self.status = QUEUED
+        self.total = total
+        self.done = 0
+        self.results: list[dict[str, Any]] = []
+        self.errors: list[str] = []
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+        with self._lock:
+            if self.status == QUEUED:
+                self._finish(CANCELLED)
+
+    def add_results(self, rows: list[dict[str, Any]]) -> None:
+        with self._lock:
+            self.results.extend(rows)
+
+    def add_error(self, message: str) -> None:
+        with self._lock:
+            self.errors.append(message)
+
+    def set_total(self, total: int) -> None:
+        """Correct the page count once it is known (e.g. the ranking ends before the requested page)."""
+        with self._lock:
+            self.total = max(total, self.done)
+
+    def step(self) -> None:
+        with self._lock:
+            self.done += 1
+
+    def _finish(self, status: str) -> None:
+        self.status = status
+        self.finished_at = time.time()
+
+    def snapshot(self, since: int = 0) -> dict[str, Any]:
+        """JSON-ready view; ``results`` only holds rows from index ``since`` on."""
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "progress": {"done": self.done, "total": self.total},
+                "count": len(self.results),
+                "since": since,
+                "results": self.results[since:],
+                "errors": list(self.errors),
+            }
+
+
+class JobManager:
+    """Bounded worker pool plus a registry of jobs by ID."""
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS) -> None:
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scrape-job")
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, work: Callable[[Job], None], total: int, params: dict[str, Any] | None = None) -> Job:
+        """Queue ``work(job)``; it should check ``job.cancelled`` between steps."""
+        self._expire()
+        job = Job(total, params)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, work)
+        return job
+
+    def _run(self, job: Job, work: Callable[[Job], None]) -> None:
+        with job._lock:
+            if job.status != QUEUED:
+                return
+            job.status = RUNNING
+        try:
+            work(job)
+        except Exception as exc:  # noqa: BLE001
+            job.add_error(str(exc))
+            with job._lock:
+                job._finish(FAILED)
+            return
+        with job._lock:
+            job._finish(CANCELLED if job.cancelled else DONE)
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _expire(self) -> None:
+        cutoff = time.time() - JOB_TTL_S
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+                del self._jobs[job_id]
@@ -0,0 +1,258 @@
+"""
+In-process counters and timers for the fetch, parse and export hot paths.
+
+Instrumented code calls ``inc`` / ``observe`` / ``timer`` on the process-wide
+registry; each update is one dict operation under a lock, cheap enough to
+leave on. ``render_prometheus`` serves the Flask ``/metrics`` endpoint and
+``snapshot`` feeds the Streamlit run stats panel.
+
+Metric names (all prefixed ``climbfinder_``):
+    http_requests_total{status}        requests that reached the network
+    http_bytes_total                   response bytes transferred (compressed, as on the wire)
+    http_retries_total{reason}         urllib3 retries (status code or error class)
+    cache_hits_total{layer}            http / http_revalidated / parse
+    cache_misses_total{layer}          http / parse
+    fetch_seconds{kind}                ranking / detail page fetch, cache included
+    parse_seconds{kind}                parser work (cache misses only)
+    ranking_pages_total{strategy}      ranking_parser strategy that matched
+    ranking_probes_total               pages fetched to find a ranking's last page (no pagination bar)
+    sleep_seconds_total{reason}        rate limiter waits, Retry-After pauses, retry backoff, fixed delays
+    rate_limit_throttled_total{host,status}  429 / 503 answers seen by the adaptive limiter
+    rate_limit_decreases_total{host}   adaptive limiter rate cuts
+    errors_total{stage,type}           exceptions by stage and class
+    export_seconds{format}             Excel / CSV / JSON writers
+    import_seconds{module}             import-time profile (gauge; kept across reset)
+
+``lazy_module`` defers a heavy import (pandas, pyarrow, the parser stack) until
+the first attribute access and records how long it took in the import
+profile; ``timed_import`` does the same for imports an entry point needs up
+front. Set CLIMBFINDER_EAGER_IMPORTS=1 to resolve lazy modules immediately.
+"""
+
+from __future__ import annotations
+
+import importlib
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Any, Iterator
+
+PREFIX = "climbfinder_"
+
+_LabelKey = tuple[tuple[str, str], ...]
+
+
+def _key(labels: dict[str, Any]) -> _LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Registry:
+    """Counters (monotonic floats) and timers (count / sum / max seconds), keyed by name and labels."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[_LabelKey, float]] = {}
+        self._timers: dict[str, dict[_LabelKey, list[float]]] = {}
+        self.started_at = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = _key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        key = _key(labels)
+        with self._lock:
+            stat = self._timers.setdefault(name, {}).get(key)
+            if stat is None:
+                self._timers[name][key] = [1, seconds, seconds]
+            else:
+                stat[0] += 1
+                stat[1] += seconds
+                if seconds > stat[2]:
+                    stat[2] = seconds
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+            self.started_at = time.time()
+
+    def snapshot(self) -> dict[str, Any]:
+        """{"counters": {name: {labels: value}}, "timers": {name: {labels: {count, sum, max}}}};
+        labels are rendered as "k=v,k=v" ("" when unlabelled)."""
+        with self._lock:
+            return {
+                "started_at": self.started_at,
+                "counters": {
+                    name: {_label_text(k): v for k, v in series.items()}
+                    for name, series in self._counters.items()
+                },
+                "timers": {
+                    name: {_label_text(k): {"count": s[0], "sum": s[1], "max": s[2]} for k, s in series.items()}
+                    for name, series in self._timers.items()
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4); timers are summaries without quantiles."""
+        lines: list[str] = []
+        with self._lock:
+            for name in sorted(self._counters):
+                full = PREFIX + name
+                lines.append(f"# TYPE {full} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{full}{_prom_labels(key)} {_num(value)}")
+            for name in sorted(self._timers):
+                full = PREFIX + name
+                lines.append(f"# TYPE {full} summary")
+                for key, (count, total, _) in sorted(self._timers[name].items()):
+                    labels = _prom_labels(key)
+                    lines.append(f"{full}_count{labels} {_num(count)}")
+                    lines.append(f"{full}_sum{labels} {_num(total)}")
+                lines.append(f"# TYPE {full}_max gauge")
+                for key, (_, _, peak) in sorted(self._timers[name].items()):
+                    lines.append(f"{full}_max{_prom_labels(key)} {_num(peak)}")
+        return "\n".join(lines) + "\n"
+
+
+class ImportProfile:
+    """Seconds spent importing each module the first time, in import order."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._seconds: dict[str, float] = {}
+
+    def record(self, module: str, seconds: float) -> None:
+        with self._lock:
+            self._seconds.setdefault(module, seconds)
+
+    def snapshot(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self._seconds)
+
+    def render_prometheus(self) -> str:
+        full = PREFIX + "import_seconds"
+        lines = [f"# TYPE {full} gauge"]
+        for module, seconds in sorted(self.snapshot().items()):
+            lines.append(f'{full}{{module="{_escape(module)}"}} {_num(seconds)}')
+        return "\n".join(lines) + "\n"
+
+
+def _label_text(key: _LabelKey) -> str:
+    return ",".join(f"{k}={v}" for k, v in key)
+
+
+def _prom_labels(key: _LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+REGISTRY = Registry()
+IMPORTS = ImportProfile()
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+reset = REGISTRY.reset
+import_profile = IMPORTS.snapshot
+record_import = IMPORTS.record
+
+
+def snapshot() -> dict[str, Any]:
+    """Registry snapshot plus "imports": {module: seconds}."""
+    return {**REGISTRY.snapshot(), "imports": IMPORTS.snapshot()}
+
+
+def render_prometheus() -> str:
+    return REGISTRY.render_prometheus() + IMPORTS.render_prometheus()
+
+
+def timed_import(name: str) -> ModuleType:
+    """importlib.import_module that records the first import of ``name`` in the import profile.
+
+    Always goes through import_module, even when ``name`` is already in sys.modules:
+    while another thread is still executing the module, it waits on the module's
+    import lock instead of handing out a half-initialized module.
+    """
+    first = name not in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    if first:
+        IMPORTS.record(name, time.perf_counter() - start)
+    return module
+
+
+class LazyModule:
+    """Stand-in for a module that is imported (and timed) on first attribute access."""
+
+    def __init__(self, name: str) -> None:
+        self.__name = name
+        self.__module: ModuleType | None = None
+
+    def __getattr__(self, attr: str) -> Any:
+        module = self.__module
+        if module is None:
+            # Cached only once the import has finished (timed_import waits for other threads)
+            module = timed_import(self.__name)
+            self.__module = module
+        return getattr(module, attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__module is not None else "not loaded"
+        return f"<lazy module {self.__name!r} ({state})>"
+
+
+def lazy_module(name: str) -> Any:
+    """A LazyModule for ``name``, or the module itself in eager mode (CLIMBFINDER_EAGER_IMPORTS=1)."""
+    if os.environ.get("CLIMBFINDER_EAGER_IMPORTS") == "1":
+        return timed_import(name)
+    return LazyModule(name)
+
+
+def sleep(seconds: float, reason: str = "delay") -> None:
+    """time.sleep that is counted in sleep_seconds_total."""
+    if seconds > 0:
+        time.sleep(seconds)
+        inc("sleep_seconds_total", seconds, reason=reason)
+
+
+def record_error(stage: str, exc: BaseException) -> None:
+    inc("errors_total", stage=stage, type=type(exc).__name__)
+
+
+def record_response(resp: Any) -> None:
+    """Count a network response (requests.Response) and the bytes it took on the wire.
+
+    urllib3's tell() is the raw (still compressed) byte count once the body has been
+    read; the decoded body length is only the fallback for responses without it.
+    """
+    inc("http_requests_total", status=resp.status_code)
+    content = resp.content  # reads the body, so tell() below is final
+    tell = getattr(getattr(resp, "raw", None), "tell", None)
+    try:
+        transferred = tell() if tell is not None else None
+    except Exception:  # noqa: BLE001 - raw streams that cannot report a position
+        transferred = None
+    inc("http_bytes_total", transferred or len(content))
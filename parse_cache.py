@@ -0,0 +1,188 @@
+"""
+Memoization of parsed Climbfinder pages, keyed by a hash of the HTML.
+
+Entries are keyed by ``(kind, blake2b(html), parser version, extra)`` so an
+unchanged page skips BeautifulSoup entirely and a parser change invalidates
+everything cached by the previous version. Values are stored as JSON: every
+hit returns a fresh copy, so callers may mutate the rows they get back.
+
+Two tiers: an in-memory LRU, and an optional SQLite file shared across runs.
+The file is bounded like the HTTP cache: least recently used rows are pruned
+once it holds more than ``max_disk_entries`` rows or ``max_disk_bytes`` of
+JSON, and rows of other parser versions are dropped the first time a version
+is used (they can never be hit again).
+
+Configuration via environment:
+    CLIMBFINDER_PARSE_CACHE  "disk" (default), "memory", or 0 to disable
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable
+
+import http_cache
+import metrics
+
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_MAX_DISK_ENTRIES = 50_000
+DEFAULT_MAX_DISK_BYTES = 256 * 1024 * 1024
+# Disk size is checked every this many puts, not on each one
+PRUNE_EVERY = 256
+
+
+def html_digest(html: str) -> str:
+    return hashlib.blake2b(html.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+class ParseCache:
+    """In-memory LRU of parsed results, optionally backed by a SQLite file."""
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        path: str | os.PathLike[str] | None = None,
+        max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._mem: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        self._version: str | None = None
+        self._puts = 0
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(parsed)")}
+            if columns and "accessed_at" not in columns:
+                # Files from before the size bound: a cache, so start over
+                self._db.execute("DROP TABLE parsed")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS parsed (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS parsed_accessed ON parsed(accessed_at)")
+            self._db.commit()
+            with self._lock:
+                self._prune()
+
+    @staticmethod
+    def key(kind: str, html: str, version: str, extra: str = "") -> str:
+        return f"{kind}:{version}:{html_digest(html)}:{extra}"
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            raw = self._mem.get(key)
+            if raw is not None:
+                self._mem.move_to_end(key)
+            elif self._db is not None:
+                row = self._db.execute("SELECT value FROM parsed WHERE key = ?", (key,)).fetchone()
+                if row:
+                    raw = row[0]
+                    self._remember(key, raw)
+                    self._db.execute("UPDATE parsed SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+        return json.loads(raw) if raw is not None else None
+
+    def put(self, key: str, value: Any) -> None:
+        raw = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._remember(key, raw)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO parsed (key, value, size, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, raw, len(raw), time.time()),
+                )
+                self._db.commit()
+                self._puts += 1
+                if self._puts % PRUNE_EVERY == 0:
+                    self._prune()
+
+    def _prune(self) -> None:
+        """Drop least recently used disk rows beyond max_disk_entries / max_disk_bytes (lock held)."""
+        db = self._db
+        if db is None:
+            return
+        count, total = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM parsed").fetchone()
+        if count <= self.max_disk_entries and total <= self.max_disk_bytes:
+            return
+        victims = []
+        for key, size in db.execute("SELECT key, size FROM parsed ORDER BY accessed_at"):
+            if count <= self.max_disk_entries and total <= self.max_disk_bytes:
+                break
+            victims.append((key,))
+            count -= 1
+            total -= size
+        db.executemany("DELETE FROM parsed WHERE key = ?", victims)
+        db.commit()
+
+    def _drop_other_versions(self, version: str) -> None:
+        """Delete disk rows keyed by any parser version but ``version`` (once per version)."""
+        with self._lock:
+            if self._db is None or self._version == version:
+                return
+            self._version = version
+            # Keys are "kind:version:digest:extra"; kind has no colon
+            self._db.execute(
+                "DELETE FROM parsed WHERE substr(key, instr(key, ':') + 1, ?) != ?",
+                (len(version) + 1, version + ":"),
+            )
+            self._db.commit()
+
+    def _remember(self, key: str, raw: str) -> None:
+        self._mem[key] = raw
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def memoize(self, kind: str, html: str, version: str, parse: Callable[[], Any], extra: str = "") -> Any:
+        """Return the cached result for this page, or run ``parse()`` and cache it."""
+        self._drop_other_versions(version)
+        key = self.key(kind, html, version, extra)
+        hit = self.get(key)
+        if hit is not None:
+            metrics.inc("cache_hits_total", layer="parse")
+            return hit
+        metrics.inc("cache_misses_total", layer="parse")
+        value = parse()
+        self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM parsed")
+                self._db.commit()
+
+
+_default: ParseCache | None = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> ParseCache | None:
+    """Process-wide cache built from the environment, or None when disabled."""
+    global _default
+    mode = os.environ.get("CLIMBFINDER_PARSE_CACHE", "disk").strip().lower()
+    if mode in ("0", "false", "no", "off"):
+        return None
+    with _default_lock:
+        if _default is None:
+            path = http_cache.default_cache_dir() / "parsed.sqlite" if mode == "disk" else None
+            _default = ParseCache(path=path)
+        return _default
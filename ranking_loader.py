@@ -0,0 +1,236 @@
+"""
+Pipelined ranking loader: every page of a region's ranking, fetched concurrently, yielded in order.
+
+The first page is fetched alone; its pagination bar names the last page
+(ranking_parser.last_page). Without one, a galloping probe finds it: pages
+start+1, +2, +4, ... until one is empty, then a binary search between the last
+full and the first empty page, O(log N) requests. The remaining pages are then
+fetched by a small thread pool, at most ``window`` ahead of the consumer, while
+the host limiter keeps the request rate polite; results come back in page order
+as soon as the next one is ready.
+
+    for page in iter_pages(ranking_loader.fetcher(region_id), end_page=None):
+        ...
+
+``load`` is any callable page -> RankingPage, so the Streamlit page cache and a
+plain network fetch share the same pipeline.
+
+Refresh mode (iter_refresh) re-checks a ranking already in the store: fetching
+stops after ``unchanged_pages`` consecutive pages identical to their stored
+copy, and the rest of the range is served from the store.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterator, NamedTuple
+
+import climbfinder_export as cfe
+import metrics
+import ranking_parser
+import ratelimit
+import store
+
+DEFAULT_WORKERS = 4
+# Upper bound when neither the caller nor the page says where the ranking ends
+MAX_PAGES = 1000
+
+
+class RankingPage(NamedTuple):
+    rows: list[dict[str, Any]]
+    strategy: str | None = None
+    last_page: int | None = None  # from the pagination bar, when the page has one
+
+
+class PageResult(NamedTuple):
+    page: int
+    rows: list[dict[str, Any]]
+    strategy: str | None
+    error: str | None
+    last_page: int | None  # last page to be loaded, as far as is known so far
+    unchanged: bool = False  # same as the stored copy (only checked in refresh mode)
+
+
+def fetcher(
+    region_id: int | str,
+    session: Any = None,
+    limiter: ratelimit.RateLimiter | None = None,
+) -> Callable[[int], RankingPage]:
+    """``load`` for iter_pages: fetch (through the HTTP cache and limiter) and parse one page."""
+
+    def load(page: int) -> RankingPage:
+        html = cfe.fetch_ranking_html(region_id, page, session=session, limiter=limiter)
+        rows, strategy = ranking_parser.parse_ranking_page(html, page)
+        return RankingPage(rows, strategy, ranking_parser.last_page(html))
+
+    return load
+
+
+def iter_pages(
+    load: Callable[[int], RankingPage],
+    start_page: int = 1,
+    end_page: int | None = None,
+    max_workers: int = DEFAULT_WORKERS,
+    window: int | None = None,
+    unchanged: Callable[[int, list[dict[str, Any]]], bool] | None = None,
+    unchanged_pages: int = 2,
+) -> Iterator[PageResult]:
+    """PageResults for ``start_page``..``end_page`` (None: up to the ranking's last page), in order.
+
+    The walk ends after the first empty page. A page whose load raises is
+    yielded with ``error`` set; the walk goes on when the last page is known,
+    and otherwise ends there. With ``unchanged`` (page, rows) -> bool, checked
+    before each page is yielded, it also ends after ``unchanged_pages``
+    consecutive unchanged pages. Closing the generator cancels pages not yet started.
+    """
+    streak = 0
+
+    def check(page: int, result: _Attempt) -> PageResult:
+        nonlocal streak
+        same = bool(unchanged and result.rows and not result.error and unchanged(page, result.rows))
+        streak = streak + 1 if same else 0
+        return PageResult(page, result.rows, result.strategy, result.error, last, same)
+
+    cap = end_page if end_page is not None else start_page + MAX_PAGES - 1
+    first = _attempt(load, start_page)
+    last = _known_last(first, start_page, cap)
+    yield check(start_page, first)
+    if first.error or not first.rows or start_page >= cap or (unchanged and streak >= unchanged_pages):
+        return
+
+    window = window or 2 * max_workers
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ranking") as pool:
+        try:
+            probed: dict[int, _Attempt] = {}
+            if last is None:
+                last = _gallop(load, start_page, cap, probed)
+            exact = last is not None
+            if last is None:
+                last = cap
+            pending: deque[tuple[int, Future[_Attempt]]] = deque()
+            upcoming = iter(range(start_page + 1, last + 1))
+
+            def top_up() -> None:
+                while len(pending) < window:
+                    page = next(upcoming, None)
+                    if page is None:
+                        return
+                    if page in probed:
+                        done: Future[_Attempt] = Future()
+                        done.set_result(probed.pop(page))
+                        pending.append((page, done))
+                    else:
+                        pending.append((page, pool.submit(_attempt, load, page)))
+
+            top_up()
+            while pending:
+                page, future = pending.popleft()
+                result = future.result()
+                yield check(page, result)
+                if (not result.rows and not result.error) or (result.error and not exact):
+                    return
+                if unchanged and streak >= unchanged_pages:
+                    return
+                top_up()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_refresh(
+    load: Callable[[int], RankingPage],
+    db: store.ClimbStore,
+    region_id: int | str,
+    start_page: int = 1,
+    end_page: int | None = None,
+    unchanged_pages: int = 2,
+    to_summary: Callable[[dict[str, Any]], dict[str, Any]] = lambda r: r,
+    from_stored: Callable[[dict[str, Any]], dict[str, Any]] = lambda r: r,
+    max_workers: int = DEFAULT_WORKERS,
+) -> Iterator[PageResult]:
+    """iter_pages that stops fetching once ``unchanged_pages`` pages in a row match the store,
+    then yields the remaining stored pages of the range (strategy "store"). Only
+    ``unchanged_pages`` pages are fetched ahead, so few requests go past the stop.
+
+    ``to_summary`` maps a loaded row to the parse_ranking_items shape the store compares;
+    ``from_stored`` maps a stored row back to the shape ``load`` yields. Saving the
+    fetched pages (ClimbStore.save_ranking_page) is left to the caller.
+    """
+    def same(page: int, rows: list[dict[str, Any]]) -> bool:
+        return db.page_unchanged(region_id, page, [to_summary(r) for r in rows])
+
+    last: PageResult | None = None
+    for last in iter_pages(load, start_page, end_page, max_workers=max_workers, window=unchanged_pages,
+                           unchanged=same, unchanged_pages=unchanged_pages):
+        yield last
+    if last is None or not last.unchanged or (end_page is not None and last.page >= end_page):
+        return
+    by_page: dict[int, list[dict[str, Any]]] = {}
+    for row in db.ranking_rows(region_id, last.page + 1, end_page):
+        by_page.setdefault(row["page"], []).append(from_stored(row))
+    stored_last = max(by_page, default=last.page)
+    for page in sorted(by_page):
+        yield PageResult(page, by_page[page], "store", None, stored_last, True)
+
+
+class _Attempt(NamedTuple):
+    rows: list[dict[str, Any]]
+    strategy: str | None
+    last_page: int | None
+    error: str | None
+
+
+def _attempt(load: Callable[[int], RankingPage], page: int) -> _Attempt:
+    try:
+        got = load(page)
+    except Exception as exc:  # noqa: BLE001 - reported per page, like the sequential loaders
+        metrics.record_error("scrape", exc)
+        return _Attempt([], None, None, f"page {page}: {exc}")
+    return _Attempt(got.rows, got.strategy, got.last_page, None)
+
+
+def _known_last(first: _Attempt, start_page: int, cap: int) -> int | None:
+    if first.error:
+        return None
+    if not first.rows:
+        return start_page
+    if first.last_page is not None:
+        return max(start_page, min(first.last_page, cap))
+    return cap if cap == start_page else None
+
+
+def _gallop(load: Callable[[int], RankingPage], good: int, cap: int, probed: dict[int, _Attempt]) -> int | None:
+    """Last non-empty page after ``good`` (itself non-empty), found by doubling steps then bisection.
+
+    Probed pages are kept in ``probed`` so they are not fetched twice. None when
+    a probe fails: the walk then runs until the first empty page instead.
+    """
+    step = 1
+    empty = None
+    while empty is None:
+        page = min(good + step, cap)
+        result = probed[page] = _probe(load, page)
+        if result.error:
+            return None
+        if not result.rows:
+            empty = page
+        elif page == cap:
+            return cap
+        else:
+            good = page
+            step *= 2
+    while empty - good > 1:
+        page = (good + empty) // 2
+        result = probed[page] = _probe(load, page)
+        if result.error:
+            return None
+        if result.rows:
+            good = page
+        else:
+            empty = page
+    return good
+
+
+def _probe(load: Callable[[int], RankingPage], page: int) -> _Attempt:
+    metrics.inc("ranking_probes_total")
+    return _attempt(load, page)
@@ -0,0 +1,412 @@
+"""
+One parsing engine for Climbfinder ranking pages, shared by the Flask and Streamlit apps.
+
+Strategies are tried cheapest first:
+    cards      server-rendered ranking cards (cfe.parse_ranking_items; strained, memoized)
+    next_data  a __NEXT_DATA__ JSON blob (read straight from the HTML, no DOM)
+    table      the first <table>, columns detected from its header
+    links      climb links plus the numbers found around them
+    card_text  generic "card" blocks whose text has "km" and "%"
+
+Only the last three need a full DOM. It is built once and walked once to collect
+their candidates, so a page that falls through to them costs one parse and one
+traversal. Every strategy returns rows with the same keys (RANKING_FIELDS).
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, NamedTuple
+from urllib.parse import urljoin
+
+from bs4 import Tag
+
+import climbfinder_export as cfe
+import metrics
+
+# Climbfinder shows 25 climbs per ranking page
+PAGE_SIZE = 25
+
+# Keys of every row, whichever strategy produced it
+RANKING_FIELDS = (
+    "rank", "name", "length_km", "avg_gradient_pct", "difficulty_points", "elevation_gain_m",
+    "summit_m", "category", "country_iso2", "url", "climb_id", "page",
+)
+
+_CLIMB_HREF = re.compile(r"/(climbs?|cols?)/")
+_NEXT_DATA = re.compile(r"<script[^>]*\bid=[\"']__NEXT_DATA__[\"'][^>]*>(.*?)</script>", re.S | re.I)
+_NAV_LINK_TEXT = {"ranking", "home", "climbs", "map"}
+# Page links of the pagination bar: href="/en/ranking?l=288&amp;p=14"
+_PAGE_HREF = re.compile(r"""href=["'][^"']*ranking\?[^"']*?\bp=(\d+)""", re.I)
+
+
+class RankingParse(NamedTuple):
+    rows: list[dict[str, Any]]
+    strategy: str | None  # None when nothing matched
+
+
+def clean_number(text: Any) -> int | float:
+    """12.5 / "12.5 km" / "1,234 m" / "7%" -> number; 0 when nothing numeric is left."""
+    if not text:
+        return 0
+    if isinstance(text, (int, float)):
+        return round(text, 2) if isinstance(text, float) else text
+    cleaned = str(text).strip()
+    cleaned = re.sub(r'\s*(km|m|%|ft|pts?)\s*$', '', cleaned, flags=re.IGNORECASE)
+    cleaned = cleaned.replace(',', '').strip()
+    if not cleaned:
+        return 0
+    try:
+        return round(float(cleaned), 2) if '.' in cleaned else int(cleaned)
+    except ValueError:
+        return 0
+
+
+def make_row(page: int | None = None, **fields: Any) -> dict[str, Any]:
+    """A ranking row with every RANKING_FIELDS key; missing numbers are 0, missing text ''."""
+    length = float(fields.get("length_km") or 0)
+    grade = float(fields.get("avg_gradient_pct") or 0)
+    gain = fields.get("elevation_gain_m")
+    if not gain and length and grade:
+        gain = round(length * 10 * grade)
+    return {
+        "rank": fields.get("rank") or 0,
+        "name": fields.get("name") or "",
+        "length_km": length,
+        "avg_gradient_pct": grade,
+        "difficulty_points": fields.get("difficulty_points") or 0,
+        "elevation_gain_m": int(gain or 0),
+        "summit_m": int(fields.get("summit_m") or 0),
+        "category": fields.get("category") or "",
+        "country_iso2": fields.get("country_iso2") or "",
+        "url": fields.get("url") or "",
+        "climb_id": fields.get("climb_id"),
+        "page": page,
+    }
+
+
+def row_from_summary(summary: dict[str, Any], rank: int, page: int | None = None) -> dict[str, Any]:
+    """parse_ranking_items / store row -> ranking row."""
+    return make_row(
+        page,
+        rank=rank,
+        name=summary.get("name"),
+        length_km=summary.get("length_km"),
+        avg_gradient_pct=summary.get("avg_grade"),
+        difficulty_points=int(summary.get("difficulty_points") or 0),
+        elevation_gain_m=summary.get("ascent_m"),
+        summit_m=summary.get("summit_m"),
+        category=summary.get("category"),
+        country_iso2=summary.get("country_iso2"),
+        url=summary.get("url"),
+        climb_id=summary.get("climb_id"),
+    )
+
+
+def summary_from_row(row: dict[str, Any]) -> dict[str, Any]:
+    """Ranking row -> parse_ranking_items shape (for the store)."""
+    return {
+        "climb_id": row.get("climb_id"),
+        "name": row.get("name") or "",
+        "url": row.get("url") or "",
+        "country_iso2": row.get("country_iso2") or "",
+        "length_km": float(row.get("length_km") or 0),
+        "avg_grade": float(row.get("avg_gradient_pct") or 0),
+        "difficulty_points": int(row.get("difficulty_points") or 0),
+        "ascent_m": int(row.get("elevation_gain_m") or 0),
+        "summit_m": int(row.get("summit_m") or 0),
+        "category": row.get("category") or "",
+    }
+
+
+def parse_ranking_page(html: str, page: int | None = None) -> RankingParse:
+    """Rows of one ranking page and the name of the strategy that found them."""
+    result = _parse_ranking_page(html, page)
+    metrics.inc("ranking_pages_total", strategy=result.strategy or "none")
+    return result
+
+
+def last_page(html: str) -> int | None:
+    """Highest page number linked from a ranking page's pagination, None when it has none.
+
+    The bar always links the last page ("1 2 3 4 5 14"), so one page gives the total.
+    """
+    pages = [int(p) for p in _PAGE_HREF.findall(html)]
+    return max(pages) if pages else None
+
+
+def _parse_ranking_page(html: str, page: int | None) -> RankingParse:
+    # Cheap substring checks decide whether the strained card parse is worth running
+    if "ranking-item-item" in html:
+        items = cfe.parse_ranking_items(html)
+        if items:
+            base = (page - 1) * PAGE_SIZE if page else 0
+            return RankingParse([row_from_summary(r, base + i + 1, page) for i, r in enumerate(items)], "cards")
+
+    if "__NEXT_DATA__" in html:
+        rows = _from_next_data(html, page)
+        if rows:
+            return RankingParse(rows, "next_data")
+
+    with metrics.timer("parse_seconds", kind="ranking_fallback"):
+        table, links, cards = _collect_candidates(cfe.make_soup(html))
+        for strategy, parse, candidates in (
+            ("table", _from_table, table),
+            ("links", _from_links, links),
+            ("card_text", _from_card_text, cards),
+        ):
+            if candidates:
+                rows = parse(candidates, page)
+                if rows:
+                    return RankingParse(rows, strategy)
+    return RankingParse([], None)
+
+
+def _collect_candidates(soup: Any) -> tuple[Tag | None, list[Tag], list[Tag]]:
+    """One pass over the DOM: first <table>, climb links and "card" divs, in document order."""
+    table = None
+    links: list[Tag] = []
+    cards: list[Tag] = []
+    for el in soup.find_all(True):
+        if el.name == "table":
+            if table is None:
+                table = el
+        elif el.name == "a":
+            if _CLIMB_HREF.search(el.get("href") or ""):
+                links.append(el)
+        elif el.name == "div" and any("card" in c for c in el.get("class") or ()):
+            cards.append(el)
+    return table, links, cards
+
+
+# -- next_data -----------------------------------------------------------------
+
+def _from_next_data(html: str, page: int | None) -> list[dict[str, Any]]:
+    match = _NEXT_DATA.search(html)
+    if not match:
+        return []
+    try:
+        data = json.loads(match.group(1))
+    except json.JSONDecodeError:
+        return []
+    candidates: list[list[dict[str, Any]]] = []
+    _collect_ranking_candidates(data, candidates)
+    if not candidates:
+        return []
+    candidates.sort(key=len, reverse=True)
+    return [_normalize_climb(item, idx, page) for idx, item in enumerate(candidates[0])]
+
+
+def _collect_ranking_candidates(obj: Any, candidates: list, depth: int = 0) -> None:
+    if depth > 12:
+        return
+    if isinstance(obj, list) and len(obj) >= 2:
+        if isinstance(obj[0], dict) and _looks_like_climb(obj[0]):
+            candidates.append([item for item in obj if isinstance(item, dict)])
+    if isinstance(obj, dict):
+        for value in obj.values():
+            _collect_ranking_candidates(value, candidates, depth + 1)
+    elif isinstance(obj, list):
+        for item in obj:
+            _collect_ranking_candidates(item, candidates, depth + 1)
+
+
+def _looks_like_climb(d: dict[str, Any]) -> bool:
+    keys_lower = {k.lower() for k in d.keys()}
+    if not (keys_lower & {"name", "title", "climb", "climbname", "climb_name"}):
+        return False
+    cats = 0
+    if keys_lower & {"length", "distance", "km", "length_km"}:
+        cats += 1
+    if keys_lower & {"gradient", "avg_gradient", "avggradient", "avg_gradient_pct", "averagegradient"}:
+        cats += 1
+    if keys_lower & {"difficulty", "points", "difficultypoints", "difficulty_points", "score", "rating"}:
+        cats += 1
+    if keys_lower & {"rank", "position", "ranking"}:
+        cats += 1
+    if keys_lower & {"elevation", "elevationgain", "elevation_gain", "height", "altitude"}:
+        cats += 1
+    return cats >= 2
+
+
+def _normalize_climb(d: dict[str, Any], idx: int, page: int | None) -> dict[str, Any]:
+    lc = {k.lower(): v for k, v in d.items()}
+    rank = lc.get("rank") or lc.get("position") or lc.get("ranking") or idx + 1
+    difficulty = (lc.get("difficulty") or lc.get("points") or lc.get("difficultypoints")
+                  or lc.get("difficulty_points") or lc.get("score") or lc.get("rating") or 0)
+    length_km = lc.get("length") or lc.get("distance") or lc.get("km") or lc.get("length_km") or 0
+    gradient = (lc.get("gradient") or lc.get("avg_gradient") or lc.get("avggradient")
+                or lc.get("avg_gradient_pct") or lc.get("averagegradient") or 0)
+    return make_row(
+        page,
+        rank=clean_number(rank),
+        name=_best_name(lc),
+        difficulty_points=clean_number(difficulty),
+        length_km=clean_number(length_km),
+        avg_gradient_pct=clean_number(gradient),
+    )
+
+
+def _best_name(lc: dict[str, Any]) -> str:
+    """Pick the best human-readable climb name from available fields.
+    Skips values that look like concatenated stats (e.g. '34.8 km 6 % 1556')
+    by requiring at least one word with 3+ letters.
+    """
+    for key in ("title", "name", "climb", "climbname", "climb_name",
+                "displayname", "display_name", "routename", "route_name"):
+        val = lc.get(key)
+        if not val:
+            continue
+        if isinstance(val, dict):
+            for lang in ("en", "nl", "fr", "de", "es", "it"):
+                if lang in val and isinstance(val[lang], str) and val[lang].strip():
+                    return val[lang].strip()
+            for v in val.values():
+                if isinstance(v, str) and v.strip():
+                    return v.strip()
+            continue
+        if not isinstance(val, str) or not val.strip():
+            continue
+        s = val.strip()
+        if re.search(r'[a-zA-ZÀ-ÿ]{3,}', s):
+            return s
+    slug = lc.get("slug") or ""
+    if isinstance(slug, str) and slug.strip():
+        return slug.strip().split("/")[-1].replace("-", " ").title()
+    raw = lc.get("name") or lc.get("title") or ""
+    return str(raw).strip() if raw else ""
+
+
+# -- table ---------------------------------------------------------------------
+
+def _from_table(table: Tag, page: int | None) -> list[dict[str, Any]]:
+    col_map = _detect_table_columns(table)
+    rows = []
+    for tr in table.find_all("tr"):
+        cells = tr.find_all("td")
+        if len(cells) < 3:
+            continue
+        try:
+            row = _parse_table_row(cells, col_map, page)
+        except (IndexError, ValueError):
+            continue
+        if row:
+            rows.append(row)
+    return rows
+
+
+def _detect_table_columns(table: Tag) -> dict[str, int]:
+    col_map = {}
+    for idx, th in enumerate(table.find_all("th")):
+        text = th.get_text(strip=True).lower()
+        if any(k in text for k in ["rank", "#", "pos"]):
+            col_map["rank"] = idx
+        elif any(k in text for k in ["name", "climb", "col "]):
+            col_map["name"] = idx
+        elif any(k in text for k in ["diff", "point", "score"]):
+            col_map["difficulty"] = idx
+        elif any(k in text for k in ["length", "dist", "km"]):
+            col_map["length"] = idx
+        elif any(k in text for k in ["grad", "avg", "slope", "%"]):
+            col_map["gradient"] = idx
+    return col_map
+
+
+def _parse_table_row(cells: list[Tag], col_map: dict[str, int], page: int | None) -> dict[str, Any] | None:
+    texts = [c.get_text(strip=True) for c in cells]
+    name = url = None
+    name_idx = 1
+    for i, cell in enumerate(cells):
+        link = cell.find("a", href=_CLIMB_HREF)
+        if link:
+            name, name_idx = link.get_text(strip=True), i
+            url = urljoin(cfe.BASE, link["href"].split("?", 1)[0])
+            break
+    if name is None:
+        if "name" in col_map and col_map["name"] < len(texts):
+            name_idx = col_map["name"]
+        name = texts[name_idx] if name_idx < len(texts) else ""
+    if not name:
+        return None
+
+    def col(key: str, drop: str = "") -> int | float:
+        idx = col_map.get(key)
+        if idx is None or idx >= len(texts):
+            return 0
+        text = texts[idx]
+        for ch in drop:
+            text = text.replace(ch, "")
+        return clean_number(text)
+
+    if len(col_map) >= 3:
+        rank = col("rank", drop=".#")
+        difficulty, length_km, gradient = col("difficulty"), col("length"), col("gradient")
+    else:
+        rank_text = texts[0] if name_idx > 0 else ""
+        rank = clean_number(rank_text.replace(".", "").replace("#", "").strip())
+        remaining = texts[name_idx + 1:]
+        length_km = clean_number(remaining[0]) if len(remaining) > 0 else 0
+        gradient = clean_number(remaining[1]) if len(remaining) > 1 else 0
+        difficulty = clean_number(remaining[2]) if len(remaining) > 2 else 0
+
+    return make_row(page, rank=rank, name=name, url=url, difficulty_points=difficulty,
+                    length_km=length_km, avg_gradient_pct=gradient)
+
+
+# -- links ---------------------------------------------------------------------
+
+def _from_links(links: list[Tag], page: int | None) -> list[dict[str, Any]]:
+    rows = []
+    seen = set()
+    for link in links:
+        name = link.get_text(strip=True)
+        if not name or name in seen or len(name) < 3 or name.lower() in _NAV_LINK_TEXT:
+            continue
+        seen.add(name)
+        rows.append(_extract_from_context(link, name, page))
+    return rows
+
+
+def _extract_from_context(link: Tag, name: str, page: int | None) -> dict[str, Any]:
+    url = urljoin(cfe.BASE, (link.get("href") or "").split("?", 1)[0])
+    parent = link.parent
+    for _ in range(4):
+        if parent is None:
+            break
+        nums = re.findall(r"[\d]+(?:[.,]\d+)?", parent.get_text(" ", strip=True))
+        if len(nums) >= 3:
+            nums = [clean_number(n) for n in nums]
+            return make_row(page, rank=nums[0], name=name, url=url, length_km=nums[1],
+                            avg_gradient_pct=nums[2], difficulty_points=nums[3] if len(nums) > 3 else 0)
+        parent = parent.parent
+    return make_row(page, name=name, url=url)
+
+
+# -- card_text -----------------------------------------------------------------
+
+def _from_card_text(cards: list[Tag], page: int | None) -> list[dict[str, Any]]:
+    rows = []
+    taken: set[int] = set()
+    for card in cards:
+        # Nested "card" divs repeat their parent's text; keep the outermost match only
+        if any(id(p) in taken for p in card.parents):
+            continue
+        text = card.get_text(" | ", strip=True)
+        if "km" not in text or "%" not in text:
+            continue
+        taken.add(id(card))
+        name_tag = card.find(["h2", "h3", "h4", "h5", "strong"])
+        length = re.search(r'([\d.]+)\s*km', text)
+        grade = re.search(r'([\d.]+)\s*%', text)
+        points = re.search(r'([\d.]+)\s*(?:pts|points)', text)
+        rank_tag = card.find(class_=re.compile('badge|rank'))
+        rows.append(make_row(
+            page,
+            rank=clean_number(rank_tag.get_text(strip=True)) if rank_tag else 0,
+            name=name_tag.get_text(strip=True) if name_tag else "Unknown",
+            length_km=clean_number(length.group(1)) if length else 0,
+            avg_gradient_pct=clean_number(grade.group(1)) if grade else 0,
+            difficulty_points=clean_number(points.group(1)) if points else 0,
+        ))
+    return rows
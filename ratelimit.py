@@ -0,0 +1,334 @@
+"""
+Token-bucket rate limiting shared by the Climbfinder fetchers.
+
+A limiter bounds both the sustained request rate (tokens refill at ``rate``
+per second, bursting up to ``burst``) and the number of requests in flight.
+Limiters are kept per host, so concurrent fetch paths stay polite together.
+
+The per-host limiters are adaptive (AIMD): every response is fed back through
+``send`` (``call`` for clients other than requests, such as the browser
+pool), the rate creeps up additively while the server answers quickly, and
+is cut multiplicatively on 429/503 (whose Retry-After also pauses the host) or
+when latency climbs well above its baseline. The learned rate is saved per
+host and is where the next run starts.
+
+Configuration via environment:
+    CLIMBFINDER_MAX_RATE     ceiling for adaptive limiters, requests/second (default 4)
+    CLIMBFINDER_RATE_STATE   learned-rate file (default <cache dir>/ratelimit.json)
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, ContextManager
+from urllib.parse import urlparse
+
+import metrics
+
+DEFAULT_RATE = 1.5
+DEFAULT_BURST = 2
+DEFAULT_MAX_IN_FLIGHT = 4
+
+# Adaptive limiter bounds and AIMD steps
+MIN_RATE = 0.2
+DEFAULT_MAX_RATE = 4.0
+INCREASE_PER_S = 0.05        # additive increase: req/s gained per second of clean traffic
+THROTTLE_DECREASE = 0.5      # multiplicative decrease on 429 / 503
+SLOW_DECREASE = 0.8          # ... and when latency is far above its baseline
+SLOW_FACTOR = 3.0            # "far above": this many times the baseline (and over SLOW_MIN_S)
+SLOW_MIN_S = 1.0
+DECREASE_COOLDOWN_S = 2.0    # one cut per burst of bad responses, not one per response
+# Longest Retry-After honoured, here and by the urllib3 retries in climbfinder_export;
+# longer waits fail the request instead of stalling a worker
+RETRY_AFTER_MAX_S = 60.0
+THROTTLE_STATUS = frozenset({429, 503})
+
+
+class RateLimiter:
+    """Token bucket (requests/second) combined with a max in-flight cap.
+
+    Use as a context manager around a single request::
+
+        with limiter:
+            session.get(url)
+
+    ``rate <= 0`` disables the rate part and only caps concurrency.
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    ) -> None:
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+
+    def _take_token(self) -> float:
+        """Block until a token is available; return the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                if self.rate <= 0:
+                    return waited
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def acquire(self) -> float:
+        """Reserve an in-flight slot and a token. Returns seconds waited for the token."""
+        self._slots.acquire()
+        try:
+            waited = self._take_token()
+        except BaseException:
+            self._slots.release()
+            raise
+        if waited:
+            metrics.inc("sleep_seconds_total", waited, reason="rate_limit")
+        return waited
+
+    def release(self) -> None:
+        self._slots.release()
+
+    def __enter__(self) -> RateLimiter:
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    def observe(self, status: int | None, latency_s: float, retry_after: float | None = None) -> None:
+        """Outcome of one request sent under this limiter (``status`` None: no response). Fixed-rate: ignored."""
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """RateLimiter whose rate moves between ``min_rate`` and ``max_rate`` with the server's answers (AIMD)."""
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        min_rate: float = MIN_RATE,
+        max_rate: float | None = None,
+        host: str = "",
+    ) -> None:
+        self.max_rate = float(max_rate if max_rate is not None else default_max_rate())
+        self.min_rate = min(float(min_rate), self.max_rate)
+        super().__init__(rate=min(max(float(rate), self.min_rate), self.max_rate), burst=burst, max_in_flight=max_in_flight)
+        self.host = host
+        self.latency_s: float | None = None  # baseline: slowly rising minimum of observed latencies
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+
+    def _take_token(self) -> float:
+        # A Retry-After pause holds every request to the host, on top of the bucket
+        pause = self._blocked_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+            metrics.inc("sleep_seconds_total", pause, reason="retry_after")
+        return super()._take_token()
+
+    def observe(self, status: int | None, latency_s: float, retry_after: float | None = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            old = self.rate
+            if status in THROTTLE_STATUS:
+                if retry_after:
+                    self._blocked_until = max(self._blocked_until, now + min(retry_after, RETRY_AFTER_MAX_S))
+                    self._tokens = 0.0
+                self._decrease(THROTTLE_DECREASE, now)
+                metrics.inc("rate_limit_throttled_total", host=self.host, status=status)
+            elif status is None or (
+                self.latency_s is not None and latency_s > max(SLOW_FACTOR * self.latency_s, SLOW_MIN_S)
+            ):
+                self._decrease(SLOW_DECREASE, now)
+            else:
+                # One request at rate r takes 1/r s of the bucket: +INCREASE_PER_S per second of traffic
+                self.rate = min(self.max_rate, self.rate + INCREASE_PER_S / self.rate)
+            if status is not None and status not in THROTTLE_STATUS:
+                self.latency_s = latency_s if self.latency_s is None else min(self.latency_s * 1.01, latency_s)
+            changed = self.rate != old
+        if changed:
+            _state.note(self)
+
+    def _decrease(self, factor: float, now: float) -> None:
+        if now - self._last_decrease < DECREASE_COOLDOWN_S:
+            return
+        self._last_decrease = now
+        self.rate = max(self.min_rate, self.rate * factor)
+        metrics.inc("rate_limit_decreases_total", host=self.host)
+
+
+def send(limiter: ContextManager | None, request: Callable[[], Any]) -> Any:
+    """Run ``request()`` (returning a requests.Response) under ``limiter`` and report the
+    outcome to it, including 429/503 answers urllib3 already retried."""
+    if limiter is None:
+        return request()
+    resp, latency = _timed(limiter, request)
+    retries = getattr(getattr(resp, "raw", None), "retries", None)
+    for attempt in getattr(retries, "history", ()) or ():
+        if attempt.status in THROTTLE_STATUS:
+            _observe(limiter, attempt.status, latency)
+    _observe(limiter, resp.status_code, latency, _retry_after(getattr(resp, "headers", None)))
+    return resp
+
+
+def call(
+    limiter: ContextManager | None,
+    request: Callable[[], Any],
+    outcome: Callable[[Any], tuple[int | None, Any]],
+) -> Any:
+    """send for other clients: run ``request()`` under ``limiter`` and report
+    ``outcome(result)``, a (status, response headers) pair, to it."""
+    if limiter is None:
+        return request()
+    result, latency = _timed(limiter, request)
+    status, headers = outcome(result)
+    _observe(limiter, status, latency, _retry_after(headers))
+    return result
+
+
+def _timed(limiter: ContextManager, request: Callable[[], Any]) -> tuple[Any, float]:
+    with limiter:
+        # Timed from after acquire: the limiter's own queueing is not server latency
+        start = time.monotonic()
+        try:
+            result = request()
+        except Exception:
+            _observe(limiter, None, time.monotonic() - start)
+            raise
+        return result, time.monotonic() - start
+
+
+def _observe(limiter: Any, status: int | None, latency_s: float, retry_after: float | None = None) -> None:
+    observe = getattr(limiter, "observe", None)
+    if observe is not None:
+        observe(status, latency_s, retry_after)
+
+
+def _retry_after(headers: Any) -> float | None:
+    headers = headers or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")  # Playwright lower-cases names
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None  # HTTP-date form: the multiplicative cut still applies
+
+
+def default_max_rate() -> float:
+    return float(os.environ.get("CLIMBFINDER_MAX_RATE", DEFAULT_MAX_RATE))
+
+
+class _RateState:
+    """Learned rate per host in a small JSON file, written at most every SAVE_INTERVAL_S and at exit."""
+
+    SAVE_INTERVAL_S = 10.0
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._data: dict[str, dict[str, float]] | None = None
+        self._last_save = 0.0
+        self._dirty = False
+
+    def path(self) -> Path:
+        env = os.environ.get("CLIMBFINDER_RATE_STATE")
+        if env:
+            return Path(env)
+        import http_cache
+
+        return http_cache.default_cache_dir() / "ratelimit.json"
+
+    def _load(self) -> dict[str, dict[str, float]]:
+        if self._data is None:
+            try:
+                self._data = json.loads(self.path().read_text())
+            except (OSError, ValueError):
+                self._data = {}
+        return self._data
+
+    def rate_for(self, host: str) -> float | None:
+        with self._lock:
+            entry = self._load().get(host)
+        return float(entry["rate"]) if entry and entry.get("rate") else None
+
+    def note(self, limiter: AdaptiveRateLimiter) -> None:
+        with self._lock:
+            self._load()[limiter.host] = {"rate": round(limiter.rate, 3), "updated_at": round(time.time())}
+            self._dirty = True
+            due = time.monotonic() - self._last_save >= self.SAVE_INTERVAL_S
+        if due:
+            self.save()
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty or self._data is None:
+                return
+            path = self.path()
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_name(path.name + ".part")
+                tmp.write_text(json.dumps(self._data, indent=1, sort_keys=True))
+                os.replace(tmp, path)
+            except OSError:
+                return
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+
+_state = _RateState()
+atexit.register(_state.save)
+
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _host_of(url_or_host: str) -> str:
+    if "://" in url_or_host:
+        return (urlparse(url_or_host).hostname or "").lower()
+    return url_or_host.lower()
+
+
+def limiter_for(url_or_host: str) -> RateLimiter:
+    """Process-wide adaptive limiter for the host of ``url_or_host`` (created on first use,
+    starting from the rate learned in earlier runs)."""
+    host = _host_of(url_or_host)
+    with _limiters_lock:
+        lim = _limiters.get(host)
+        if lim is None:
+            lim = _limiters[host] = AdaptiveRateLimiter(rate=_state.rate_for(host) or DEFAULT_RATE, host=host)
+        return lim
+
+
+def configure_host(
+    url_or_host: str,
+    max_rate: float | None = None,
+    burst: int = DEFAULT_BURST,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+) -> RateLimiter:
+    """Replace the shared limiter for a host (e.g. from a CLI flag); ``max_rate`` caps what it may learn."""
+    host = _host_of(url_or_host)
+    lim = AdaptiveRateLimiter(
+        rate=_state.rate_for(host) or DEFAULT_RATE, burst=burst, max_in_flight=max_in_flight,
+        max_rate=max_rate, host=host,
+    )
+    with _limiters_lock:
+        _limiters[host] = lim
+    return lim
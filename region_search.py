@@ -0,0 +1,148 @@
+"""
+Typeahead search over the region table in regions.py.
+
+Names are folded (NFKD, accents and punctuation dropped, lowercase), so
+"isere", "Isère" and "ISERE " all match Isère. The index is built once at
+import from ALL_REGIONS:
+
+    words     sorted (word, region) pairs; a prefix query is two bisects
+    trigrams  trigram -> regions, for misspellings ("dolomties", "savoi")
+
+Matches are ranked by how they matched (exact name, name prefix, every query
+word a word prefix, trigram similarity), then by name length, so shorter
+names win ties ("Savoie" before "Haute-Savoie").
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from bisect import bisect_left
+from typing import Any
+
+from regions import ALL_REGIONS
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+# Score per match kind; trigram matches scale MIN_SIMILARITY..1 onto 0..TRIGRAM
+EXACT, NAME_PREFIX, WORD_PREFIX, TRIGRAM = 100, 80, 60, 50
+MIN_SIMILARITY = 0.3
+# best() ignores shorter names ("a" would otherwise pick Ain); IDs of any length still resolve
+MIN_BEST_QUERY = 3
+
+
+def fold(text: str | None) -> str:
+    """Accent- and case-insensitive form: "Pyrénées-Atlantiques" -> "pyrenees atlantiques"."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text)
+    ascii_only = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(" ", ascii_only.lower()).strip()
+
+
+def _trigrams(folded: str) -> set[str]:
+    padded = f"  {folded} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class RegionIndex:
+    """Prefix and trigram index over region dicts with "name", "country", "id" and "label"."""
+
+    def __init__(self, regions: list[dict[str, Any]]) -> None:
+        self.regions = regions
+        self._names = [fold(r["name"]) for r in regions]
+        self._by_id = {str(r["id"]): i for i, r in enumerate(regions)}
+        words: list[tuple[str, int]] = []
+        self._grams: dict[str, list[int]] = {}
+        self._gram_counts: list[int] = []
+        for i, r in enumerate(regions):
+            # Country words are searchable too ("italy" lists Italian regions)
+            searchable = f"{self._names[i]} {fold(r['country'])}"
+            words.extend((w, i) for w in set(searchable.split()))
+            grams = _trigrams(self._names[i])
+            self._gram_counts.append(len(grams))
+            for g in grams:
+                self._grams.setdefault(g, []).append(i)
+        words.sort()
+        self._words = words
+
+    def search(self, query: str, limit: int = 10) -> list[dict[str, Any]]:
+        """Best matches for ``query`` (a name, part of one, or a region ID), best first.
+
+        Each result is the region dict plus "score" (0-100).
+        """
+        q = fold(query)
+        if not q:
+            return []
+        scores: dict[int, float] = {}
+        if q in self._by_id:
+            scores[self._by_id[q]] = EXACT
+        tokens = q.split()
+        for i in self._word_prefix_matches(tokens):
+            name = self._names[i]
+            score = EXACT if name == q else NAME_PREFIX if name.startswith(q) else WORD_PREFIX
+            scores[i] = max(scores.get(i, 0), score)
+        if len(scores) < limit:
+            for i, sim in self._trigram_matches(q).items():
+                if i not in scores:
+                    scores[i] = TRIGRAM * (sim - MIN_SIMILARITY) / (1 - MIN_SIMILARITY)
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], len(self._names[kv[0]]), self._names[kv[0]]))
+        return [{**self.regions[i], "score": round(s, 1)} for i, s in ranked[:limit]]
+
+    def best(self, query: str, min_score: float = 0) -> dict[str, Any] | None:
+        """Top match when it scores at least ``min_score`` and is unambiguous, else None.
+
+        Queries shorter than MIN_BEST_QUERY (unless a region ID) never resolve, and
+        anything short of an exact match only does when no other region scores the
+        same: "pyrenees" and "haute" each name-prefix several departments equally, so
+        they pick none.
+        """
+        q = fold(query)
+        if len(q) < MIN_BEST_QUERY and q not in self._by_id:
+            return None
+        hits = self.search(query, limit=2)
+        if not hits or hits[0]["score"] < min_score:
+            return None
+        if hits[0]["score"] < EXACT and len(hits) > 1 and hits[1]["score"] == hits[0]["score"]:
+            return None
+        return hits[0]
+
+    def _word_prefix_matches(self, tokens: list[str]) -> set[int]:
+        """Regions where every token is the prefix of one of their words."""
+        result: set[int] | None = None
+        for token in tokens:
+            found: set[int] = set()
+            pos = bisect_left(self._words, (token,))
+            while pos < len(self._words) and self._words[pos][0].startswith(token):
+                found.add(self._words[pos][1])
+                pos += 1
+            result = found if result is None else result & found
+            if not result:
+                return set()
+        return result or set()
+
+    def _trigram_matches(self, q: str) -> dict[int, float]:
+        """Dice similarity of the query's trigrams with each name's, above MIN_SIMILARITY."""
+        grams = _trigrams(q)
+        shared: dict[int, int] = {}
+        for g in grams:
+            for i in self._grams.get(g, ()):
+                shared[i] = shared.get(i, 0) + 1
+        out = {}
+        for i, n in shared.items():
+            sim = 2 * n / (len(grams) + self._gram_counts[i])
+            if sim >= MIN_SIMILARITY:
+                out[i] = sim
+        return out
+
+
+_index = RegionIndex(ALL_REGIONS)
+
+
+def search(query: str, limit: int = 10) -> list[dict[str, Any]]:
+    """Ranked matches from the shared index over ALL_REGIONS."""
+    return _index.search(query, limit)
+
+
+def best_match(query: str, min_score: float = 0) -> dict[str, Any] | None:
+    return _index.best(query, min_score)
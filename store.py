@@ -0,0 +1,509 @@
+"""
+Persistent SQLite store for scraped Climbfinder data.
+
+Tables:
+    climbs             one row per climb_id: ranking summary + parsed detail record
+    ranking_positions  rank/page of each climb per region
+    pages              ranking-page metadata (parsed-content hash, climb_id sequence)
+    crawl_state        crawler checkpoints per region
+
+spatial_index() keeps an in-memory geo_index.SpatialIndex over the start and
+summit coordinates of the stored detail records, rebuilt when details change.
+
+Writes are bulk upserts keyed on ``climb_id``; reads are indexed queries that
+return the same dict shapes as parse_ranking_items / build_export_object.
+The database runs in WAL mode so the apps can read while the crawler writes.
+
+Configuration via environment:
+    CLIMBFINDER_DB  database path (default <cache dir>/climbs.sqlite)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+import climbfinder_export as cfe
+import http_cache
+import metrics
+
+# numpy comes with it; only spatial queries need it
+geo_index = metrics.lazy_module("geo_index")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS climbs (
+    climb_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    short_name TEXT NOT NULL DEFAULT '',
+    path TEXT NOT NULL DEFAULT '',
+    url TEXT NOT NULL DEFAULT '',
+    country_iso2 TEXT NOT NULL DEFAULT '',
+    length_km REAL NOT NULL DEFAULT 0,
+    avg_grade REAL NOT NULL DEFAULT 0,
+    difficulty_points INTEGER NOT NULL DEFAULT 0,
+    ascent_m INTEGER NOT NULL DEFAULT 0,
+    summit_m INTEGER NOT NULL DEFAULT 0,
+    category TEXT NOT NULL DEFAULT '',
+    detail_json TEXT,
+    updated_at REAL NOT NULL,
+    detail_fetched_at REAL
+);
+CREATE INDEX IF NOT EXISTS climbs_country ON climbs(country_iso2);
+CREATE INDEX IF NOT EXISTS climbs_difficulty ON climbs(difficulty_points);
+CREATE INDEX IF NOT EXISTS climbs_grade ON climbs(avg_grade);
+CREATE INDEX IF NOT EXISTS climbs_url ON climbs(url);
+
+CREATE TABLE IF NOT EXISTS ranking_positions (
+    region_id TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    page INTEGER NOT NULL,
+    climb_id INTEGER NOT NULL,
+    region_label TEXT NOT NULL DEFAULT '',
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (region_id, rank)
+);
+CREATE INDEX IF NOT EXISTS ranking_positions_climb ON ranking_positions(climb_id);
+CREATE INDEX IF NOT EXISTS ranking_positions_page ON ranking_positions(region_id, page);
+
+CREATE TABLE IF NOT EXISTS pages (
+    region_id TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    climb_ids TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (region_id, page)
+);
+
+CREATE TABLE IF NOT EXISTS crawl_state (
+    region_id TEXT PRIMARY KEY,
+    last_page INTEGER NOT NULL DEFAULT 0,
+    ranking_done INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Ranking summary columns, in parse_ranking_items key order
+SUMMARY_COLUMNS = (
+    "climb_id", "name", "short_name", "path", "url", "country_iso2", "length_km",
+    "avg_grade", "difficulty_points", "ascent_m", "summit_m", "category",
+)
+
+# Summary fields whose change means the climb's detail page should be fetched again
+DETAIL_TRIGGER_COLUMNS = ("name", "length_km", "avg_grade", "difficulty_points", "ascent_m", "summit_m", "category")
+
+# Columns query_climbs may sort by
+ORDER_COLUMNS = {"difficulty_points", "avg_grade", "length_km", "ascent_m", "summit_m", "name", "rank"}
+
+
+def ranking_digest(rows: list[dict[str, Any]]) -> str:
+    """Hash of a parsed ranking page (ids and summary stats), stable across cosmetic HTML changes."""
+    payload = json.dumps(
+        [[r.get("climb_id")] + [r.get(c) for c in DETAIL_TRIGGER_COLUMNS] for r in rows],
+        ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def summary_changed(old: dict[str, Any], new: dict[str, Any]) -> bool:
+    return any(old.get(c) != new.get(c) for c in DETAIL_TRIGGER_COLUMNS)
+
+
+def default_db_path() -> Path:
+    env = os.environ.get("CLIMBFINDER_DB")
+    return Path(env) if env else http_cache.default_cache_dir() / "climbs.sqlite"
+
+
+class ClimbStore:
+    """Thread-safe handle on the climb database (one SQLite connection per thread)."""
+
+    def __init__(self, path: str | os.PathLike[str] | None = None) -> None:
+        self.path = Path(path) if path else default_db_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._geo_lock = threading.Lock()
+        self._geo: tuple[tuple[Any, ...], geo_index.SpatialIndex] | None = None
+        with self._conn() as db:
+            db.executescript(SCHEMA)
+            _unique_region_climb(db)
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    # -- writes -----------------------------------------------------------
+
+    def upsert_summaries(self, rows: Iterable[dict[str, Any]]) -> int:
+        """Insert or update ranking summary rows (parse_ranking_items shape). Rows without climb_id are skipped."""
+        now = time.time()
+        params = [
+            tuple(row.get(c) if row.get(c) is not None else _default(c) for c in SUMMARY_COLUMNS) + (now,)
+            for row in rows
+            if row.get("climb_id")
+        ]
+        cols = ", ".join(SUMMARY_COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in SUMMARY_COLUMNS[1:])
+        with self._conn() as db:
+            db.executemany(
+                f"INSERT INTO climbs ({cols}, updated_at) VALUES ({', '.join('?' * (len(SUMMARY_COLUMNS) + 1))}) "
+                f"ON CONFLICT(climb_id) DO UPDATE SET {updates}, updated_at = excluded.updated_at",
+                params,
+            )
+        return len(params)
+
+    def upsert_ranking(
+        self,
+        region_id: int | str,
+        page: int,
+        rows: list[dict[str, Any]],
+        region_label: str = "",
+        page_size: int = 25,
+    ) -> int:
+        """Store one ranking page: climb summaries plus their rank in the region.
+
+        The page's previous positions are replaced, and a climb that moved here from
+        another page loses its old position (one position per climb and region).
+        """
+        n = self.upsert_summaries(rows)
+        now = time.time()
+        base = (page - 1) * page_size
+        positions = [
+            (str(region_id), base + i + 1, page, row["climb_id"], region_label, now)
+            for i, row in enumerate(rows)
+            if row.get("climb_id")
+        ]
+        with self._conn() as db:
+            db.execute("DELETE FROM ranking_positions WHERE region_id = ? AND page = ?", (str(region_id), page))
+            # OR REPLACE also drops rows clashing on (region_id, climb_id): the climb's old page
+            db.executemany(
+                "INSERT OR REPLACE INTO ranking_positions (region_id, rank, page, climb_id, region_label, seen_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                positions,
+            )
+        return n
+
+    def save_ranking_page(
+        self,
+        region_id: int | str,
+        page: int,
+        rows: list[dict[str, Any]],
+        region_label: str = "",
+        page_size: int = 25,
+    ) -> int:
+        """upsert_ranking plus the page record (digest and climb ids) that page_unchanged compares with."""
+        n = self.upsert_ranking(region_id, page, rows, region_label=region_label, page_size=page_size)
+        self.record_page(
+            region_id, page, cfe.ranking_url(region_id, page), ranking_digest(rows), [r.get("climb_id") for r in rows],
+        )
+        return n
+
+    def page_unchanged(self, region_id: int | str, page: int, rows: list[dict[str, Any]]) -> bool:
+        """True when ``rows`` (parse_ranking_items shape) match the stored page: same climbs in
+        the same order, same summary stats."""
+        stored = self.page_info(region_id, page)
+        return bool(
+            stored
+            and stored["climb_ids"] == [r.get("climb_id") for r in rows]
+            and stored["content_hash"] == ranking_digest(rows)
+        )
+
+    def truncate_ranking(self, region_id: int | str, last_page: int) -> int:
+        """Forget positions on pages after ``last_page`` (the ranking got shorter); returns rows deleted."""
+        with self._conn() as db:
+            cur = db.execute(
+                "DELETE FROM ranking_positions WHERE region_id = ? AND page > ?", (str(region_id), last_page)
+            )
+            db.execute("DELETE FROM pages WHERE region_id = ? AND page > ?", (str(region_id), last_page))
+        return cur.rowcount
+
+    def upsert_details(self, details: Iterable[dict[str, Any]]) -> int:
+        """Attach parse_climb_detail records to their climbs (created if the ranking row is missing)."""
+        now = time.time()
+        params = [
+            (d["climb_id"], d.get("title") or "", d.get("page_url") or "", json.dumps(d, ensure_ascii=False), now, now)
+            for d in details
+            if d.get("climb_id")
+        ]
+        with self._conn() as db:
+            db.executemany(
+                "INSERT INTO climbs (climb_id, name, url, detail_json, detail_fetched_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(climb_id) DO UPDATE SET detail_json = excluded.detail_json, "
+                "detail_fetched_at = excluded.detail_fetched_at",
+                params,
+            )
+        return len(params)
+
+    def record_page(self, region_id: int | str, page: int, url: str, content_hash: str, climb_ids: list[int | None]) -> None:
+        with self._conn() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO pages (region_id, page, url, content_hash, climb_ids, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (str(region_id), page, url, content_hash, json.dumps(climb_ids), time.time()),
+            )
+
+    def page_info(self, region_id: int | str, page: int) -> dict[str, Any] | None:
+        row = self._conn().execute(
+            "SELECT * FROM pages WHERE region_id = ? AND page = ?", (str(region_id), page)
+        ).fetchone()
+        if row is None:
+            return None
+        info = dict(row)
+        info["climb_ids"] = json.loads(info["climb_ids"])
+        return info
+
+    # -- crawler checkpoints ------------------------------------------------
+
+    def crawl_state(self, region_id: int | str) -> dict[str, Any]:
+        row = self._conn().execute(
+            "SELECT last_page, ranking_done FROM crawl_state WHERE region_id = ?", (str(region_id),)
+        ).fetchone()
+        return {"last_page": row[0], "ranking_done": bool(row[1])} if row else {"last_page": 0, "ranking_done": False}
+
+    def save_crawl_state(self, region_id: int | str, last_page: int, ranking_done: bool) -> None:
+        with self._conn() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO crawl_state (region_id, last_page, ranking_done, updated_at) VALUES (?, ?, ?, ?)",
+                (str(region_id), last_page, int(ranking_done), time.time()),
+            )
+
+    def reset_crawl_state(self, region_id: int | str) -> None:
+        with self._conn() as db:
+            db.execute("DELETE FROM crawl_state WHERE region_id = ?", (str(region_id),))
+
+    # -- reads --------------------------------------------------------------
+
+    def query_climbs(
+        self,
+        region_id: int | str | None = None,
+        country: str | None = None,
+        min_points: int | None = None,
+        max_points: int | None = None,
+        min_grade: float | None = None,
+        max_grade: float | None = None,
+        with_details: bool | None = None,
+        order_by: str = "difficulty_points",
+        descending: bool = True,
+        limit: int | None = None,
+        start_page: int | None = None,
+        end_page: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """Filtered climbs as summary dicts (+ "rank"/"page"/"region_label" when filtering by region,
+        + "detail" when a detail page was stored). ``start_page``/``end_page`` need ``region_id``."""
+        return list(self.iter_climbs(
+            region_id, country, min_points, max_points, min_grade, max_grade,
+            with_details, order_by, descending, limit, start_page, end_page,
+        ))
+
+    def iter_climbs(
+        self,
+        region_id: int | str | None = None,
+        country: str | None = None,
+        min_points: int | None = None,
+        max_points: int | None = None,
+        min_grade: float | None = None,
+        max_grade: float | None = None,
+        with_details: bool | None = None,
+        order_by: str = "difficulty_points",
+        descending: bool = True,
+        limit: int | None = None,
+        start_page: int | None = None,
+        end_page: int | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """Streaming variant of query_climbs."""
+        where: list[str] = []
+        args: list[Any] = []
+        if region_id is not None:
+            sql = (
+                "SELECT c.*, r.rank, r.page, r.region_label FROM ranking_positions r "
+                "JOIN climbs c ON c.climb_id = r.climb_id"
+            )
+            where.append("r.region_id = ?")
+            args.append(str(region_id))
+            # Served by the (region_id, page) index
+            for clause, value in (("r.page >= ?", start_page), ("r.page <= ?", end_page)):
+                if value is not None:
+                    where.append(clause)
+                    args.append(value)
+        elif start_page is not None or end_page is not None:
+            raise ValueError("a page range needs region_id")
+        else:
+            sql = "SELECT c.* FROM climbs c"
+        if country:
+            where.append("c.country_iso2 = ?")
+            args.append(country.upper())
+        for clause, value in (
+            ("c.difficulty_points >= ?", min_points),
+            ("c.difficulty_points <= ?", max_points),
+            ("c.avg_grade >= ?", min_grade),
+            ("c.avg_grade <= ?", max_grade),
+        ):
+            if value is not None:
+                where.append(clause)
+                args.append(value)
+        if with_details is not None:
+            where.append("c.detail_json IS NOT NULL" if with_details else "c.detail_json IS NULL")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if order_by not in ORDER_COLUMNS or (order_by == "rank" and region_id is None):
+            raise ValueError(f"cannot order by {order_by!r}")
+        sql += f" ORDER BY {'r' if order_by == 'rank' else 'c'}.{order_by} {'DESC' if descending else 'ASC'}"
+        if limit:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        for row in self._conn().execute(sql, args):
+            yield _row_to_climb(row)
+
+    def get_climbs(self, climb_ids: Iterable[int]) -> dict[int, dict[str, Any]]:
+        """Stored climbs by id (missing ids are absent from the result)."""
+        ids = [int(i) for i in climb_ids if i]
+        out: dict[int, dict[str, Any]] = {}
+        db = self._conn()
+        for start in range(0, len(ids), 500):
+            chunk = ids[start : start + 500]
+            for row in db.execute(
+                f"SELECT * FROM climbs WHERE climb_id IN ({', '.join('?' * len(chunk))})", chunk
+            ):
+                out[row["climb_id"]] = _row_to_climb(row)
+        return out
+
+    def ranking_rows(self, region_id: int | str, start_page: int = 1, end_page: int | None = None) -> list[dict[str, Any]]:
+        """Stored ranking of a region in rank order (parse_ranking_items rows + "rank"/"page")."""
+        return self.query_climbs(
+            region_id=region_id, order_by="rank", descending=False, start_page=start_page, end_page=end_page,
+        )
+
+    def export_records(self, region_id: int | str | None = None, region_label: str = "", **filters: Any) -> list[dict[str, Any]]:
+        """build_export_object records for stored climbs that have a detail page."""
+        return list(self.iter_export_records(region_id, region_label, **filters))
+
+    def iter_export_records(
+        self,
+        region_id: int | str | None = None,
+        region_label: str = "",
+        climb_ids: Iterable[int] | None = None,
+        **filters: Any,
+    ) -> Iterator[dict[str, Any]]:
+        """Streaming export_records; with ``climb_ids``, those climbs in that order (filters ignored),
+        loaded 500 at a time."""
+        if climb_ids is None:
+            for row in self.iter_climbs(region_id=region_id, with_details=True, **filters):
+                detail = row.pop("detail")
+                yield cfe.build_export_object(detail, row, region_label or row.get("region_label") or "")
+            return
+        ids = [int(i) for i in climb_ids if i]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start : start + 500]
+            rows = self.get_climbs(chunk)
+            labels = self._region_labels(chunk)
+            for climb_id in chunk:
+                row = rows.get(climb_id)
+                if row and "detail" in row:
+                    detail = row.pop("detail")
+                    yield cfe.build_export_object(detail, row, region_label or labels.get(climb_id) or "")
+
+    def _region_labels(self, climb_ids: list[int]) -> dict[int, str]:
+        """Region label of the ranking each climb was most recently seen in."""
+        rows = self._conn().execute(
+            f"SELECT climb_id, region_label FROM ranking_positions "
+            f"WHERE climb_id IN ({', '.join('?' * len(climb_ids))}) AND region_label != '' ORDER BY seen_at",
+            climb_ids,
+        )
+        return {r["climb_id"]: r["region_label"] for r in rows}
+
+    # -- spatial queries ----------------------------------------------------
+
+    def spatial_index(self) -> geo_index.SpatialIndex:
+        """Index over stored detail coordinates; rebuilt only after details were added or updated."""
+        db = self._conn()
+        version = tuple(db.execute(
+            "SELECT COUNT(*), MAX(detail_fetched_at) FROM climbs WHERE detail_json IS NOT NULL"
+        ).fetchone())
+        with self._geo_lock:
+            if self._geo is None or self._geo[0] != version:
+                # json_extract reads the four coordinates without decoding whole detail records
+                rows = db.execute(
+                    "SELECT climb_id, json_extract(detail_json, '$.start_lat') AS start_lat, "
+                    "json_extract(detail_json, '$.start_lon') AS start_lon, "
+                    "json_extract(detail_json, '$.lat') AS lat, json_extract(detail_json, '$.lon') AS lon "
+                    "FROM climbs WHERE detail_json IS NOT NULL"
+                )
+                self._geo = (version, geo_index.SpatialIndex.from_details(dict(r) for r in rows))
+            return self._geo[1]
+
+    def export_hits(self, hits: Iterable[geo_index.Hit], region_label: str = "") -> list[dict[str, Any]]:
+        """build_export_object records for spatial query hits, in hit order, plus
+        "distanceKm" and "nearPoint" (the climb's "start" or "summit")."""
+        hits = list(hits)
+        records = {
+            r["bigId"]: r for r in self.iter_export_records(climb_ids=[h.climb_id for h in hits], region_label=region_label)
+        }
+        return [
+            {**records[h.climb_id], "distanceKm": h.distance_km, "nearPoint": h.point}
+            for h in hits
+            if h.climb_id in records
+        ]
+
+    def close(self) -> None:
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+
+def _default(column: str) -> Any:
+    if column in ("length_km", "avg_grade"):
+        return 0.0
+    if column in ("difficulty_points", "ascent_m", "summit_m"):
+        return 0
+    return ""
+
+
+def _unique_region_climb(db: sqlite3.Connection) -> None:
+    """One position per climb and region. Databases from before the constraint may hold
+    duplicates (a climb on two pages): the most recently written row is kept."""
+    if db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ranking_positions_region_climb'"
+    ).fetchone():
+        return
+    db.execute(
+        "DELETE FROM ranking_positions WHERE rowid NOT IN "
+        "(SELECT MAX(rowid) FROM ranking_positions GROUP BY region_id, climb_id)"
+    )
+    db.execute("CREATE UNIQUE INDEX ranking_positions_region_climb ON ranking_positions(region_id, climb_id)")
+
+
+def _row_to_climb(row: sqlite3.Row) -> dict[str, Any]:
+    keys = row.keys()
+    out = {c: row[c] for c in SUMMARY_COLUMNS}
+    for extra in ("rank", "page", "region_label"):
+        if extra in keys:
+            out[extra] = row[extra]
+    if row["detail_json"]:
+        out["detail"] = json.loads(row["detail_json"])
+    return out
+
+
+_default_store: ClimbStore | None = None
+_default_lock = threading.Lock()
+
+
+def default_store() -> ClimbStore:
+    """Process-wide store at default_db_path()."""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = ClimbStore()
+        return _default_store
@@ -16,117 +16,30 @@ For Synology NAS (DS225+) Docker deployment:
     5. Forward port 8501 in Docker → access via http://nas-ip:8501
 """
 
-import json
-import re
-import time
 import io
-import requests
-from bs4 import BeautifulSoup
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
 
 import streamlit as st
-import pandas as pd
 
-import climbfinder_export as cfe
+import metrics
+from regions import ALL_REGIONS, REGIONS_BY_COUNTRY
 
-# ---------------------------------------------------------------------------
-# Region data (same as app.py)
-# ---------------------------------------------------------------------------
-REGIONS_BY_COUNTRY = {
-    "France": [
-        {"name": "Haute-Savoie", "id": 288}, {"name": "Savoie", "id": 957},
-        {"name": "Hautes-Alpes", "id": 192}, {"name": "Alpes-de-Haute-Provence", "id": 290},
-        {"name": "Alpes-Maritimes", "id": 379}, {"name": "Isère", "id": 291},
-        {"name": "Drôme", "id": 292}, {"name": "Vosges", "id": 295},
-        {"name": "Pyrénées-Atlantiques", "id": 186}, {"name": "Hautes-Pyrénées", "id": 187},
-        {"name": "Pyrénées-Orientales", "id": 188}, {"name": "Ariège", "id": 189},
-        {"name": "Haute-Garonne", "id": 190}, {"name": "Aude", "id": 191},
-        {"name": "Hérault", "id": 193}, {"name": "Gard", "id": 194},
-        {"name": "Ardèche", "id": 195}, {"name": "Loire", "id": 196},
-        {"name": "Puy-de-Dôme", "id": 197}, {"name": "Cantal", "id": 198},
-        {"name": "Aveyron", "id": 199}, {"name": "Lozère", "id": 200},
-        {"name": "Var", "id": 380}, {"name": "Vaucluse", "id": 381},
-        {"name": "Bouches-du-Rhône", "id": 382}, {"name": "Ain", "id": 293},
-        {"name": "Jura", "id": 294}, {"name": "Doubs", "id": 296},
-        {"name": "Bas-Rhin", "id": 297}, {"name": "Haut-Rhin", "id": 298},
-        {"name": "Corse-du-Sud", "id": 383}, {"name": "Haute-Corse", "id": 384},
-    ],
-    "Italy": [
-        {"name": "Dolomites", "id": 123}, {"name": "Aosta Valley", "id": 317},
-        {"name": "Lombardy", "id": 318}, {"name": "Piedmont", "id": 319},
-        {"name": "Trentino", "id": 320}, {"name": "South Tyrol (Alto Adige)", "id": 321},
-        {"name": "Veneto", "id": 322}, {"name": "Friuli Venezia Giulia", "id": 323},
-        {"name": "Liguria", "id": 324}, {"name": "Tuscany", "id": 325},
-        {"name": "Emilia-Romagna", "id": 326}, {"name": "Lazio", "id": 327},
-        {"name": "Sardinia", "id": 328}, {"name": "Sicily", "id": 329},
-        {"name": "Campania", "id": 330},
-    ],
-    "Spain": [
-        {"name": "Mallorca", "id": 153}, {"name": "Tenerife", "id": 156},
-        {"name": "Catalonia", "id": 150}, {"name": "Andalusia", "id": 151},
-        {"name": "Basque Country", "id": 152}, {"name": "Asturias", "id": 154},
-        {"name": "Cantabria", "id": 155}, {"name": "Valencia", "id": 157},
-        {"name": "Aragon", "id": 158}, {"name": "Navarra", "id": 159},
-        {"name": "Castilla y León", "id": 160}, {"name": "Gran Canaria", "id": 161},
-        {"name": "La Palma", "id": 162}, {"name": "Girona", "id": 163},
-    ],
-    "Netherlands": [
-        {"name": "Limburg", "id": 233}, {"name": "Gelderland", "id": 230},
-        {"name": "Utrecht", "id": 231}, {"name": "Overijssel", "id": 232},
-        {"name": "North Brabant", "id": 234},
-    ],
-    "Belgium": [
-        {"name": "Ardennes", "id": 239}, {"name": "Liège", "id": 240},
-        {"name": "Namur", "id": 241}, {"name": "Luxembourg (BE)", "id": 242},
-        {"name": "Hainaut", "id": 243}, {"name": "East Flanders", "id": 244},
-        {"name": "West Flanders", "id": 245}, {"name": "Flemish Brabant", "id": 246},
-        {"name": "Antwerp", "id": 247},
-    ],
-    "Switzerland": [
-        {"name": "Valais", "id": 365}, {"name": "Graubünden", "id": 366},
-        {"name": "Ticino", "id": 367}, {"name": "Bern", "id": 368},
-        {"name": "Uri", "id": 369}, {"name": "Schwyz", "id": 370},
-        {"name": "Lucerne", "id": 371}, {"name": "Vaud", "id": 372},
-        {"name": "Fribourg", "id": 373}, {"name": "Glarus", "id": 374},
-        {"name": "St. Gallen", "id": 375}, {"name": "Obwalden", "id": 376},
-        {"name": "Nidwalden", "id": 377},
-    ],
-    "Austria": [
-        {"name": "Tyrol", "id": 358}, {"name": "Salzburg", "id": 359},
-        {"name": "Vorarlberg", "id": 360}, {"name": "Carinthia", "id": 361},
-        {"name": "Styria", "id": 362}, {"name": "Upper Austria", "id": 363},
-        {"name": "Lower Austria", "id": 364},
-    ],
-    "Germany": [
-        {"name": "Bavaria", "id": 340}, {"name": "Baden-Württemberg", "id": 341},
-        {"name": "Hesse", "id": 342}, {"name": "Rhineland-Palatinate", "id": 343},
-        {"name": "Saarland", "id": 344}, {"name": "North Rhine-Westphalia", "id": 345},
-        {"name": "Thuringia", "id": 346}, {"name": "Saxony", "id": 347},
-    ],
-    "United Kingdom": [
-        {"name": "England", "id": 77}, {"name": "Wales", "id": 78},
-        {"name": "Scotland", "id": 79}, {"name": "Yorkshire", "id": 80},
-        {"name": "Lake District", "id": 81}, {"name": "Peak District", "id": 82},
-        {"name": "Surrey Hills", "id": 83},
-    ],
-    "Portugal": [
-        {"name": "Algarve", "id": 170}, {"name": "Serra da Estrela", "id": 171},
-        {"name": "Minho", "id": 172}, {"name": "Madeira", "id": 173},
-    ],
-    "Andorra": [{"name": "Andorra", "id": 180}],
-    "Slovenia": [{"name": "Slovenia", "id": 390}, {"name": "Julian Alps", "id": 391}],
-    "Croatia": [{"name": "Croatia", "id": 395}],
-    "Norway": [{"name": "Western Norway", "id": 400}, {"name": "Northern Norway", "id": 401}],
-    "USA": [{"name": "California", "id": 410}, {"name": "Colorado", "id": 411}, {"name": "Utah", "id": 412}],
-    "Colombia": [{"name": "Boyacá", "id": 420}, {"name": "Antioquia", "id": 421}],
-}
-
-# Build flat list
-ALL_REGIONS = []
-for country, regions in REGIONS_BY_COUNTRY.items():
-    for r in regions:
-        ALL_REGIONS.append({"country": country, "name": r["name"], "id": r["id"],
-                            "label": f"{r['name']}, {country}"})
-ALL_REGIONS.sort(key=lambda x: x["label"])
+_script_started = time.perf_counter()
+
+# Imported on first use, so the sidebar renders before pandas, pyarrow, requests
+# and BeautifulSoup are loaded (see the import profile under Run stats)
+pd = metrics.lazy_module("pandas")
+browser_pool = metrics.lazy_module("browser_pool")
+cfe = metrics.lazy_module("climbfinder_export")
+columnar = metrics.lazy_module("columnar")
+export_writer = metrics.lazy_module("export_writer")
+ranking_loader = metrics.lazy_module("ranking_loader")
+ranking_parser = metrics.lazy_module("ranking_parser")
+ratelimit = metrics.lazy_module("ratelimit")
+store = metrics.lazy_module("store")
 
 
 def _resolve_region_id(custom_id: str, selected_idx, region_options) -> str | None:
@@ -147,336 +60,146 @@ def _resolve_region_label(custom_id: str, selected_idx, region_options) -> str:
 
 
 # ---------------------------------------------------------------------------
-# Scraper helpers (same logic as app.py)
+# Scraper helpers
 # ---------------------------------------------------------------------------
-USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
-
-
-def clean_number(text):
-    if not text:
-        return 0
-    if isinstance(text, (int, float)):
-        return round(text, 2) if isinstance(text, float) else text
-    cleaned = str(text).strip()
-    cleaned = re.sub(r'\s*(km|m|%|ft|pts?)\s*$', '', cleaned, flags=re.IGNORECASE)
-    cleaned = cleaned.replace(',', '').strip()
-    if not cleaned:
-        return 0
-    try:
-        return round(float(cleaned), 2) if '.' in cleaned else int(cleaned)
-    except ValueError:
-        return 0
-
-
-def _check_playwright():
-    try:
-        from playwright.sync_api import sync_playwright
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            browser.close()
-        return True
-    except Exception:
-        return False
+# Parsed ranking pages are kept this long; both tabs read them, so only pages
+# missing from this cache go to the network (through the shared host limiter)
+PAGE_CACHE_TTL_S = 3600
 
 
 @st.cache_resource
+def _playwright_probe():
+    """Launches the shared browser once per process on a background thread (importing
+    Playwright and the scraper stack with it); the UI never waits for it."""
+    probe = Future()
+
+    def run():
+        try:
+            probe.set_result(browser_pool.available())
+        except Exception:  # noqa: BLE001
+            probe.set_result(False)
+
+    threading.Thread(target=run, name="playwright-probe", daemon=True).start()
+    return probe
+
+
 def playwright_available():
-    return _check_playwright()
+    # False until the probe has finished, and after the browser could not be relaunched:
+    # scrapes meanwhile use requests
+    probe = _playwright_probe()
+    return probe.done() and probe.result() and browser_pool.available()
 
 
-def scrape_page(region_id, page_number):
-    url = f"https://climbfinder.com/en/ranking?l={region_id}&p={page_number}"
+@st.cache_data(ttl=PAGE_CACHE_TTL_S, max_entries=2000, show_spinner=False)
+def ranking_page(region_id, page_number):
+    """One parsed ranking page, shared by both tabs and all sessions, keyed by (region, page).
+
+    Returns {"rows": ranking rows, "items": parse_ranking_items rows, "last_page": the
+    pagination bar's last page or None}. Fetch errors raise, so they are not cached.
+    """
+    url = cfe.ranking_url(region_id, page_number)
+    limiter = ratelimit.limiter_for(cfe.BASE)
     if playwright_available():
-        return _scrape_with_playwright(url, page_number)
-    return _scrape_with_requests(url, page_number)
-
-
-def _scrape_with_playwright(url, page_number):
-    from playwright.sync_api import sync_playwright
-    try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(user_agent=USER_AGENT,
-                                          viewport={"width": 1280, "height": 900},
-                                          locale="en-US")
-            page = context.new_page()
-            page.goto(url, wait_until="domcontentloaded", timeout=20000)
-            try:
-                page.wait_for_selector(
-                    "table tr td, a[href*='/climbs/'], a[href*='/cols/'], [class*='ranking']",
-                    timeout=10000)
-                page.wait_for_timeout(500)
-            except Exception:
-                pass
-            html = page.content()
-            browser.close()
-        return _parse_html(html, page_number)
-    except Exception as exc:
-        return [], str(exc)
-
-
-def _scrape_with_requests(url, page_number):
-    headers = {"User-Agent": USER_AGENT,
-               "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-               "Accept-Language": "en-US,en;q=0.9",
-               "Referer": "https://climbfinder.com/en/ranking"}
-    try:
-        resp = requests.get(url, headers=headers, timeout=15)
-        resp.raise_for_status()
-    except requests.RequestException as exc:
-        return [], str(exc)
-    return _parse_html(resp.text, page_number)
+        try:
+            with metrics.timer("fetch_seconds", kind="ranking_browser"):
+                rendered = ratelimit.call(
+                    limiter, lambda: browser_pool.get_pool().fetch(url), lambda r: (r.status, r.headers),
+                )
+            html = rendered.html
+        except Exception as exc:
+            metrics.record_error("browser", exc)
+            if browser_pool.available():
+                raise
+            html = cfe.fetch_ranking_html(region_id, page_number, limiter=limiter)
+    else:
+        html = cfe.fetch_ranking_html(region_id, page_number, limiter=limiter)
+    return {
+        "rows": _parse_html(html, page_number),
+        "items": cfe.parse_ranking_items(html),
+        "last_page": ranking_parser.last_page(html),
+    }
+
+
+def ranking_pages(region_id, start_page, end_page, key="rows", refresh=False):
+    """ranking_loader.PageResults for a page range (end_page None: to the last page).
+
+    Pages after the first load concurrently through ranking_page, so they share its
+    cache and the host limiter; ``key`` picks "rows" or "items" from each page.
+    With ``refresh``, fetching stops at two pages in a row that match the local store
+    and the rest of the range comes from it (ranking_loader.iter_refresh).
+    """
+    def load(page_number):
+        page = ranking_page(str(region_id), int(page_number))
+        return ranking_loader.RankingPage(page[key], None, page["last_page"])
+
+    workers = ratelimit.limiter_for(cfe.BASE).max_in_flight
+    if not refresh:
+        return ranking_loader.iter_pages(load, int(start_page), end_page, max_workers=workers)
+
+    def from_stored(row):
+        if key == "rows":
+            return ranking_parser.row_from_summary(row, row["rank"], row["page"])
+        return {k: v for k, v in row.items() if k != "detail"}
+
+    return ranking_loader.iter_refresh(
+        load, store.default_store(), region_id, int(start_page), end_page,
+        to_summary=ranking_parser.summary_from_row if key == "rows" else (lambda row: row),
+        from_stored=from_stored, max_workers=workers,
+    )
+
+
+def _pages_done(bar, result, start_page, end_page):
+    total = (result.last_page or end_page or result.page) - start_page + 1
+    done = result.page - start_page + 1
+    bar.progress(min(100, int(done / total * 100)), text=f"Fetched page {done} of {total}…")
 
 
 # ---------------------------------------------------------------------------
-# HTML parsing (same strategies as app.py)
+# HTML parsing (shared engine, see ranking_parser.py)
 # ---------------------------------------------------------------------------
 def _parse_html(html, page_number):
-    soup = BeautifulSoup(html, "html.parser")
-    climbs = []
-
-    # Strategy 0: Climbfinder server-rendered ranking cards (must run before generic <table> / link heuristics)
-    card_items = cfe.parse_ranking_items(html)
-    if card_items:
-        # Climbfinder uses 25 climbs per ranking page
-        per_page = 25
-        base = (page_number - 1) * per_page if page_number else 0
-        for i, row in enumerate(card_items):
-            climbs.append({
-                "rank": base + i + 1,
-                "name": row.get("name") or "",
-                "length_km": float(row.get("length_km") or 0),
-                "avg_gradient_pct": float(row.get("avg_grade") or 0),
-                "difficulty_points": int(row.get("difficulty_points") or 0),
-                "elevation_gain_m": int(row.get("ascent_m") or 0),
-                "summit_m": int(row.get("summit_m") or 0),
-                "category": row.get("category") or "",
-                "country_iso2": row.get("country_iso2") or "",
-                "url": row.get("url") or "",
-                "climb_id": row.get("climb_id"),
-            })
-        return climbs, None
-
-    # Strategy 1: __NEXT_DATA__
-    script = soup.find("script", id="__NEXT_DATA__")
-    if script and script.string:
-        try:
-            data = json.loads(script.string)
-            climbs = _find_ranking_data(data)
-        except json.JSONDecodeError:
-            pass
-    if climbs:
-        return climbs, None
-
-    # Strategy 2: HTML table
-    table = soup.find("table")
-    if table:
-        col_map = _detect_table_columns(table)
-        for row in table.find_all("tr"):
-            cells = row.find_all("td")
-            if not cells or len(cells) < 3:
-                continue
-            try:
-                climb = _parse_table_row(cells, col_map)
-                if climb:
-                    climbs.append(climb)
-            except Exception:
-                continue
-    if climbs:
-        return climbs, None
-
-    # Strategy 3: links
-    links = soup.find_all("a", href=re.compile(r"/(climbs?|cols?)/"))
-    seen = set()
-    for link in links:
-        name = link.get_text(strip=True)
-        if not name or name in seen or len(name) < 3:
-            continue
-        if name.lower() in ("ranking", "home", "climbs", "map"):
-            continue
-        seen.add(name)
-        climb = _extract_from_context(link, name)
-        if climb:
-            climbs.append(climb)
-
-    return climbs, None
-
-
-def _find_ranking_data(obj):
-    candidates = []
-    _collect_ranking_candidates(obj, candidates)
-    if not candidates:
-        return []
-    candidates.sort(key=len, reverse=True)
-    return [_normalize_climb(item, idx) for idx, item in enumerate(candidates[0])
-            if isinstance(item, dict)]
-
-
-def _collect_ranking_candidates(obj, candidates, depth=0):
-    if depth > 12:
-        return
-    if isinstance(obj, list) and len(obj) >= 2:
-        if isinstance(obj[0], dict) and _looks_like_climb(obj[0]):
-            candidates.append([item for item in obj if isinstance(item, dict)])
-    if isinstance(obj, dict):
-        for value in obj.values():
-            _collect_ranking_candidates(value, candidates, depth + 1)
-    elif isinstance(obj, list):
-        for item in obj:
-            _collect_ranking_candidates(item, candidates, depth + 1)
-
-
-def _looks_like_climb(d):
-    keys_lower = {k.lower() for k in d.keys()}
-    if not (keys_lower & {"name", "title", "climb", "climbname", "climb_name"}):
-        return False
-    cats = 0
-    if keys_lower & {"length", "distance", "km", "length_km"}:
-        cats += 1
-    if keys_lower & {"gradient", "avg_gradient", "avggradient", "avg_gradient_pct", "averagegradient"}:
-        cats += 1
-    if keys_lower & {"difficulty", "points", "difficultypoints", "difficulty_points", "score", "rating"}:
-        cats += 1
-    if keys_lower & {"rank", "position", "ranking"}:
-        cats += 1
-    if keys_lower & {"elevation", "elevationgain", "elevation_gain", "height", "altitude"}:
-        cats += 1
-    return cats >= 2
-
-
-def _normalize_climb(d, idx):
-    lc = {k.lower(): v for k, v in d.items()}
-    name = _best_name(lc)
-    rank = lc.get("rank") or lc.get("position") or lc.get("ranking") or idx + 1
-    difficulty = lc.get("difficulty") or lc.get("points") or lc.get("difficultypoints") or lc.get("difficulty_points") or lc.get("score") or lc.get("rating") or 0
-    length_km = lc.get("length") or lc.get("distance") or lc.get("km") or lc.get("length_km") or 0
-    gradient = lc.get("gradient") or lc.get("avg_gradient") or lc.get("avggradient") or lc.get("avg_gradient_pct") or lc.get("averagegradient") or 0
-
-    length_val = clean_number(length_km)
-    gradient_val = clean_number(gradient)
-    elevation_gain = round(length_val * 10 * gradient_val) if length_val and gradient_val else 0
+    return ranking_parser.parse_ranking_page(html, page_number).rows
 
-    return {
-        "rank": clean_number(rank),
-        "name": name,
-        "difficulty_points": clean_number(difficulty),
-        "length_km": length_val,
-        "avg_gradient_pct": gradient_val,
-        "elevation_gain_m": elevation_gain,
-    }
+
+def _export_file(climb_ids, region_label, fmt, compress):
+    """Download callback: streams the stored records to a temp file when the button is clicked."""
+    def build():
+        fh = tempfile.TemporaryFile()
+        records = store.default_store().iter_export_records(climb_ids=climb_ids, region_label=region_label)
+        if fmt in columnar.FORMATS:
+            columnar.write_records(records, fh, fmt)
+        else:
+            export_writer.write_export(records, fh, fmt, compress=compress)
+        fh.seek(0)
+        return fh
+    return build
 
 
-def _best_name(lc):
-    """Pick the best human-readable climb name from available fields.
-    Skips values that look like concatenated stats (e.g. '34.8 km 6 % 1556')
-    by requiring at least one word with 3+ letters.
+@st.cache_data(max_entries=8, show_spinner=False)
+def _ranking_download(digest, fmt, _rows, region=(None, "")):
+    """Excel, CSV or Parquet bytes for the ticked ranking rows, built on click and once per distinct selection.
+
+    ``region`` (id, label) is stored in the Parquet file for rows that do not name their own.
     """
-    for key in ("title", "name", "climb", "climbname", "climb_name",
-                "displayname", "display_name", "routename", "route_name"):
-        val = lc.get(key)
-        if not val:
-            continue
-        if isinstance(val, dict):
-            for lang in ("en", "nl", "fr", "de", "es", "it"):
-                if lang in val and isinstance(val[lang], str) and val[lang].strip():
-                    return val[lang].strip()
-            for v in val.values():
-                if isinstance(v, str) and v.strip():
-                    return v.strip()
-            continue
-        if not isinstance(val, str) or not val.strip():
-            continue
-        s = val.strip()
-        if re.search(r'[a-zA-ZÀ-ÿ]{3,}', s):
-            return s
-    slug = lc.get("slug") or ""
-    if isinstance(slug, str) and slug.strip():
-        return slug.strip().split("/")[-1].replace("-", " ").title()
-    raw = lc.get("name") or lc.get("title") or ""
-    return str(raw).strip() if raw else ""
-
-
-def _detect_table_columns(table):
-    col_map = {}
-    for idx, th in enumerate(table.find_all("th")):
-        text = th.get_text(strip=True).lower()
-        if any(k in text for k in ["rank", "#", "pos"]):
-            col_map["rank"] = idx
-        elif any(k in text for k in ["name", "climb", "col "]):
-            col_map["name"] = idx
-        elif any(k in text for k in ["diff", "point", "score"]):
-            col_map["difficulty"] = idx
-        elif any(k in text for k in ["length", "dist", "km"]):
-            col_map["length"] = idx
-        elif any(k in text for k in ["grad", "avg", "slope", "%"]):
-            col_map["gradient"] = idx
-    return col_map
-
-
-def _parse_table_row(cells, col_map=None):
-    texts = [c.get_text(strip=True) for c in cells]
-    name = None
-    name_idx = None
-    for i, cell in enumerate(cells):
-        link = cell.find("a", href=re.compile(r"/(climbs?|cols?)/"))
-        if link:
-            name = link.get_text(strip=True)
-            name_idx = i
-            break
-    if name is None:
-        if col_map and "name" in col_map and col_map["name"] < len(texts):
-            name_idx = col_map["name"]
-            name = texts[name_idx]
-        else:
-            name = texts[1] if len(texts) > 1 else ""
-            name_idx = 1
-    if not name:
-        return None
-
-    if col_map and len(col_map) >= 3:
-        rank = clean_number(texts[col_map["rank"]].replace(".", "").replace("#", "")) if "rank" in col_map and col_map["rank"] < len(texts) else 0
-        difficulty = clean_number(texts[col_map["difficulty"]]) if "difficulty" in col_map and col_map["difficulty"] < len(texts) else 0
-        length_km = clean_number(texts[col_map["length"]]) if "length" in col_map and col_map["length"] < len(texts) else 0
-        gradient = clean_number(texts[col_map["gradient"]]) if "gradient" in col_map and col_map["gradient"] < len(texts) else 0
-    else:
-        rank_text = texts[0] if name_idx > 0 else ""
-        rank = clean_number(rank_text.replace(".", "").replace("#", "").strip())
-        remaining = texts[name_idx + 1:]
-        length_km = clean_number(remaining[0]) if len(remaining) > 0 else 0
-        gradient = clean_number(remaining[1]) if len(remaining) > 1 else 0
-        difficulty = clean_number(remaining[2]) if len(remaining) > 2 else 0
-
-    lv = length_km if isinstance(length_km, (int, float)) else clean_number(length_km)
-    gv = gradient if isinstance(gradient, (int, float)) else clean_number(gradient)
-    elevation_gain = round(lv * 10 * gv) if lv and gv else 0
-
-    return {"rank": rank, "name": name, "difficulty_points": difficulty,
-            "length_km": lv, "avg_gradient_pct": gv, "elevation_gain_m": elevation_gain}
-
-
-def _extract_from_context(link_element, name):
-    parent = link_element.parent
-    for _ in range(4):
-        if parent is None:
-            break
-        text = parent.get_text(" ", strip=True)
-        nums = re.findall(r"[\d]+(?:[.,]\d+)?", text)
-        if len(nums) >= 3:
-            nums = [clean_number(n) for n in nums]
-            lk, gr = nums[1] if len(nums) > 1 else 0, nums[2] if len(nums) > 2 else 0
-            eg = round(lk * 10 * gr) if lk and gr else 0
-            return {"rank": nums[0], "name": name, "length_km": lk,
-                    "avg_gradient_pct": gr, "difficulty_points": nums[3] if len(nums) > 3 else 0,
-                    "elevation_gain_m": eg}
-        parent = parent.parent
-    return {"rank": 0, "name": name, "difficulty_points": 0,
-            "length_km": 0, "avg_gradient_pct": 0, "elevation_gain_m": 0}
+    if fmt == "xlsx":
+        buf = io.BytesIO()
+        export_writer.write_xlsx(_rows, buf)
+        return buf.getvalue()
+    if fmt in columnar.FORMATS:
+        buf = io.BytesIO()
+        columnar.write_rankings(_rows, buf, fmt, region_id=region[0], region_label=region[1])
+        return buf.getvalue()
+    columns = export_writer.RANKING_COLUMNS
+    with metrics.timer("export_seconds", format="csv"):
+        df = pd.DataFrame([[r.get(k) for k, _ in columns] for r in _rows], columns=[h for _, h in columns])
+        return df.to_csv(index=False)
 
 
 # ---------------------------------------------------------------------------
 # Streamlit UI
 # ---------------------------------------------------------------------------
 st.set_page_config(page_title="Climbfinder Aggregator", page_icon="⛰️", layout="wide")
+_playwright_probe()
 
 st.title("Climbfinder Ranking Aggregator")
 st.caption("Search regions, scrape climb rankings, and export to Excel or CSV.")
@@ -507,9 +230,55 @@ with st.sidebar:
     col1, col2 = st.columns(2)
     start_page = col1.number_input("Start page", min_value=1, value=1)
     end_page = col2.number_input("End page", min_value=1, value=5)
+    all_pages = st.checkbox("All pages", help="Ignore End page and load up to the ranking's last page")
+    refresh = st.checkbox("Refresh (stop at unchanged pages)",
+                          help="Stop fetching after two pages in a row that match the local store; "
+                               "the rest of the range is loaded from the store")
 
     fetch_btn = st.button("Fetch Rankings", type="primary", use_container_width=True)
     load_list_btn = st.button("Load ranking list (for JSON)", use_container_width=True)
+    load_store_btn = st.button("Load from local store", use_container_width=True,
+                               help="Fill both tabs from previously scraped data, without network requests")
+    dataset_path = st.text_input("Or a ranking dataset file", placeholder="e.g. /data/haute-savoie.parquet",
+                                 help="Parquet or Arrow file saved from the ranking tab")
+    load_dataset_btn = st.button("Load dataset", use_container_width=True, disabled=not dataset_path)
+
+    if load_store_btn:
+        rid = _resolve_region_id(custom_id, selected_idx, region_options)
+        if not rid:
+            st.warning("Please select a region or enter a custom Region ID.")
+        else:
+            db = store.default_store()
+            stored = db.ranking_rows(rid, start_page, end_page)
+            if not stored:
+                st.warning(f"Nothing stored for region {rid}, pages {start_page}–{end_page}.")
+            else:
+                lbl = _resolve_region_label(custom_id, selected_idx, region_options)
+                st.session_state["last_ranking_rows"] = [ranking_parser.row_from_summary(r, r["rank"], r["page"]) for r in stored]
+                st.session_state["last_ranking_region"] = (rid, lbl)
+                st.session_state["ranking_pick_list"] = [
+                    {**{k: v for k, v in r.items() if k != "detail"}, "fetch_details": False} for r in stored
+                ]
+                st.session_state["json_region_label"] = lbl
+                st.session_state["json_export_ids"] = [r["climb_id"] for r in stored if "detail" in r]
+                st.success(f"Loaded **{len(stored)}** climbs from {db.path.name}.")
+
+    if load_dataset_btn:
+        try:
+            loaded = columnar.load_rankings(dataset_path.strip())
+        except (OSError, ValueError) as exc:
+            st.error(f"Cannot load dataset: {exc}")
+        else:
+            # Seed the store too, so detail fetches and the JSON tab work on these climbs
+            columnar.seed_store(store.default_store(), loaded)
+            st.session_state["last_ranking_rows"] = loaded
+            st.session_state["last_ranking_region"] = (None, "")  # rows carry their own region
+            st.session_state["ranking_pick_list"] = [
+                {**ranking_parser.summary_from_row(r), "fetch_details": False} for r in loaded
+            ]
+            st.session_state["json_region_label"] = next((r["region_label"] for r in loaded if r["region_label"]), "")
+            st.session_state["json_export_ids"] = []
+            st.success(f"Loaded **{len(loaded)}** climbs from {dataset_path.strip()}.")
 
 # --- Tab: Ranking table export ---
 with tab_rank:
@@ -524,33 +293,35 @@ with tab_rank:
         if not region_id:
             st.warning("Please select a region or enter a custom Region ID.")
         else:
-            if end_page < start_page:
+            if not all_pages and end_page < start_page:
                 st.warning("End page must be ≥ start page.")
             else:
-                end_page_eff = min(end_page, start_page + 19)
-                total_pages = end_page_eff - start_page + 1
+                end_page_eff = None if all_pages else end_page
 
                 method = "playwright" if playwright_available() else "requests"
-                st.info(f"Scraping region **{region_id}** — pages {start_page}–{end_page_eff} via {method}")
+                st.info(
+                    f"Scraping region **{region_id}** — pages {start_page}–{end_page_eff or 'last'} via {method}"
+                )
 
                 progress_bar = st.progress(0)
                 all_climbs = []
                 errors = []
 
-                for page_num in range(start_page, end_page_eff + 1):
-                    pct = int(((page_num - start_page) / total_pages) * 100)
-                    progress_bar.progress(pct, text=f"Fetching page {page_num - start_page + 1} of {total_pages}...")
-
-                    page_climbs, err = scrape_page(region_id, page_num)
-                    if err:
-                        errors.append(f"Page {page_num}: {err}")
+                pages = ranking_pages(region_id, start_page, end_page_eff, refresh=refresh)
+                for result in pages:
+                    _pages_done(progress_bar, result, start_page, end_page_eff)
+                    if result.error:
+                        errors.append(result.error)
+                        pages.close()
                         break
-                    if not page_climbs:
+                    if not result.rows:
                         break
-                    all_climbs.extend(page_climbs)
-
-                    if page_num < end_page_eff:
-                        time.sleep(1.0)
+                    all_climbs.extend(result.rows)
+                    if result.strategy != "store":
+                        store.default_store().save_ranking_page(
+                            region_id, result.page, [ranking_parser.summary_from_row(r) for r in result.rows],
+                            region_label=_resolve_region_label(custom_id, selected_idx, region_options),
+                        )
 
                 progress_bar.progress(100, text="Done!")
 
@@ -563,6 +334,9 @@ with tab_rank:
 
                 if all_climbs:
                     st.session_state["last_ranking_rows"] = all_climbs
+                    st.session_state["last_ranking_region"] = (
+                        region_id, _resolve_region_label(custom_id, selected_idx, region_options),
+                    )
 
     rows_rank = st.session_state.get("last_ranking_rows")
     if rows_rank:
@@ -613,28 +387,34 @@ with tab_rank:
             key=f"ranking_table_editor_{st.session_state['ranking_editor_gen']}",
         )
         export_df = edited[edited["include_in_export"] == True]  # noqa: E712
-        out_cols = ["length_km", "name", "avg_gradient_pct", "difficulty_points", "elevation_gain_m"]
-        df_out = export_df[out_cols].copy()
-        df_out.columns = ["Length (km)", "Climb Name", "Avg Gradient (%)", "Difficulty Points", "Elev. Gain (m)"]
-
-        st.caption(f"Export: **{len(df_out)}** of **{len(edited)}** rows (unchecked rows are skipped).")
-        col_a, col_b = st.columns(2)
-        excel_buf = io.BytesIO()
-        df_out.to_excel(excel_buf, index=False, sheet_name="Rankings")
+        selected_rows = [rows_rank[i] for i in export_df.index]
+        digest = export_writer.rows_digest(selected_rows)
+
+        st.caption(f"Export: **{len(selected_rows)}** of **{len(edited)}** rows (unchecked rows are skipped).")
+        col_a, col_b, col_c = st.columns(3)
         col_a.download_button(
             "Download Excel",
-            data=excel_buf.getvalue(),
+            data=lambda: _ranking_download(digest, "xlsx", selected_rows),
             file_name="Climbfinder_Rankings.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            disabled=len(df_out) == 0,
+            mime=export_writer.XLSX_MIME,
+            disabled=not selected_rows,
         )
-        csv_data = df_out.to_csv(index=False)
         col_b.download_button(
             "Download CSV",
-            data=csv_data,
+            data=lambda: _ranking_download(digest, "csv", selected_rows),
             file_name="Climbfinder_Rankings.csv",
             mime="text/csv",
-            disabled=len(df_out) == 0,
+            disabled=not selected_rows,
+        )
+        col_c.download_button(
+            "Download Parquet",
+            data=lambda: _ranking_download(
+                digest, "parquet", selected_rows, st.session_state.get("last_ranking_region", (None, "")),
+            ),
+            file_name=columnar.file_name("Climbfinder_Rankings"),
+            mime=columnar.mime_type(),
+            disabled=not selected_rows,
+            help="Typed columnar dataset; load it again with Load dataset in the sidebar",
         )
 
 # --- Tab: JSON export ---
@@ -645,39 +425,44 @@ with tab_json:
         "3. **Fetch selected details**, then download JSON (BIG-like shape). **`score`** = Climbfinder difficulty points; **`fiets`** is always null (not a Fiets-index).  \n"
         "The **Ranking table export** tab also has an **Export** checkbox per row for Excel/CSV."
     )
-    delay_detail = st.slider("Pause between detail pages (seconds)", 0.25, 3.0, 0.75, 0.25)
+    detail_workers = st.slider(
+        "Parallel detail requests", 1, 4, 4,
+        help="The request rate is shared by every session: an adaptive limiter backs off on 429/503 "
+             "and slow responses, up to CLIMBFINDER_MAX_RATE (see Run stats).",
+    )
 
     if load_list_btn:
         rid = _resolve_region_id(custom_id, selected_idx, region_options)
         if not rid:
             st.warning("Please select a region or enter a custom Region ID.")
-        elif end_page < start_page:
+        elif not all_pages and end_page < start_page:
             st.warning("End page must be ≥ start page.")
         else:
-            end_eff = min(end_page, start_page + 19)
+            end_eff = None if all_pages else end_page
             lbl = _resolve_region_label(custom_id, selected_idx, region_options)
-            sess = cfe.new_http_session()
             merged: list = []
             errs: list[str] = []
             bar = st.progress(0, text="Loading ranking pages…")
-            n_pages = end_eff - start_page + 1
-            for i, pnum in enumerate(range(start_page, end_eff + 1)):
-                try:
-                    html = cfe.fetch_ranking_html(rid, pnum, session=sess)
-                    merged.extend(cfe.parse_ranking_items(html))
-                except Exception as exc:  # noqa: BLE001
-                    errs.append(f"Page {pnum}: {exc}")
+            pages = ranking_pages(rid, start_page, end_eff, key="items", refresh=refresh)
+            last_loaded = start_page
+            for result in pages:
+                _pages_done(bar, result, start_page, end_eff)
+                if result.error:
+                    errs.append(result.error)
+                    pages.close()
                     break
-                bar.progress(int((i + 1) / n_pages * 100))
-                if pnum < end_eff:
-                    time.sleep(0.6)
+                merged.extend(result.rows)
+                if result.rows:
+                    last_loaded = result.page
+                    if result.strategy != "store":
+                        store.default_store().save_ranking_page(rid, result.page, result.rows, region_label=lbl)
             bar.empty()
             if errs:
                 st.error("; ".join(errs))
             elif not merged:
                 st.warning("No climbs parsed from HTML.")
             else:
-                st.success(f"Loaded **{len(merged)}** climbs from ranking (pages {start_page}–{end_eff}).")
+                st.success(f"Loaded **{len(merged)}** climbs from ranking (pages {start_page}–{last_loaded}).")
                 for row in merged:
                     row.setdefault("fetch_details", False)
                 st.session_state["ranking_pick_list"] = merged
@@ -734,38 +519,112 @@ with tab_json:
             else:
                 idxs = chosen.index.tolist()
                 selected = [rows[i] for i in idxs if i < len(rows)]
-                session = cfe.new_http_session()
-                out: list[dict] = []
+                out: list[int] = []
                 err_rows: list[str] = []
                 prog = st.progress(0, text="Fetching detail pages…")
-                for n, summary in enumerate(selected):
-                    url = summary.get("url") or ""
-                    try:
-                        html = cfe.fetch_climb_html(url, session=session)
-                        detail = cfe.parse_climb_detail(html, url)
-                        out.append(cfe.build_export_object(detail, summary, lbl))
-                    except Exception as exc:  # noqa: BLE001
-                        err_rows.append(f"{summary.get('name', url)}: {exc}")
-                    prog.progress(int((n + 1) / len(selected) * 100))
-                    if n < len(selected) - 1:
-                        time.sleep(delay_detail)
+                results = cfe.fetch_details(
+                    selected,
+                    max_workers=detail_workers,
+                    limiter=ratelimit.limiter_for(cfe.BASE),
+                    on_progress=lambda done, total: prog.progress(int(done / total * 100)),
+                )
+                fetched = []
+                for summary, (detail, err) in zip(selected, results):
+                    climb_id = summary.get("climb_id") or detail.get("climb_id")
+                    if err:
+                        err_rows.append(f"{summary.get('name') or summary.get('url', '')}: {err}")
+                    elif not climb_id:
+                        err_rows.append(f"{summary.get('name') or summary.get('url', '')}: no climb id")
+                    else:
+                        # Only ids stay in the session; the export streams the records back from the store
+                        out.append(climb_id)
+                        fetched.append({**detail, "climb_id": climb_id})
+                db = store.default_store()
+                db.upsert_summaries([s for s in selected if s.get("climb_id")])
+                db.upsert_details(fetched)
                 prog.empty()
-                st.session_state["json_export_batch"] = out
+                st.session_state["json_export_ids"] = out
                 st.session_state["json_export_errors"] = err_rows
                 if err_rows:
                     st.warning("Some failed: " + "; ".join(err_rows[:5]))
                 if out:
                     st.success(f"Fetched **{len(out)}** detail record(s).")
 
-        if st.session_state.get("json_export_batch"):
-            batch = st.session_state["json_export_batch"]
-            st.json(batch[:3] if len(batch) > 3 else batch)
-            if len(batch) > 3:
-                st.caption(f"… and {len(batch) - 3} more in the file.")
-            payload = json.dumps(batch, ensure_ascii=False, indent=2)
+        if st.session_state.get("json_export_ids"):
+            export_ids = st.session_state["json_export_ids"]
+            db = store.default_store()
+            st.json(list(db.iter_export_records(climb_ids=export_ids[:3], region_label=lbl)))
+            if len(export_ids) > 3:
+                st.caption(f"… and {len(export_ids) - 3} more in the file.")
+            f1, f2 = st.columns([2, 1])
+            fmt = f1.radio("Format", ["json", "ndjson", "parquet", "arrow"], horizontal=True,
+                           format_func=lambda f: {"json": "JSON array", "ndjson": "NDJSON (one climb per line)",
+                                                  "parquet": "Parquet", "arrow": "Arrow IPC"}[f])
+            if fmt in columnar.FORMATS:
+                # Columnar files are compressed / mmap-able as they are
+                name, mime, gz = columnar.file_name("climbfinder_climbs", fmt), columnar.mime_type(fmt), False
+            else:
+                gz = f2.checkbox("gzip", value=len(export_ids) > 500)
+                name, mime = export_writer.file_name("climbfinder_climbs", fmt, gz), export_writer.mime_type(fmt, gz)
             st.download_button(
-                "Download climbs.json",
-                data=payload,
-                file_name="climbfinder_climbs.json",
-                mime="application/json",
-            )
\ No newline at end of file
+                f"Download {name}",
+                data=_export_file(export_ids, lbl, fmt, gz),
+                file_name=name,
+                mime=mime,
+            )
+
+
+# --- Sidebar: run stats (drawn last, so it includes this run's requests) ---
+def _run_stats():
+    snap = metrics.snapshot()
+    counters, timers = snap["counters"], snap["timers"]
+
+    def total(name, **match):
+        want = {k: str(v) for k, v in match.items()}
+
+        def matches(labels):
+            have = dict(part.split("=", 1) for part in labels.split(",")) if labels else {}
+            return all(have.get(k) == v for k, v in want.items())
+
+        return sum(v for labels, v in counters.get(name, {}).items() if matches(labels))
+
+    requests_n = total("http_requests_total")
+    hits = total("cache_hits_total", layer="http") + total("cache_hits_total", layer="http_revalidated")
+    parse = list(timers.get("parse_seconds", {}).values())
+    parse_n = sum(t["count"] for t in parse)
+    parse_ms = sum(t["sum"] for t in parse) * 1000 / parse_n if parse_n else 0.0
+    fetch_s = sum(t["sum"] for t in timers.get("fetch_seconds", {}).values())
+    export_s = sum(t["sum"] for t in timers.get("export_seconds", {}).values())
+
+    c1, c2 = st.columns(2)
+    c1.metric("Requests", f"{requests_n:.0f}")
+    c2.metric("Downloaded", f"{total('http_bytes_total') / 1e6:.1f} MB")
+    c1.metric("HTTP cache hits", f"{hits:.0f}")
+    c2.metric("Parse / page", f"{parse_ms:.1f} ms")
+    c1.metric("Fetching", f"{fetch_s:.1f} s")
+    c2.metric("Sleeping", f"{total('sleep_seconds_total'):.1f} s")
+    c1.metric("Retries", f"{total('http_retries_total'):.0f}")
+    c2.metric("Errors", f"{total('errors_total'):.0f}")
+    if export_s:
+        st.caption(f"Export writers: {export_s * 1000:.0f} ms")
+    errors = counters.get("errors_total", {})
+    if errors:
+        st.caption("Errors by type: " + ", ".join(f"{k} ×{v:.0f}" for k, v in sorted(errors.items())))
+    limiter = ratelimit.limiter_for(cfe.BASE)
+    st.caption(f"climbfinder.com rate: {limiter.rate:.2f} req/s learned (ceiling {limiter.max_rate:g})")
+    imports = sorted(snap["imports"].items(), key=lambda kv: -kv[1])
+    if imports:
+        st.caption("Import profile (not reset): " + ", ".join(f"{m} {sec * 1000:.0f} ms" for m, sec in imports[:8]))
+    if st.button("Reset stats", key="reset_run_stats"):
+        metrics.reset()
+        st.rerun()
+
+
+# Kept for the first run only: the cold-start cost of the script, lazy imports it triggered included
+metrics.record_import("streamlit_app", time.perf_counter() - _script_started)
+
+with st.sidebar:
+    st.markdown("---")
+    with st.expander("Run stats", expanded=False):
+        st.caption("Since the app process started (or the last reset); shared by all sessions.")
+        _run_stats()